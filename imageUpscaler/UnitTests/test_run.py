@@ -63,6 +63,94 @@ class TestConfigFunctions(unittest.TestCase):
             loaded_config = load_configuration("imageUpscaler/invalid/config.json")
             self.assertEqual(loaded_config, default_config)
 
+    def test_build_configuration_merges_nested_sections(self):
+        from imageUpscaler.config import build_configuration
+        config = build_configuration({"gpu_settings": {"batch_size": 8}}, {"noise_reduction": True})
+        self.assertEqual(config["gpu_settings"]["batch_size"], 8)
+        self.assertEqual(config["gpu_settings"]["memory_limit"], default_config["gpu_settings"]["memory_limit"])
+        self.assertEqual(config["noise_reduction"]["enabled"], True)
+        self.assertEqual(config["noise_reduction"]["method"], "nlm")
+
+    def test_build_configuration_rejects_invalid_values(self):
+        from imageUpscaler.config import ConfigError, build_configuration
+        with self.assertRaises(ConfigError) as raised:
+            build_configuration({"upscale_factr": 2.0, "compression_quality": 101,
+                                 "upscale_settings": {"backend": "bicubic"},
+                                 "advanced_features": {"smart_sharpen": {"amount": "high"}}})
+        message = str(raised.exception)
+        for path in ("upscale_factr", "compression_quality", "upscale_settings.backend",
+                     "advanced_features.smart_sharpen.amount"):
+            self.assertIn(path, message)
+
+    def test_load_configuration_accepts_wizard_output(self):
+        import tempfile
+        answers = ["in", "out", "2", "1.2", "", "", "", "", "", "", "none",
+                   "no", "no", "no", "no", "no", "no", "", "yes"]
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            config_path = os.path.join(tmp_dir, "config.json")
+            with patch('builtins.input', side_effect=answers), patch('builtins.print'):
+                create_configuration(config_path)
+            config = load_configuration(config_path)
+        self.assertEqual(config["rotation_angle"], 0.0)
+        self.assertEqual(config["upscale_factor"], 2.0)
+
+    def test_build_configuration_checks_optional_settings(self):
+        from imageUpscaler.config import CONFIG_TYPES, ConfigError, build_configuration
+
+        def optional_paths(section, prefix=""):
+            for key, value in section.items():
+                if isinstance(value, dict):
+                    yield from optional_paths(value, prefix + key + ".")
+                elif value is None:
+                    yield prefix + key
+        for path in optional_paths(default_config):
+            self.assertIn(path, CONFIG_TYPES)
+        build_configuration({"sharding": {"node_id": None}})
+        with self.assertRaises(ConfigError):
+            build_configuration({"sharding": {"node_id": 3}})
+
+    def test_build_configuration_is_read_only(self):
+        from imageUpscaler.config import build_configuration
+        config = build_configuration({"notifications": {"sinks": ["log"]}})
+        self.assertEqual(config["notifications"]["sinks"], ("log",))
+        with self.assertRaises(TypeError):
+            config["batch_processing"]["max_workers"] = 2
+
+    def test_build_configuration_rejects_null_choices(self):
+        from imageUpscaler.config import ConfigError, build_configuration
+        with self.assertRaises(ConfigError) as raised:
+            build_configuration({"upscale_settings": {"backend": None},
+                                 "output_settings": {"encoder_profile": None, "naming_convention": None},
+                                 "gpu_settings": {"optimization_level": None}})
+        message = str(raised.exception)
+        for path in ("upscale_settings.backend", "output_settings.encoder_profile",
+                     "output_settings.naming_convention", "gpu_settings.optimization_level"):
+            self.assertIn(path, message)
+        config = build_configuration({"watermark_text": None, "crop_settings": None, "flip_mode": None})
+        self.assertIsNone(config["flip_mode"])
+
+    def test_build_configuration_normalizes_off_values(self):
+        from imageUpscaler.config import ConfigError, build_configuration
+        config = build_configuration({"flip_mode": "none", "crop_settings": [0, 0, 0, 0]})
+        self.assertIsNone(config["flip_mode"])
+        self.assertIsNone(config["crop_settings"])
+        self.assertIsNone(build_configuration({"flip_mode": ""})["flip_mode"])
+        with self.assertRaises(ConfigError) as raised:
+            build_configuration({"crop_settings": [10, 10, 5, 20]})
+        self.assertIn("crop_settings", str(raised.exception))
+
+    def test_build_configuration_normalizes_each_layer(self):
+        import pickle
+        from imageUpscaler.config import build_configuration
+        config = build_configuration({"noise_reduction": True}, {"noise_reduction": {"strength": 2.0}})
+        self.assertEqual(config["noise_reduction"]["enabled"], True)
+        self.assertEqual(config["noise_reduction"]["strength"], 2.0)
+        self.assertEqual(config["noise_reduction"]["method"], "nlm")
+        restored = pickle.loads(pickle.dumps(config))
+        self.assertEqual(restored, config)
+        with self.assertRaises(TypeError):
+            restored["noise_reduction"]["strength"] = 1.0
+
 class TestFileUtilsFunctions(unittest.TestCase):
 
     @patch('os.path.exists', return_value=True)
@@ -101,6 +189,29 @@ class TestImageProcessingFunctions(unittest.TestCase):
         upscale_image(mock_img, 2.0)
         mock_resize.assert_called_once_with((200, 200))
 
+    def test_add_watermark_only_touches_text_box(self):
+        np_img = np.zeros((100, 200, 3), dtype=np.uint8)
+        result = add_watermark(Image.fromarray(np_img), "Sample", "bottom_right")
+        mask, _ = get_watermark_sprite("Sample", 36, 128)
+
+        changed_rows, changed_cols = np.nonzero(np.asarray(result).any(axis=2))
+        self.assertEqual(result.mode, 'RGB')
+        self.assertLessEqual(changed_cols.max() - changed_cols.min() + 1, mask.width)
+        self.assertLessEqual(changed_rows.max() - changed_rows.min() + 1, mask.height)
+        self.assertLessEqual(changed_cols.max(), 200 - 10)
+
+        hits = get_watermark_sprite.cache_info().hits
+        add_watermark(Image.fromarray(np_img), "Sample", "center")
+        self.assertEqual(get_watermark_sprite.cache_info().hits, hits + 1)
+
+    def test_add_watermark_places_every_corner(self):
+        np_img = np.zeros((100, 200, 3), dtype=np.uint8)
+        for position, (left, top) in (("top_left", (True, True)), ("top_right", (False, True)),
+                                      ("bottom_left", (True, False)), ("bottom_right", (False, False))):
+            rows, cols = np.nonzero(np.asarray(add_watermark(Image.fromarray(np_img), "Sample", position)).any(axis=2))
+            self.assertEqual(cols.mean() < 100, left, position)
+            self.assertEqual(rows.mean() < 50, top, position)
+
  
 class TestMainScript(unittest.TestCase):
 
@@ -114,6 +225,1082 @@ class TestMainScript(unittest.TestCase):
 
         mock_send_notification.assert_called_once()
 
+    def test_process_image_logs_one_summary_record(self):
+        import tempfile
+        from imageUpscaler.config import build_configuration
+        from imageUpscaler.main import process_image
+        config = build_configuration({"upscale_factor": 2.0, "contrast_factor": 1.2, "watermark_text": "",
+                                      "crop_settings": None, "flip_mode": None, "preserve_metadata": False,
+                                      "output_settings": {"create_thumbnails": False, "preserve_original": False}})
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            img_path = os.path.join(tmp_dir, "image.png")
+            Image.new("RGB", (32, 24)).save(img_path)
+            with self.assertLogs("imageUpscaler", level="DEBUG") as logs:
+                output_path = process_image(img_path, config, tmp_dir)
+        summaries = [record for record in logs.records if hasattr(record, "image_summary")]
+        self.assertEqual(len(summaries), 1)
+        self.assertEqual(summaries[0].image_summary["stages"], ["upscale", "contrast"])
+        self.assertEqual(summaries[0].image_summary["output"], output_path)
+        self.assertEqual(summaries[0].image_summary["output_size"], (64, 48))
+
+    def test_failed_stage_is_not_recorded(self):
+        from imageUpscaler.config import build_configuration
+        from imageUpscaler.main import apply_stages_after_ai, new_summary_record, plan_stages
+        config = build_configuration({"watermark_text": "", "crop_settings": None, "flip_mode": None,
+                                      "advanced_features": {"hdr_processing": True,
+                                                            "smart_sharpen": {"enabled": True}}})
+        img = Image.new("RGB", (16, 16))
+        record = new_summary_record("image.png", img.size)
+        with patch("imageUpscaler.image_processing.unsharp_mask", side_effect=RuntimeError("boom")), \
+                self.assertLogs("imageUpscaler", level="ERROR"):
+            apply_stages_after_ai(img, config, plan_stages(img, config), record)
+        self.assertIn("hdr_processing", record["stages"])
+        self.assertNotIn("smart_sharpen", record["stages"])
+
+
+
+class TestFrequencyFunctions(unittest.TestCase):
+
+    def test_frequency_enhance_is_identity_without_gain(self):
+        from imageUpscaler.frequency import frequency_enhance
+
+        rng = np.random.default_rng(0)
+        np_img = rng.integers(0, 256, (37, 53, 3), dtype=np.uint8)
+        result = frequency_enhance(np_img, gain=0.0, luma_only=False, workers=2)
+        self.assertTrue(np.array_equal(result, np_img))
+
+    def test_frequency_enhance_boosts_detail_with_cached_filter(self):
+        from imageUpscaler.frequency import frequency_enhance, high_boost_filter, padded_shape
+
+        np_img = np.zeros((64, 64, 3), dtype=np.uint8)
+        np_img[:, ::2] = 200
+        np_img[:, 1::2] = 50
+        high_boost_filter.cache_clear()
+        for _ in range(2):
+            result = frequency_enhance(np_img)
+        self.assertEqual(high_boost_filter.cache_info().hits, 1)
+        self.assertEqual(padded_shape(64, 64), (96, 96))
+        # Pixel-level stripes sit far above the cutoff, so their contrast grows
+        self.assertGreater(np.ptp(result[:, 20:44, 1].astype(int)), 150)
+
+
+class TestHdrFunctions(unittest.TestCase):
+
+    def reference_hdr(self, np_img, exposure_values, merge_method, max_value):
+        adjusted = [(np_img / max_value) ** (2.0 ** ev) for ev in exposure_values]
+        merged = np.mean(adjusted, axis=0) if merge_method == 'average' else np.maximum.reduce(adjusted)
+        return merged * max_value
+
+    def test_process_hdr_matches_float64_reference(self):
+        rng = np.random.default_rng(0)
+        np_img = rng.integers(0, 256, (40, 50, 3), dtype=np.uint8)
+        for exposure_values in ((-2, 0, 2), (-3, -1, 0, 1, 2, 3)):
+            for merge_method in ('average', 'maximum'):
+                result = np.asarray(process_hdr(Image.fromarray(np_img), exposure_values, merge_method))
+                expected = self.reference_hdr(np_img, exposure_values, merge_method, 255)
+                self.assertLessEqual(np.abs(result - expected).max(), 0.5 + 1e-6)
+
+    def test_process_hdr_tiles_16_bit_images(self):
+        rng = np.random.default_rng(0)
+        np_img = rng.integers(0, 65536, (50, 20), dtype=np.uint16)
+        result = np.asarray(process_hdr(Image.fromarray(np_img), tile_rows=7))
+        expected = self.reference_hdr(np_img, (-2, 0, 2), 'average', 65535)
+        self.assertEqual(result.dtype, np.uint16)
+        self.assertLessEqual(np.abs(result - expected).max(), 1.0)
+
+
+class TestResampleFunctions(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.img = Image.fromarray(cv2.GaussianBlur(
+            rng.integers(0, 256, (64, 80, 3), dtype=np.uint8), (0, 0), 2))
+
+    def test_pil_tiled_matches_pil(self):
+        from imageUpscaler.resample import upscale
+
+        reference = upscale(self.img, 2.0, "pil")
+        tiled = upscale(self.img, 2.0, "pil_tiled", tile_size=16, workers=4)
+        self.assertTrue(np.array_equal(np.asarray(tiled), np.asarray(reference)))
+
+    def test_fast_backends_stay_close_to_pil(self):
+        from imageUpscaler.resample import upscale
+
+        reference = np.asarray(upscale(self.img, 2.0, "pil"), dtype=np.float64)
+        for backend in ("opencv_lanczos4", "opencv_cubic", "integer"):
+            output = upscale(self.img, 2.0, backend)
+            self.assertEqual(output.size, (160, 128))
+            mse = np.mean((np.asarray(output, dtype=np.float64) - reference) ** 2)
+            self.assertGreater(10 * np.log10(255 ** 2 / mse), 40, backend)
+
+    def test_backends_do_not_bleed_transparent_colour(self):
+        from imageUpscaler.resample import upscale
+
+        # Opaque white square on fully transparent red: no red may reach the visible edge
+        np_img = np.zeros((32, 32, 4), dtype=np.uint8)
+        np_img[..., 0] = 255
+        np_img[8:24, 8:24] = 255
+        img = Image.fromarray(np_img, "RGBA")
+        for backend in ("pil", "pil_tiled", "opencv_lanczos4", "opencv_cubic", "integer"):
+            output = np.asarray(upscale(img, 2.0, backend, tile_size=16), dtype=np.int32)
+            visible = output[..., 3] > 64
+            self.assertLess(np.max(output[..., 0][visible] - output[..., 1][visible]), 8, backend)
+
+
+class TestDenoiseFunctions(unittest.TestCase):
+
+    def test_tiled_nlm_matches_full_frame(self):
+        from imageUpscaler.denoise import fast_nlm_denoise
+
+        np_img = np.random.RandomState(0).randint(0, 256, (96, 80, 3)).astype(np.uint8)
+        img = Image.fromarray(np_img)
+        full = fast_nlm_denoise(img, preset="quality", tile_size=0)
+        tiled = fast_nlm_denoise(img, preset="quality", tile_size=32)
+        np.testing.assert_array_equal(np.array(full), np.array(tiled))
+
+    def test_nlm_keeps_alpha(self):
+        from imageUpscaler.denoise import fast_nlm_denoise
+
+        rng = np.random.RandomState(0)
+        np_img = rng.randint(0, 256, (48, 40, 4)).astype(np.uint8)
+        np_img[:, :20, 3] = 0
+        for preset in ("quality", "fast"):
+            result = fast_nlm_denoise(Image.fromarray(np_img, "RGBA"), preset=preset)
+            self.assertEqual(result.mode, "RGBA")
+            np.testing.assert_array_equal(np.array(result)[:, :, 3], np_img[:, :, 3])
+            rgb = fast_nlm_denoise(Image.fromarray(np_img[:, :, :3]), preset=preset)
+            np.testing.assert_array_equal(np.array(result)[:, :, :3], np.array(rgb))
+
+    def test_lower_strength_shrinks_search_window(self):
+        from imageUpscaler.denoise import nlm_parameters
+
+        self.assertEqual(nlm_parameters(1.0), (10.0, 7, 21))
+        self.assertLess(nlm_parameters(0.3)[2], nlm_parameters(1.0)[2])
+
+
+class TestImageAnalysisFunctions(unittest.TestCase):
+
+    def _noisy_images(self, sigmas):
+        rng = np.random.RandomState(1)
+        yy, xx = np.mgrid[0:360, 0:480]
+        base = 128 + 60 * np.sin(xx / 40.0) + 40 * np.cos(yy / 25.0)
+        for sigma in sigmas:
+            yield np.clip(base + rng.normal(0, sigma, base.shape), 0, 255).astype(np.uint8)
+
+    def test_fast_noise_estimate_tracks_true_sigma(self):
+        from imageUpscaler.image_analysis import estimate_noise_sigma
+
+        sigmas = [0, 2, 5, 10, 20]
+        for sigma, gray in zip(sigmas, self._noisy_images(sigmas)):
+            self.assertAlmostEqual(estimate_noise_sigma(gray), sigma, delta=1.0 + 0.1 * sigma)
+
+    def test_fast_noise_estimate_correlates_with_nlm_metric(self):
+        # The NLM residual (h=3) only responds up to sigma ~4, so calibrate there
+        from imageUpscaler.image_analysis import estimate_noise_sigma, estimate_noise_nlm
+
+        sigmas = [0, 0.5, 1, 1.5, 2, 2.5, 3, 3.5]
+        fast, accurate = [], []
+        for gray in self._noisy_images(sigmas):
+            fast.append(estimate_noise_sigma(gray))
+            accurate.append(estimate_noise_nlm(gray))
+        self.assertGreater(np.corrcoef(fast, accurate)[0, 1], 0.95)
+
+    def _skimage_texture(self, gray, levels=256):
+        from skimage.feature import graycomatrix, graycoprops
+        from imageUpscaler.image_analysis import GLCM_ANGLES
+
+        glcm = graycomatrix(gray, [1], list(GLCM_ANGLES), levels=levels)
+        return {name: graycoprops(glcm, name)[0]
+                for name in ('contrast', 'dissimilarity', 'homogeneity', 'energy', 'correlation')}
+
+    def test_texture_features_match_skimage_at_full_resolution(self):
+        from skimage import data
+        from imageUpscaler.image_analysis import texture_features
+
+        gray = data.camera()
+        expected = self._skimage_texture(gray)
+        result = texture_features(gray, levels=256, max_size=0, patches=0)
+        for name, values in expected.items():
+            np.testing.assert_allclose(result[name], values, rtol=1e-9, err_msg=name)
+
+    def test_quantised_sampled_texture_features_stay_close(self):
+        from skimage import data
+        from imageUpscaler.image_analysis import texture_features, quantize_gray
+
+        gray = data.camera()
+        # Quantised counts are exact; only the 256-level rescaling differs
+        expected = self._skimage_texture(quantize_gray(gray, 64), levels=64)
+        result = texture_features(gray, levels=64, max_size=0, patches=0)
+        np.testing.assert_allclose(result['homogeneity'], expected['homogeneity'], rtol=1e-9)
+        np.testing.assert_allclose(result['contrast'], expected['contrast'] * 16, rtol=1e-9)
+
+        # Patch sampling keeps the scale-free statistics within tolerance
+        full = self._skimage_texture(gray)
+        sampled = texture_features(gray, patches=32)
+        np.testing.assert_allclose(sampled['correlation'], full['correlation'], rtol=0.05)
+        np.testing.assert_allclose(sampled['dissimilarity'], full['dissimilarity'], rtol=0.25)
+
+        # Patches that would cover more than the image are not sampled; the image is counted whole
+        small = gray[:100, :100]
+        whole, default = texture_features(small, patches=0), texture_features(small)
+        for name, values in whole.items():
+            np.testing.assert_array_equal(default[name], values, err_msg=name)
+
+
+class TestAdaptiveFunctions(unittest.TestCase):
+
+    def test_clean_sharp_image_skips_expensive_stages(self):
+        from imageUpscaler.adaptive import plan_adaptive_stages
+
+        checkerboard = ((np.indices((256, 256)) // 32).sum(axis=0) % 2 * 255).astype(np.uint8)
+        plan = plan_adaptive_stages(Image.fromarray(checkerboard).convert('RGB'),
+                                    default_config["adaptive_processing"])
+        self.assertFalse(plan["noise_reduction"])
+        self.assertFalse(plan["smart_sharpen"])
+        self.assertFalse(plan["auto_color_correction"])
+
+    def test_noisy_flat_image_is_denoised_and_corrected(self):
+        from imageUpscaler.adaptive import plan_adaptive_stages
+
+        rng = np.random.RandomState(0)
+        noisy = np.clip(128 + rng.normal(0, 10, (256, 256, 3)), 0, 255).astype(np.uint8)
+        plan = plan_adaptive_stages(Image.fromarray(noisy), default_config["adaptive_processing"])
+        self.assertTrue(plan["noise_reduction"])
+        self.assertTrue(plan["auto_color_correction"])
+
+
+class TestJournalFunctions(unittest.TestCase):
+
+    def test_resume_skips_completed_images(self):
+        import tempfile
+        from imageUpscaler.journal import ProgressJournal
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            paths = []
+            for i in range(3):
+                img_path = os.path.join(tmp_dir, f"image{i}.png")
+                Image.new("RGB", (4, 4)).save(img_path)
+                paths.append(img_path)
+
+            journal_path = os.path.join(tmp_dir, "journal.sqlite")
+            with ProgressJournal(journal_path, batch_size=10) as journal:
+                journal.record(paths[0], "done", "out0.png")
+                journal.record(paths[1], "failed")
+
+            with ProgressJournal(journal_path) as journal:
+                self.assertEqual(journal.pending(paths), paths[1:])
+
+    def test_pending_skips_deleted_inputs(self):
+        import tempfile
+        from imageUpscaler.journal import ProgressJournal
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            paths = [os.path.join(tmp_dir, f"image{i}.png") for i in range(2)]
+            Image.new("RGB", (4, 4)).save(paths[0])
+            with ProgressJournal(os.path.join(tmp_dir, "journal.sqlite")) as journal:
+                self.assertEqual(journal.pending(paths), paths[:1])
+
+
+class TestSchedulerFunctions(unittest.TestCase):
+
+    def test_plan_jobs_orders_largest_first(self):
+        import tempfile
+        from imageUpscaler.scheduler import plan_jobs
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            paths = []
+            for name, size in (("small", (10, 10)), ("large", (200, 100)), ("medium", (50, 50))):
+                img_path = os.path.join(tmp_dir, f"{name}.png")
+                Image.new("RGB", size).save(img_path)
+                paths.append(img_path)
+
+            jobs = plan_jobs(paths, default_config)
+            self.assertEqual([os.path.basename(job.path) for job in jobs],
+                             ["large.png", "medium.png", "small.png"])
+            self.assertEqual((jobs[0].width, jobs[0].height), (200, 100))
+
+    def test_dispatch_returns_every_job(self):
+        from imageUpscaler.scheduler import dispatch
+
+        results = dict(dispatch(range(20), lambda job: job * 2, max_workers=3))
+        self.assertEqual(results, {job: job * 2 for job in range(20)})
+
+    def test_dispatch_respects_memory_budget(self):
+        import threading
+        import time
+        from imageUpscaler.scheduler import dispatch, Job
+
+        lock = threading.Lock()
+        in_flight = [0, 0]  # current, peak
+
+        def run(job):
+            with lock:
+                in_flight[0] += job.peak_bytes
+                in_flight[1] = max(in_flight[1], in_flight[0])
+            time.sleep(0.01)
+            with lock:
+                in_flight[0] -= job.peak_bytes
+
+        jobs = [Job(str(i), 0, 0, 0.0, peak) for i, peak in enumerate([80, 60, 50, 30, 20, 10, 10, 150])]
+        finished = list(dispatch(jobs, run, max_workers=4, memory_budget=100))
+        self.assertEqual(len(finished), len(jobs))
+        # The 150-byte job exceeds the budget on its own and must run alone
+        self.assertEqual(in_flight[1], 150)
+
+    def test_plan_chunks_keeps_order_and_takes_largest_peak(self):
+        import tempfile
+        from imageUpscaler.scheduler import plan_chunks, estimate_peak_bytes
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            paths = []
+            for i, size in enumerate([(10, 10), (200, 100), (50, 50)]):
+                img_path = os.path.join(tmp_dir, f"img{i}.png")
+                Image.new("RGB", size).save(img_path)
+                paths.append(img_path)
+
+            chunks = plan_chunks(paths, default_config, 2, memory_budget=1024**3)
+            self.assertEqual([chunk.path for chunk in chunks], [tuple(paths[:2]), (paths[2],)])
+            self.assertEqual(chunks[0].peak_bytes, estimate_peak_bytes(200, 100, default_config))
+            self.assertEqual([chunk.peak_bytes for chunk in plan_chunks(paths, default_config, 2)], [0, 0])
+
+
+class TestConcurrencyFunctions(unittest.TestCase):
+
+    def test_plan_thread_budget_divides_cores(self):
+        from imageUpscaler.concurrency import plan_thread_budget
+
+        self.assertEqual(plan_thread_budget(4, 16), (4, 4))
+        self.assertEqual(plan_thread_budget(8, 4), (4, 1))
+        self.assertEqual(plan_thread_budget(3, 16), (3, 5))
+
+
+class TestInferenceFunctions(unittest.TestCase):
+
+    @staticmethod
+    def _tiny_model():
+        import torch
+        torch.manual_seed(0)
+        return torch.nn.Sequential(torch.nn.Conv2d(3, 8, 3, padding=1), torch.nn.ReLU(),
+                                   torch.nn.Conv2d(8, 3, 3, padding=1), torch.nn.Sigmoid())
+
+    def test_resolve_cpu_options(self):
+        from imageUpscaler import inference
+
+        self.assertEqual(inference.resolve_cpu_options({"optimization_level": "low"}),
+                         inference.CPU_OPTIMIZATION_LEVELS["low"])
+        for supported in (False, True):
+            with patch.object(inference, "cpu_supports_bfloat16", return_value=supported):
+                options = inference.resolve_cpu_options({"optimization_level": "medium", "mixed_precision": True})
+                self.assertEqual(options["bfloat16"], supported)
+                options = inference.resolve_cpu_options({"optimization_level": "medium", "mixed_precision": False})
+                self.assertFalse(options["bfloat16"])
+        self.assertEqual(inference.resolve_cpu_options({"optimization_level": "high"})["backend"], "eager")
+        options = inference.resolve_cpu_options({"optimization_level": "high", "cpu_backend": "onnx"})
+        self.assertEqual((options["backend"], options["channels_last"]), ("onnx", True))
+        with self.assertRaises(ValueError):
+            inference.resolve_cpu_options({"optimization_level": "extreme"})
+        with self.assertRaises(ValueError):
+            inference.resolve_cpu_options({"cpu_backend": "tensorrt"})
+
+    def test_optimized_backends_match_eager(self):
+        import torch
+        from imageUpscaler.inference import optimize_model_for_cpu, prepare_input, cpu_inference_context
+
+        batch = torch.rand(2, 3, 24, 40)
+        with torch.inference_mode():
+            expected = self._tiny_model().eval()(batch)
+        backends = ["eager", "torchscript"]
+        try:
+            import onnxruntime  # noqa: F401
+            backends.append("onnx")
+        except ImportError:
+            pass
+        for backend in backends:
+            with self.subTest(backend=backend):
+                options = {"channels_last": True, "bfloat16": False, "backend": backend}
+                model = optimize_model_for_cpu(self._tiny_model(), options)
+                # A backend that failed would have fallen back to the eager module
+                self.assertEqual(isinstance(model, torch.nn.Sequential), backend == "eager")
+                with cpu_inference_context(options):
+                    output = model(prepare_input(batch, options))
+                self.assertEqual(tuple(output.shape), tuple(expected.shape))
+                self.assertTrue(torch.allclose(output.float(), expected, atol=1e-4))
+
+    def test_bfloat16_outputs_stay_close(self):
+        import torch
+        from imageUpscaler.inference import optimize_model_for_cpu, cpu_inference_context
+
+        batch = torch.rand(1, 3, 16, 16)
+        with torch.inference_mode():
+            expected = self._tiny_model().eval()(batch)
+        options = {"channels_last": False, "bfloat16": True, "backend": "eager"}
+        with cpu_inference_context(options):
+            output = optimize_model_for_cpu(self._tiny_model(), options)(batch)
+        self.assertTrue(torch.allclose(output.float(), expected, atol=2e-2))
+
+    def test_unavailable_backend_falls_back_to_eager(self):
+        from imageUpscaler import inference
+
+        model = self._tiny_model()
+        options = {"channels_last": False, "bfloat16": False, "backend": "onnx"}
+        with patch.object(inference, "OnnxRuntimeModel", side_effect=ImportError("no onnxruntime")), \
+                self.assertLogs("imageUpscaler.inference", level="WARNING"):
+            self.assertIs(inference.optimize_model_for_cpu(model, options), model)
+
+    def test_model_cache_builds_each_model_once_across_threads(self):
+        import threading
+        import time
+        from imageUpscaler import image_processing
+
+        built = []
+
+        def slow_optimize(model, options):
+            built.append(model)
+            time.sleep(0.05)
+            return model
+
+        cache = image_processing.ModelCache()
+        with patch.object(image_processing, "optimize_model_for_cpu", side_effect=slow_optimize), \
+                patch.object(image_processing.torch.cuda, "is_available", return_value=False):
+            models = []
+            threads = [threading.Thread(target=lambda: models.append(cache.get_model("default"))) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(len(built), 1)
+        self.assertTrue(all(model is models[0] for model in models))
+
+    def test_input_layout_and_output_conversion(self):
+        import torch
+        from imageUpscaler.inference import prepare_input, to_uint8_image_array
+
+        batch = torch.rand(1, 3, 8, 8)
+        self.assertTrue(prepare_input(batch, {"channels_last": True, "backend": "eager"})
+                        .is_contiguous(memory_format=torch.channels_last))
+        self.assertTrue(prepare_input(batch, {"channels_last": True, "backend": "onnx"}).is_contiguous())
+        array = to_uint8_image_array(torch.tensor([[[-0.5, 0.5]], [[1.0, 2.0]], [[0.0, 0.25]]]))
+        self.assertEqual(array.shape, (1, 2, 3))
+        self.assertEqual(array.dtype, np.uint8)
+        self.assertEqual(array[0].tolist(), [[0, 255, 0], [127, 255, 63]])
+
+
+class TestEncodingFunctions(unittest.TestCase):
+
+    def test_resolve_format_applies_format_conversion(self):
+        from imageUpscaler.encoding import resolve_format
+
+        self.assertEqual(resolve_format("jpg", "in/photo.png"), ("JPEG", ".jpg"))
+        self.assertEqual(resolve_format("", "in/photo.jpeg"), ("JPEG", ".jpeg"))
+        self.assertEqual(resolve_format(None, "in/frame.iuf"), ("PNG", ".png"))
+
+    def test_profiles_trade_size_for_speed(self):
+        import tempfile
+        from imageUpscaler.encoding import encode_image, encode_stats
+
+        rng = np.random.default_rng(0)
+        img = Image.fromarray(cv2.GaussianBlur(rng.integers(0, 256, (128, 128, 3), dtype=np.uint8), (0, 0), 2))
+        encode_stats.reset()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            sizes = {}
+            for profile in ("fast", "small"):
+                path = encode_image(img, os.path.join(tmp_dir, f"{profile}.png"), "PNG", profile)
+                sizes[profile] = os.path.getsize(path)
+                self.assertTrue(np.array_equal(np.asarray(Image.open(path)), np.asarray(img)))
+        self.assertLess(sizes["small"], sizes["fast"])
+        self.assertEqual(sorted(encode_stats.totals), [("PNG", "fast"), ("PNG", "small")])
+        self.assertIn("PNG/fast: 1 files", encode_stats.summary())
+
+    def test_encode_pool_follows_configured_size(self):
+        from imageUpscaler.config import build_configuration
+        from imageUpscaler.encoding import configure_encode_pool, get_encode_pool
+
+        config = build_configuration({"output_settings": {"encode_workers": 2}})
+        self.assertEqual(configure_encode_pool(config, 4), 4)
+        self.assertEqual(get_encode_pool()._max_workers, 4)
+        config = build_configuration({"output_settings": {"encode_workers": 6}})
+        self.assertEqual(configure_encode_pool(config, 4), 6)
+        self.assertEqual(get_encode_pool()._max_workers, 6)
+
+
+class TestFaceDetectionFunctions(unittest.TestCase):
+
+    def test_detect_faces_maps_downscaled_boxes_back(self):
+        from imageUpscaler import face_detection
+
+        np_img = np.zeros((1000, 2000, 3), dtype=np.uint8)
+        haar = MagicMock()
+        haar.detectMultiScale.return_value = np.array([[10, 10, 20, 20]])
+        with patch.object(face_detection, '_haar_detector', return_value=haar):
+            faces = face_detection.detect_faces(np_img, detection_size=500)
+        self.assertEqual(haar.detectMultiScale.call_args[0][0].shape, (250, 500))
+        self.assertEqual(faces, [(40, 40, 80, 80)])
+
+    def test_detect_faces_dnn_backend(self):
+        from imageUpscaler import face_detection
+
+        np_img = np.zeros((400, 400, 3), dtype=np.uint8)
+        yunet = MagicMock()
+        yunet.detect.return_value = (1, np.array([[5.0, 6.0, 30.0, 40.0] + [0.0] * 11], dtype=np.float32))
+        with patch.object(face_detection, '_dnn_detector', return_value=yunet):
+            faces = face_detection.detect_faces(np_img, backend="dnn", model_path="yunet.onnx",
+                                                detection_size=200)
+        yunet.setInputSize.assert_called_once_with((200, 200))
+        self.assertEqual(faces, [(10, 12, 60, 80)])
+
+    def test_detect_faces_batch_reuses_detectors(self):
+        import threading
+        from imageUpscaler import face_detection
+
+        images = [np.zeros((64, 64, 3), dtype=np.uint8) for _ in range(4)]
+        haar = MagicMock()
+        haar.detectMultiScale.return_value = []
+        with patch.object(face_detection.cv2, 'CascadeClassifier', return_value=haar) as create, \
+                patch.object(face_detection, '_local', threading.local()):
+            for _ in range(3):
+                self.assertEqual(face_detection.detect_faces_batch(images, workers=2), [[]] * 4)
+        self.assertLessEqual(create.call_count, 2)
+
+
+class TestDedupFunctions(unittest.TestCase):
+
+    def test_find_duplicate_groups_merges_resaved_images(self):
+        import tempfile
+        from imageUpscaler.dedup import find_duplicate_groups
+
+        rng = np.random.default_rng(0)
+        gradient = np.tile(np.linspace(0, 255, 64, dtype=np.uint8), (64, 1))
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            paths = [os.path.join(tmp_dir, name) for name in ("a.png", "b.jpg", "c.png")]
+            Image.fromarray(gradient).convert("RGB").save(paths[0])
+            Image.fromarray(gradient).convert("RGB").resize((128, 128)).save(paths[1], quality=70)
+            Image.fromarray(rng.integers(0, 256, (64, 64, 3), dtype=np.uint8)).save(paths[2])
+
+            for method in ("dhash", "phash"):
+                groups = find_duplicate_groups(paths, method=method)
+                # The larger re-save represents the group
+                self.assertEqual(groups, {paths[1]: [paths[0]], paths[2]: []})
+
+    def test_near_duplicate_search_matches_brute_force(self):
+        from imageUpscaler.dedup import _BKTree, hamming_distance
+
+        rng = np.random.default_rng(0)
+        hashes = [int(value) for value in rng.integers(0, 2**63, 500, dtype=np.int64)]
+        hashes += [value ^ (1 << int(bit)) for value, bit in zip(hashes[:100], rng.integers(0, 63, 100))]
+        tree = _BKTree()
+        for index, value in enumerate(hashes):
+            tree.add(value, index)
+        self.assertEqual(hamming_distance(0b1011, 0b0001), 2)
+        for query in hashes[:50]:
+            expected = [index for index, value in enumerate(hashes) if hamming_distance(query, value) <= 4]
+            self.assertEqual(sorted(tree.search(query, 4)), expected)
+
+
+class TestNotificationFunctions(unittest.TestCase):
+
+    def test_dispatcher_coalesces_outcomes_into_summaries(self):
+        from imageUpscaler.notifications import NotificationDispatcher
+
+        summaries = []
+        with NotificationDispatcher([summaries.append], interval=3600) as dispatcher:
+            for success in [True] * 1240 + [False] * 3:
+                dispatcher.record(success)
+        self.assertEqual(len(summaries), 1)
+        self.assertEqual(summaries[0]["message"], "Finished: 1,240 processed, 3 failed")
+
+    @patch.dict(os.environ, {"DISPLAY": "", "WAYLAND_DISPLAY": ""})
+    @patch('sys.platform', 'linux')
+    def test_desktop_sink_skipped_when_headless(self):
+        from imageUpscaler.notifications import create_sinks, log_sink
+
+        settings = {"sinks": ["desktop", "log"], "webhook_url": None}
+        self.assertEqual(create_sinks(settings), [log_sink])
+
+
+class TestWatcherFunctions(unittest.TestCase):
+
+    def test_polling_watcher_reports_settled_new_files_once(self):
+        import tempfile
+        from imageUpscaler.watcher import PollingWatcher
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            Image.new("RGB", (4, 4)).save(os.path.join(tmp_dir, "existing.png"))
+            watcher = PollingWatcher(tmp_dir, settle_time=0.05)
+            new_path = os.path.join(tmp_dir, "new.png")
+            Image.new("RGB", (4, 4)).save(new_path)
+
+            self.assertEqual(watcher.poll(0), [])
+            self.assertEqual(watcher.poll(0.1), [new_path])
+            self.assertEqual(watcher.poll(0.1), [])
+
+    def test_inotify_overflow_rescans_directory(self):
+        import tempfile
+        from imageUpscaler.watcher import InotifyWatcher, IN_Q_OVERFLOW, _EVENT_HEADER
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            paths = [os.path.join(tmp_dir, name) for name in ("a.png", "b.png")]
+            for img_path in paths:
+                Image.new("RGB", (4, 4)).save(img_path)
+            # Feed the event parser from a pipe instead of a real inotify descriptor
+            read_fd, write_fd = os.pipe()
+            watcher = InotifyWatcher.__new__(InotifyWatcher)
+            watcher.directory, watcher._fd = tmp_dir, read_fd
+            watcher.rescan_filter = lambda found: [p for p in found if not p.endswith("a.png")]
+            os.write(write_fd, _EVENT_HEADER.pack(-1, IN_Q_OVERFLOW, 0, 0))
+            os.close(write_fd)
+            with self.assertLogs("imageUpscaler.watcher", level="WARNING"):
+                self.assertEqual(watcher.poll(1), [paths[1]])
+            watcher.close()
+
+    def test_rewrite_during_processing_is_requeued(self):
+        import tempfile
+        import threading
+        from imageUpscaler import watcher as watcher_module
+        from imageUpscaler.config import build_configuration
+
+        config = build_configuration({"batch_processing": {"journal": False}, "notifications": {"enabled": False},
+                                      "watch": {"backend": "polling", "poll_interval": 0}})
+        stop_event = threading.Event()
+        rewritten = threading.Event()
+        calls = []
+
+        def process_batch(batch, *args, **kwargs):
+            calls.append(batch[0])
+            if len(calls) == 1:
+                rewritten.wait(5)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            img_path = os.path.join(tmp_dir, "in", "img.png")
+            os.makedirs(os.path.dirname(img_path))
+            Image.new("RGB", (4, 4)).save(img_path)
+
+            class FakeWatcher:
+                polls = 0
+
+                def poll(self, timeout):
+                    self.polls += 1
+                    if self.polls == 1:
+                        return [img_path]  # Rewritten while the first run is still going
+                    rewritten.set()
+                    for _ in range(500):
+                        if len(calls) == 2:
+                            stop_event.set()
+                            break
+                        threading.Event().wait(0.01)
+                    return []
+
+                def close(self):
+                    pass
+
+            with patch.object(watcher_module, "process_batch", side_effect=process_batch), \
+                    patch.object(watcher_module, "create_watcher", return_value=FakeWatcher()):
+                watcher_module.watch_and_process(os.path.dirname(img_path), config,
+                                                 os.path.join(tmp_dir, "out"), stop_event)
+        self.assertEqual(calls, [img_path, img_path])
+
+    def test_interrupt_drops_queued_files(self):
+        import tempfile
+        import threading
+        from imageUpscaler import watcher as watcher_module
+        from imageUpscaler.config import build_configuration
+
+        config = build_configuration({"batch_processing": {"journal": False, "max_workers": 1},
+                                      "notifications": {"enabled": False}, "watch": {"backend": "polling"}})
+        started = threading.Event()
+        calls = []
+
+        def process_batch(batch, *args, **kwargs):
+            calls.append(batch[0])
+            started.set()
+            threading.Event().wait(0.2)  # Still running when the interrupt arrives
+
+        class InterruptedWatcher:
+            def poll(self, timeout):
+                started.wait(5)
+                raise KeyboardInterrupt
+
+            def close(self):
+                pass
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            input_directory = os.path.join(tmp_dir, "in")
+            os.makedirs(input_directory)
+            for i in range(20):
+                Image.new("RGB", (4, 4)).save(os.path.join(input_directory, f"{i}.png"))
+            with patch.object(watcher_module, "process_batch", side_effect=process_batch), \
+                    patch.object(watcher_module, "create_watcher", return_value=InterruptedWatcher()):
+                with self.assertRaises(KeyboardInterrupt):
+                    watcher_module.watch_and_process(input_directory, config, os.path.join(tmp_dir, "out"))
+        self.assertEqual(len(calls), 1)
+
+
+class TestShardingFunctions(unittest.TestCase):
+
+    def test_select_shard_partitions_inputs(self):
+        from imageUpscaler.sharding import select_shard, parse_shard
+
+        paths = [os.path.join("/data", f"img_{i}.png") for i in range(50)]
+        shards = [select_shard(paths, "/data", index, 3) for index in range(3)]
+        self.assertEqual(sorted(sum(shards, [])), sorted(paths))
+        # The split depends on the path relative to the input directory, not the mount point
+        self.assertEqual(select_shard([p.replace("/data", "/mnt/share") for p in paths], "/mnt/share", 1, 3),
+                         [p.replace("/data", "/mnt/share") for p in shards[1]])
+        self.assertEqual(parse_shard("2/3"), (2, 3))
+        with self.assertRaises(ValueError):
+            parse_shard("3/3")
+
+    def test_lease_manager_claims_once_and_reclaims_stale_leases(self):
+        import tempfile
+        import time
+        from imageUpscaler.sharding import LeaseManager
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            img_path = os.path.join(tmp_dir, "img.png")
+            Image.new("RGB", (4, 4)).save(img_path)
+            state_dir = os.path.join(tmp_dir, "leases")
+            with LeaseManager(state_dir, tmp_dir, "a", ttl=60) as node_a, \
+                    LeaseManager(state_dir, tmp_dir, "b", ttl=60) as node_b:
+                self.assertTrue(node_a.claim(img_path))
+                self.assertFalse(node_b.claim(img_path))
+
+                # Node a stops renewing: once the lease is older than ttl, b takes over
+                lease_path = node_a._paths(img_path)[0]
+                stale = time.time() - 120
+                os.utime(lease_path, (stale, stale))
+                self.assertTrue(node_b.claim(img_path))
+                # a wakes up late: its release must leave b's lease alone
+                node_a.release(img_path, False)
+                self.assertTrue(os.path.exists(lease_path))
+
+                node_b.release(img_path, True)
+                self.assertFalse(os.path.exists(lease_path))
+                self.assertFalse(node_a.claim(img_path))
+
+    def test_lease_manager_rechecks_done_after_claiming(self):
+        import tempfile
+        from imageUpscaler.sharding import LeaseManager
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            img_path = os.path.join(tmp_dir, "img.png")
+            Image.new("RGB", (4, 4)).save(img_path)
+            state_dir = os.path.join(tmp_dir, "leases")
+            with LeaseManager(state_dir, tmp_dir, "a", ttl=60) as node_a, \
+                    LeaseManager(state_dir, tmp_dir, "b", ttl=60) as node_b:
+                self.assertTrue(node_a.claim(img_path))
+                is_done = node_b._is_done
+
+                def finish_in_between(*args):
+                    # b finds the input unfinished, then a finishes and releases it before b's create
+                    done = is_done(*args)
+                    node_b._is_done = is_done
+                    node_a.release(img_path, True)
+                    return done
+
+                node_b._is_done = finish_in_between
+                self.assertFalse(node_b.claim(img_path))
+                self.assertFalse(os.path.exists(node_b._paths(img_path)[0]))
+
+    def test_lease_manager_release_survives_a_vanished_input(self):
+        import tempfile
+        from imageUpscaler.sharding import LeaseManager
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            img_path = os.path.join(tmp_dir, "img.png")
+            Image.new("RGB", (4, 4)).save(img_path)
+            with LeaseManager(os.path.join(tmp_dir, "leases"), tmp_dir, "a", ttl=60) as node_a:
+                self.assertTrue(node_a.claim(img_path))
+                os.remove(img_path)
+                node_a.release(img_path, True)
+                self.assertFalse(os.path.exists(node_a._paths(img_path)[0]))
+
+
+class TestSequenceFunctions(unittest.TestCase):
+
+    def test_animations_are_rewritten_frame_by_frame(self):
+        import tempfile
+        from imageUpscaler.sequences import is_sequence, iter_frames, SequenceWriter
+
+        frames = [Image.new("RGB", (20, 10), (i * 40, 0, 0)) for i in range(4)]
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            source = os.path.join(tmp_dir, "clip.gif")
+            frames[0].save(source, save_all=True, append_images=frames[1:], duration=80, loop=0)
+            still = os.path.join(tmp_dir, "still.png")
+            frames[0].save(still)
+            self.assertTrue(is_sequence(source))
+            self.assertFalse(is_sequence(still))
+
+            for extension in (".gif", ".png"):
+                output = os.path.join(tmp_dir, "out" + extension)
+                with SequenceWriter(output) as writer:
+                    for frame, duration in iter_frames(source):
+                        writer.write(frame.resize((40, 20)), duration)
+                with Image.open(output) as result:
+                    self.assertEqual((result.size, result.n_frames), ((40, 20), 4))
+                    result.seek(3)
+                    self.assertEqual(result.info["duration"], 80)
+                    self.assertEqual(result.convert("RGB").getpixel((5, 5)), (120, 0, 0))
+
+    def test_prefetch_keeps_order_and_reraises(self):
+        from imageUpscaler.sequences import prefetch, batched
+
+        self.assertEqual(list(batched(prefetch(range(7), 2), 3)), [[0, 1, 2], [3, 4, 5], [6]])
+
+        def failing():
+            yield 1
+            raise IOError("truncated clip")
+        with self.assertRaises(IOError):
+            list(prefetch(failing(), 2))
+
+    def test_sequence_detects_faces_per_batch(self):
+        import tempfile
+        from imageUpscaler.config import build_configuration
+        from imageUpscaler.main import process_sequence
+
+        config = build_configuration({"upscale_factor": 1.0, "watermark_text": "", "crop_settings": None,
+                                      "flip_mode": None, "face_detection": True,
+                                      "sequence_processing": {"ai_batch_size": 3},
+                                      "output_settings": {"preserve_original": False}})
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            gif_path = os.path.join(tmp_dir, "clip.gif")
+            frames = [Image.new("RGB", (16, 16), (40 * i, 0, 0)) for i in range(5)]
+            frames[0].save(gif_path, save_all=True, append_images=frames[1:], duration=50)
+            with patch("imageUpscaler.main.detect_faces_batch",
+                       side_effect=lambda images, **kwargs: [[(2, 2, 4, 4)] for _ in images]) as detect:
+                output_path = process_sequence(gif_path, config, tmp_dir)
+            self.assertEqual([len(call.args[0]) for call in detect.call_args_list], [3, 2])
+            with Image.open(output_path) as result:
+                self.assertEqual(result.n_frames, 5)
+
+    def test_sequence_without_frames_fails(self):
+        import tempfile
+        from imageUpscaler.config import build_configuration
+        from imageUpscaler.main import process_sequence
+
+        config = build_configuration({"upscale_factor": 1.0, "watermark_text": "", "crop_settings": None,
+                                      "flip_mode": None, "output_settings": {"naming_convention": "{original_name}",
+                                                                             "preserve_original": False}})
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            gif_path = os.path.join(tmp_dir, "clip.gif")
+            frames = [Image.new("RGB", (8, 8), color) for color in ("red", "blue")]
+            frames[0].save(gif_path, save_all=True, append_images=frames[1:], duration=50)
+            output_directory = os.path.join(tmp_dir, "out")
+            os.makedirs(output_directory)
+            with patch("imageUpscaler.main.iter_frames", return_value=iter([])), \
+                    self.assertLogs("imageUpscaler.main", level="ERROR"):
+                self.assertIsNone(process_sequence(gif_path, config, output_directory))
+            self.assertEqual(os.listdir(output_directory), [])
+
+
+class TestArchiveFunctions(unittest.TestCase):
+
+    def test_archive_and_stdin_inputs(self):
+        import io
+        import tarfile
+        import tempfile
+        import zipfile
+        from imageUpscaler.archives import iter_stream_inputs, iter_length_prefixed, write_length_prefixed
+
+        buffer = io.BytesIO()
+        Image.new("RGB", (4, 4), (255, 0, 0)).save(buffer, format="JPEG")
+        data = buffer.getvalue()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            tar_path = os.path.join(tmp_dir, "in.tar.gz")
+            with tarfile.open(tar_path, "w:gz") as archive:
+                for name in ("a/img.jpg", "notes.txt"):
+                    info = tarfile.TarInfo(name)
+                    info.size = len(data)
+                    archive.addfile(info, io.BytesIO(data))
+            zip_path = os.path.join(tmp_dir, "in.zip")
+            with zipfile.ZipFile(zip_path, "w") as archive:
+                archive.writestr("img.jpg", data)
+
+            self.assertEqual([(m.name, m.data) for m in iter_stream_inputs(tar_path)], [("a/img.jpg", data)])
+            self.assertEqual([m.name for m in iter_stream_inputs(zip_path)], ["img.jpg"])
+
+        stream = io.BytesIO()
+        write_length_prefixed(stream, data)
+        write_length_prefixed(stream, data)
+        stream.seek(0)
+        self.assertEqual([m.name for m in iter_length_prefixed(stream)], ["stdin_000000.jpg", "stdin_000001.jpg"])
+
+    def test_stdin_stream_skips_corrupt_record(self):
+        import io
+        from imageUpscaler.archives import iter_length_prefixed, write_length_prefixed
+
+        buffer = io.BytesIO()
+        Image.new("RGB", (4, 4)).save(buffer, format="PNG")
+        stream = io.BytesIO()
+        for data in (buffer.getvalue(), b"not an image", buffer.getvalue()):
+            write_length_prefixed(stream, data)
+        stream.seek(0)
+        with self.assertLogs("imageUpscaler.archives", level="ERROR"):
+            names = [m.name for m in iter_length_prefixed(stream)]
+        self.assertEqual(names, ["stdin_000000.png", "stdin_000002.png"])
+
+    def test_archive_writer_appears_on_close(self):
+        import tempfile
+        import zipfile
+        from imageUpscaler.archives import ArchiveWriter
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            archive_path = os.path.join(tmp_dir, "out.zip")
+            with ArchiveWriter(archive_path) as archive:
+                archive.submit_encode(Image.new("RGB", (4, 4)), "img.png", "PNG").result()
+                self.assertFalse(os.path.exists(archive_path))
+            with zipfile.ZipFile(archive_path) as archive:
+                self.assertEqual(archive.namelist(), ["img.png"])
+                self.assertEqual(Image.open(archive.open("img.png")).size, (4, 4))
+
+    def test_archive_writer_discards_failed_run(self):
+        import tempfile
+        from imageUpscaler.archives import ArchiveWriter
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            archive_path = os.path.join(tmp_dir, "out.tar")
+            with self.assertRaises(RuntimeError):
+                with ArchiveWriter(archive_path) as archive:
+                    archive.write("img.png", b"data")
+                    raise RuntimeError("interrupted")
+            self.assertEqual(os.listdir(tmp_dir), [])
+
+    def test_sequence_into_output_archive(self):
+        import tarfile
+        import tempfile
+        from imageUpscaler.archives import ArchiveWriter
+        from imageUpscaler.config import build_configuration
+        from imageUpscaler.main import process_image
+
+        config = build_configuration({"upscale_factor": 1.0, "watermark_text": "", "crop_settings": None,
+                                      "flip_mode": None, "output_settings": {"naming_convention": "{original_name}"}})
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            gif_path = os.path.join(tmp_dir, "clip.gif")
+            frames = [Image.new("RGB", (8, 8), color) for color in ("red", "blue")]
+            frames[0].save(gif_path, save_all=True, append_images=frames[1:], duration=50)
+            archive_path = os.path.join(tmp_dir, "out.tar")
+            with ArchiveWriter(archive_path) as archive:
+                output_path = process_image(gif_path, config, tmp_dir, archive)
+            self.assertEqual(output_path, f"{archive_path}/clip.gif")
+            with tarfile.open(archive_path) as archive:
+                self.assertEqual(sorted(archive.getnames()), ["clip.gif", "original_clip.gif"])
+                self.assertEqual(Image.open(archive.extractfile("clip.gif")).n_frames, 2)
+
+    def test_archive_members_keep_their_directories(self):
+        import io
+        import tarfile
+        import tempfile
+        from imageUpscaler.archives import ArchiveMember, ArchiveWriter, output_subdirectory
+        from imageUpscaler.config import build_configuration
+        from imageUpscaler.main import process_image
+
+        self.assertEqual(output_subdirectory(ArchiveMember("/a/../b/img.png", b"")), "a/b")
+        self.assertEqual(output_subdirectory("in/img.png"), "")
+        config = build_configuration({"upscale_factor": 1.0, "watermark_text": "", "crop_settings": None,
+                                      "flip_mode": None, "output_settings": {"naming_convention": "{original_name}",
+                                                                             "preserve_original": False}})
+        buffer = io.BytesIO()
+        Image.new("RGB", (4, 4)).save(buffer, format="PNG")
+        members = [ArchiveMember(name, buffer.getvalue()) for name in ("a/img.png", "b/img.png")]
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            archive_path = os.path.join(tmp_dir, "out.tar")
+            with ArchiveWriter(archive_path) as archive:
+                for member in members:
+                    process_image(member, config, tmp_dir, archive)
+            with tarfile.open(archive_path) as archive:
+                self.assertEqual(sorted(archive.getnames()), ["a/img.png", "b/img.png"])
+            output_directory = os.path.join(tmp_dir, "out")
+            for member in members:
+                process_image(member, config, output_directory)
+            self.assertTrue(os.path.isfile(os.path.join(output_directory, "a", "img.png")))
+            self.assertTrue(os.path.isfile(os.path.join(output_directory, "b", "img.png")))
+
+
+def _negate_frame(frame):
+    return 255 - frame
+
+
+def _reject_frame_three(frame):
+    if frame[0, 0, 0] == 3:
+        raise ValueError("bad frame")
+    return 255 - frame
+
+
+class TestSharedFramesFunctions(unittest.TestCase):
+
+    def test_pool_reuses_slots_and_bounds_usage(self):
+        from imageUpscaler.shared_frames import SharedFramePool
+
+        frame = np.arange(48, dtype=np.uint8).reshape(4, 4, 3)
+        with SharedFramePool(2, frame.nbytes) as pool:
+            first = pool.put(frame)
+            np.testing.assert_array_equal(pool.view(first), frame)
+            second, _ = pool.acquire((4, 4))
+            with self.assertRaises(TimeoutError):
+                pool.acquire((4, 4), timeout=0.01)
+            pool.release(first)
+            self.assertEqual(pool.put(frame).slot, first.slot)
+            with self.assertRaises(ValueError):
+                pool.acquire((8, 8, 3))
+
+    def test_map_frames_in_worker_processes(self):
+        from imageUpscaler.shared_frames import SharedFramePool, map_frames
+
+        frames = [np.full((16, 16, 3), i, dtype=np.uint8) for i in range(6)]
+        with SharedFramePool(3, frames[0].nbytes) as pool:
+            results = [int(result[0, 0, 0]) for result in map_frames(_negate_frame, frames, pool, processes=2)]
+        self.assertEqual(results, [255 - i for i in range(6)])
+
+    def test_map_frames_releases_slots_on_failure(self):
+        from imageUpscaler.shared_frames import SharedFramePool, map_frames
+
+        frames = [np.full((16, 16, 3), i, dtype=np.uint8) for i in range(6)]
+        with SharedFramePool(3, frames[0].nbytes) as pool:
+            with self.assertRaises(ValueError):
+                list(map_frames(_reject_frame_three, frames, pool, processes=2))
+            for _ in map_frames(_negate_frame, frames, pool, processes=2):
+                break
+            for _ in range(pool.slots):
+                pool.acquire((16, 16, 3), timeout=1)
+
+
+class TestFrameStoreFunctions(unittest.TestCase):
+
+    def test_frame_round_trip(self):
+        import tempfile
+        from imageUpscaler.frame_store import write_frame, read_frame, frame_to_image
+
+        np_img = np.random.randint(0, 256, (32, 48, 3), dtype=np.uint8)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            frame_path = write_frame(Image.fromarray(np_img), os.path.join(tmp_dir, "image.iuf"))
+            frame = read_frame(frame_path)
+            self.assertIsInstance(frame, np.memmap)
+            np.testing.assert_array_equal(frame, np_img)
+            self.assertEqual(frame_to_image(frame).size, (48, 32))
+            np.testing.assert_array_equal(np.asarray(frame_to_image(frame)), np_img)
+            del frame
+
+    def test_frame_image_shares_the_mapping(self):
+        import tempfile
+        from imageUpscaler.frame_store import write_frame, read_frame, frame_to_image
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for shape in ((8, 6), (8, 6, 4)):
+                frame_path = write_frame(np.zeros(shape, dtype=np.uint8), os.path.join(tmp_dir, "image.iuf"))
+                frame = read_frame(frame_path, mode="r+")
+                img = frame_to_image(frame)
+                frame[0, 0] = 200
+                self.assertEqual(np.asarray(img)[0, 0].tolist(), frame[0, 0].tolist())
+                del img, frame
+
+    def test_read_frame_invalid_file(self):
+        import tempfile
+        from imageUpscaler.frame_store import read_frame
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            bad_path = os.path.join(tmp_dir, "bad.iuf")
+            with open(bad_path, "wb") as f:
+                f.write(b"not a frame")
+            with self.assertRaises(ValueError):
+                read_frame(bad_path)
 
 
 class TestMetadataFunctions(unittest.TestCase):
@@ -129,6 +1316,21 @@ class TestMetadataFunctions(unittest.TestCase):
 
 
 
+class TestCliFunctions(unittest.TestCase):
+
+    def test_logging_only_for_processing_commands(self):
+        from imageUpscaler import run
+
+        with patch.object(run, "setup_logging") as setup_logging, patch.object(run, "show_version"), \
+                patch.object(run, "run_benchmark"):
+            with patch("sys.argv", ["imageUpscaler", "version"]):
+                run.main_cli()
+            setup_logging.assert_not_called()
+            with patch("sys.argv", ["imageUpscaler", "benchmark", "encode"]):
+                run.main_cli()
+            setup_logging.assert_called_once_with()
+
+
 class TestBannerFunctions(unittest.TestCase):
 
     @patch('builtins.print')
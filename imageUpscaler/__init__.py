@@ -3,11 +3,16 @@ ImageUpscaler - Advanced Image Processing Package
 Version: 3.2
 """
 
+import logging
+
+# Library default: stay silent unless the application configures logging
+logging.getLogger(__name__).addHandler(logging.NullHandler())
+
 from .main import main, process_image
 from .image_processing import *
 from .filters import *
 from .transformations import *
-from .config import load_configuration, default_config
+from .config import load_configuration, build_configuration, default_config, ConfigError
 
 __version__ = '3.2'
 __author__ = 'Aas1kk'
@@ -21,6 +26,8 @@ __all__ = [
     'main',
     'process_image',
     'load_configuration',
+    'build_configuration',
+    'ConfigError',
     'default_config',
     'get_version',
     '__version__',
@@ -0,0 +1,28 @@
+from imageUpscaler.image_analysis import quick_quality_metrics
+
+# Noise sigma at which the configured denoise strength is used in full;
+# cleaner images get a proportionally weaker (and cheaper) NLM pass.
+REFERENCE_NOISE_SIGMA = 10.0
+
+def plan_adaptive_stages(img, settings, noise_strength=1.0):
+    """Decide per image which expensive stages to run, based on cheap metrics.
+
+    Returns a dict with the enabled flag for noise_reduction, smart_sharpen and
+    auto_color_correction, the tuned noise strength, and the metrics used.
+    """
+    metrics = quick_quality_metrics(img, settings["thumbnail_size"])
+
+    noise_strength = noise_strength * min(
+        1.0, metrics["noise_sigma"] / REFERENCE_NOISE_SIGMA)
+    plan = {
+        "noise_reduction": metrics["noise_sigma"] >= settings["noise_threshold"],
+        "smart_sharpen": metrics["blur_variance"] < settings["blur_threshold"],
+        "auto_color_correction": metrics["histogram_spread"] < settings["histogram_spread_threshold"],
+        "noise_strength": noise_strength,
+        "metrics": metrics
+    }
+    return plan
+
+def skipped_stages(plan, requested):
+    """Return the requested stages that the adaptive plan decided to skip."""
+    return [stage for stage in requested if not plan[stage]]
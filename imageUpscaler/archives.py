@@ -0,0 +1,190 @@
+import logging
+import os
+import posixpath
+import struct
+import sys
+import tarfile
+import threading
+import time
+import zipfile
+from collections import namedtuple
+from io import BytesIO
+from PIL import Image
+from imageUpscaler.encoding import FORMAT_EXTENSIONS, encode_image, get_encode_pool
+from imageUpscaler.file_utils import SUPPORTED_EXTENSIONS, open_image
+from imageUpscaler.frame_store import FRAME_EXTENSION
+from imageUpscaler.sequences import VIDEO_EXTENSIONS
+
+logger = logging.getLogger(__name__)
+
+# An input read from an archive or stream: its name inside the archive and its encoded bytes
+ArchiveMember = namedtuple("ArchiveMember", ["name", "data"])
+
+TAR_EXTENSIONS = (".tar", ".tar.gz", ".tgz")
+ARCHIVE_EXTENSIONS = TAR_EXTENSIONS + (".zip",)
+STDIN = "-"
+# Frame-store files are memory-mapped and videos are read by OpenCV, both from disk,
+# so archives only carry encoded images (an animation yields its first frame)
+ARCHIVE_IMAGE_EXTENSIONS = tuple(ext for ext in SUPPORTED_EXTENSIONS
+                                 if ext != FRAME_EXTENSION and ext not in VIDEO_EXTENSIONS)
+_LENGTH = struct.Struct(">Q")
+
+def is_archive(path):
+    """Return True if the path names a tar, tar.gz or zip archive."""
+    return str(path).lower().endswith(ARCHIVE_EXTENSIONS)
+
+def is_stream_source(source):
+    """Return True if inputs come from an archive or stdin rather than a directory."""
+    return source == STDIN or is_archive(source)
+
+def input_name(source):
+    """Name of an input for logging and output naming: its path, or its name inside an archive."""
+    return source.name if isinstance(source, ArchiveMember) else source
+
+def output_subdirectory(source):
+    """Directory, relative to the output, for an input's outputs: an archive member's own directory.
+
+    Members with the same file name in different directories of one archive
+    would otherwise produce the same output name. Absolute and parent
+    components are dropped, so outputs stay inside the output directory.
+    """
+    if not isinstance(source, ArchiveMember):
+        return ""
+    parts = posixpath.dirname(source.name.replace("\\", "/")).split("/")
+    return "/".join(part for part in parts if part not in ("", ".", ".."))
+
+def open_input(source):
+    """Open a directory input by path, or an archive member from its bytes."""
+    if isinstance(source, ArchiveMember):
+        return Image.open(BytesIO(source.data))
+    return open_image(source)
+
+def _is_image_name(name):
+    return name.lower().endswith(ARCHIVE_IMAGE_EXTENSIONS)
+
+def iter_tar(path):
+    """Yield the images of a tar or tar.gz archive in stored order, reading it as a stream."""
+    with tarfile.open(path, mode="r|*") as archive:
+        for member in archive:
+            if member.isfile() and _is_image_name(member.name):
+                yield ArchiveMember(member.name, archive.extractfile(member).read())
+
+def iter_zip(path):
+    """Yield the images of a zip archive in stored order."""
+    with zipfile.ZipFile(path) as archive:
+        for info in archive.infolist():
+            if not info.is_dir() and _is_image_name(info.filename):
+                yield ArchiveMember(info.filename, archive.read(info))
+
+def iter_length_prefixed(stream):
+    """Yield images from a stream of records, each an 8-byte big-endian length and the image bytes.
+
+    Records carry no names, so inputs are numbered in arrival order and
+    take the extension of their detected format. A record that is not a
+    readable image is logged and skipped, keeping its number.
+    """
+    index = 0
+    while True:
+        header = stream.read(_LENGTH.size)
+        if not header:
+            return
+        if len(header) < _LENGTH.size:
+            raise ValueError("Input stream ended inside a record header.")
+        (length,) = _LENGTH.unpack(header)
+        data = stream.read(length)
+        if len(data) < length:
+            raise ValueError(f"Input stream ended inside record {index}.")
+        try:
+            with Image.open(BytesIO(data)) as img:
+                fmt = img.format
+        except (IOError, OSError) as e:
+            logger.error("Skipping stdin record %s: %s", index, e)
+        else:
+            yield ArchiveMember(f"stdin_{index:06d}{FORMAT_EXTENSIONS.get(fmt, '.png')}", data)
+        index += 1
+
+def write_length_prefixed(stream, data):
+    """Write one record of a length-prefixed image stream."""
+    stream.write(_LENGTH.pack(len(data)))
+    stream.write(data)
+
+def iter_stream_inputs(source):
+    """Yield ArchiveMembers from an archive path, or from stdin for "-"."""
+    if source == STDIN:
+        return iter_length_prefixed(sys.stdin.buffer)
+    if source.lower().endswith(TAR_EXTENSIONS):
+        return iter_tar(source)
+    if source.lower().endswith(".zip"):
+        return iter_zip(source)
+    raise ValueError(f"Unsupported input archive: {source}")
+
+class ArchiveWriter:
+    """Writes outputs as members of a tar, tar.gz or zip archive instead of files.
+
+    Members are appended as they finish, from any thread. The archive is
+    built under a temporary name and only moved into place when closed
+    after a successful run; an interrupted or failed run deletes it, so a
+    truncated archive is never left behind.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._tmp_path = f"{path}.partial"
+        self._lock = threading.Lock()
+        if path.lower().endswith(".zip"):
+            # Image formats are already compressed; deflating them again only costs time
+            self._archive = zipfile.ZipFile(self._tmp_path, "w", compression=zipfile.ZIP_STORED)
+        elif path.lower().endswith(TAR_EXTENSIONS):
+            self._archive = tarfile.open(self._tmp_path, "w" if path.lower().endswith(".tar") else "w:gz")
+        else:
+            raise ValueError(f"Unsupported output archive: {path}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close(commit=exc_type is None)
+
+    def member_path(self, name):
+        """How an output stored in the archive is reported, e.g. in the journal."""
+        return f"{self.path}/{name}"
+
+    def write(self, name, data):
+        """Append a member holding data."""
+        with self._lock:
+            if isinstance(self._archive, zipfile.ZipFile):
+                info = zipfile.ZipInfo(name, date_time=time.localtime()[:6])
+                self._archive.writestr(info, data)
+            else:
+                info = tarfile.TarInfo(name)
+                info.size = len(data)
+                info.mtime = time.time()
+                self._archive.addfile(info, BytesIO(data))
+        return self.member_path(name)
+
+    def add_file(self, name, path):
+        """Append the file at path as a member, streaming it from disk."""
+        with self._lock:
+            if isinstance(self._archive, zipfile.ZipFile):
+                self._archive.write(path, arcname=name)
+            else:
+                self._archive.add(path, arcname=name)
+        return self.member_path(name)
+
+    def submit_encode(self, img, name, fmt, profile="balanced", quality=85):
+        """Encode img on the shared encode pool and append it as a member; return the future."""
+        def encode():
+            buffer = BytesIO()
+            encode_image(img, buffer, fmt, profile, quality)
+            return self.write(name, buffer.getvalue())
+        return get_encode_pool().submit(encode)
+
+    def close(self, commit=True):
+        """Finish the archive and publish it, or with commit=False discard it."""
+        self._archive.close()
+        if commit:
+            os.replace(self._tmp_path, self.path)
+            logger.info("Wrote output archive %s", self.path)
+        else:
+            os.remove(self._tmp_path)
+            logger.warning("Run did not complete; discarded output archive %s", self.path)
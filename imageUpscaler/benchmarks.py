@@ -0,0 +1,218 @@
+import io
+import os
+import tempfile
+import time
+import logging
+import numpy as np
+import cv2
+import torch
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+def time_call(fn, repeats=5):
+    """Return the median wall time of fn() over repeats runs, after one warm-up call."""
+    fn()
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings))
+
+def format_results(results, baseline=None):
+    """Render benchmark results as an aligned text table with speedups."""
+    baseline = baseline or results[0]["seconds"]
+    width = max(len(result["name"]) for result in results)
+    lines = []
+    for result in results:
+        extra = "".join(f"  {key}={value}" for key, value in result.items()
+                        if key not in ("name", "seconds"))
+        lines.append(f"{result['name']:<{width}}  {result['seconds'] * 1000:9.1f} ms"
+                     f"  x{baseline / result['seconds']:.2f}{extra}")
+    return "\n".join(lines)
+
+def benchmark_cpu_inference(size=512, batch_size=1, repeats=5):
+    """Time the enhancement model on CPU for each optimisation level and backend."""
+    from imageUpscaler.inference import (
+        CPU_OPTIMIZATION_LEVELS, optimize_model_for_cpu, prepare_input, cpu_inference_context
+    )
+
+    configurations = [(f"level={level}", dict(options)) for level, options in CPU_OPTIMIZATION_LEVELS.items()]
+    configurations.insert(0, ("fp32 eager (no_grad)", None))
+    for backend in ("compile", "onnx"):
+        configurations.append((f"backend={backend}", dict(CPU_OPTIMIZATION_LEVELS["medium"], backend=backend)))
+
+    batch = torch.rand(batch_size, 3, size, size)
+    results = []
+    for name, options in configurations:
+        model = torch.nn.Sequential(
+            torch.nn.Conv2d(3, 64, 3, padding=1),
+            torch.nn.ReLU(),
+            torch.nn.Conv2d(64, 3, 3, padding=1)
+        ).eval()
+        try:
+            if options is None:
+                def run():
+                    with torch.no_grad():
+                        model(batch)
+            else:
+                optimized = optimize_model_for_cpu(model, options)
+                prepared = prepare_input(batch, options)
+
+                def run():
+                    with cpu_inference_context(options):
+                        optimized(prepared)
+            results.append({"name": name, "seconds": time_call(run, repeats)})
+        except Exception as e:
+            logger.warning("Skipping %s: %s", name, e)
+    return results
+
+def benchmark_upscale(size=512, factor=2.0, repeats=5):
+    """Time each upscale backend and report PSNR/SSIM against the default PIL output."""
+    from skimage.metrics import peak_signal_noise_ratio, structural_similarity
+    from imageUpscaler.resample import UPSCALE_BACKENDS, upscale
+
+    # Smooth content with edges, so the comparison reflects interpolation rather than noise
+    rng = np.random.default_rng(0)
+    np_img = cv2.GaussianBlur(rng.integers(0, 256, (size, size, 3), dtype=np.uint8), (0, 0), 3)
+    cv2.rectangle(np_img, (size // 4, size // 4), (3 * size // 4, 3 * size // 4), (255, 255, 255), 2)
+    img = Image.fromarray(np_img)
+
+    reference = np.asarray(upscale(img, factor, "pil"))
+    results = []
+    for backend in UPSCALE_BACKENDS:
+        output = np.asarray(upscale(img, factor, backend))
+        identical = np.array_equal(output, reference)
+        results.append({
+            "name": backend,
+            "seconds": time_call(lambda: upscale(img, factor, backend), repeats),
+            "psnr": "inf" if identical else f"{peak_signal_noise_ratio(reference, output):.2f}",
+            "ssim": f"{structural_similarity(reference, output, channel_axis=2):.4f}"
+        })
+    return results
+
+def benchmark_encoders(size=1024, repeats=3):
+    """Time each format/profile pair and report the encoded size."""
+    from imageUpscaler.encoding import ENCODER_PROFILES, encoder_options
+
+    # Photo-like content: smooth gradients with mild noise
+    rng = np.random.default_rng(0)
+    yy, xx = np.mgrid[0:size, 0:size]
+    base = np.stack([xx, yy, (xx + yy) // 2], axis=2) * (255.0 / size)
+    np_img = np.clip(base + rng.normal(0, 4, base.shape), 0, 255).astype(np.uint8)
+    img = Image.fromarray(np_img)
+
+    results = []
+    for fmt, profiles in ENCODER_PROFILES.items():
+        for profile in profiles:
+            options = encoder_options(fmt, profile)
+            buffer = io.BytesIO()
+
+            def run():
+                buffer.seek(0)
+                buffer.truncate()
+                img.save(buffer, format=fmt, **options)
+            seconds = time_call(run, repeats)
+            results.append({
+                "name": f"{fmt}/{profile}",
+                "seconds": seconds,
+                "size": f"{buffer.tell() / 1024:.1f}KB"
+            })
+    return results
+
+def _invert_frame(frame):
+    return 255 - frame
+
+def benchmark_transport(size=2048, images=8, repeats=3, processes=2):
+    """Time a trivial per-frame step in worker processes, with pickled vs shared-memory frames."""
+    import multiprocessing
+    from imageUpscaler.shared_frames import SharedFramePool, map_frames
+
+    frames = [np.full((size, size, 3), i, dtype=np.uint8) for i in range(images)]
+
+    def pickled():
+        with multiprocessing.get_context().Pool(processes) as workers:
+            for _ in workers.imap(_invert_frame, frames):
+                pass
+
+    with SharedFramePool(processes * 2 + 1, frames[0].nbytes) as frame_pool:
+        def shared():
+            for _ in map_frames(_invert_frame, frames, frame_pool, processes):
+                pass
+        return [
+            {"name": "pickle", "seconds": time_call(pickled, repeats)},
+            {"name": "shared_memory", "seconds": time_call(shared, repeats)},
+        ]
+
+# Pipelines compared by benchmark_thread_splits, as overrides of default_config
+PIPELINE_VARIANTS = {
+    "upscale": {},
+    "denoise": {"noise_reduction": {"enabled": True}},
+    "ai": {"advanced_features": {"ai_enhancement": True}},
+    "full": {
+        "noise_reduction": {"enabled": True},
+        "advanced_features": {
+            "smart_sharpen": {"enabled": True},
+            "auto_color_correction": True,
+            "detail_enhancement": {"enabled": True}
+        }
+    },
+}
+
+def benchmark_config(*overrides):
+    """Return a default configuration suited to benchmarking, with layers of overrides applied."""
+    from imageUpscaler.config import build_configuration
+
+    return build_configuration({
+        "watermark_text": "",
+        "crop_settings": None,
+        "flip_mode": None,
+        "output_settings": {"preserve_original": False},
+        "batch_processing": {"journal": False},
+        "notifications": {"enabled": False},
+    }, *(layer for layer in overrides if layer))
+
+def thread_splits(cores=None):
+    """Candidate (workers, library threads) splits that use all cores."""
+    cores = cores or os.cpu_count() or 1
+    return [(workers, cores // workers) for workers in range(1, cores + 1) if cores % workers == 0]
+
+def benchmark_thread_splits(variants=None, images=8, size=512, cores=None):
+    """Time whole batches for each pipeline variant under every worker/thread split."""
+    from imageUpscaler.main import load_images_and_process
+
+    variants = variants or PIPELINE_VARIANTS
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        input_directory = os.path.join(tmp_dir, "input")
+        os.makedirs(input_directory)
+        rng = np.random.default_rng(0)
+        for i in range(images):
+            np_img = rng.integers(0, 256, (size, size, 3), dtype=np.uint8)
+            Image.fromarray(np_img).save(os.path.join(input_directory, f"image{i}.png"))
+
+        for variant, overrides in variants.items():
+            for workers, inner in thread_splits(cores):
+                config = benchmark_config(overrides, {"batch_processing": {
+                    "max_workers": workers, "threads": workers * inner}})
+                output_directory = os.path.join(tmp_dir, f"{variant}_{workers}x{inner}")
+                os.makedirs(output_directory)
+                start = time.perf_counter()
+                load_images_and_process(input_directory, config, output_directory)
+                results.append({
+                    "name": f"{variant} {workers}x{inner}",
+                    "seconds": time.perf_counter() - start,
+                    "variant": variant,
+                    "workers": workers,
+                    "threads": inner
+                })
+    return results
+
+def best_splits(results):
+    """Pick the fastest split per pipeline variant from benchmark_thread_splits results."""
+    best = {}
+    for result in results:
+        if result["variant"] not in best or result["seconds"] < best[result["variant"]]["seconds"]:
+            best[result["variant"]] = result
+    return best
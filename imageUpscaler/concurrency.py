@@ -0,0 +1,55 @@
+import logging
+import os
+import cv2
+import torch
+
+logger = logging.getLogger(__name__)
+
+try:
+    from threadpoolctl import threadpool_limits
+except ImportError:  # Optional: without it BLAS pools keep their own sizing
+    threadpool_limits = None
+
+_inner_threads = None
+
+def plan_thread_budget(max_workers, total_threads="auto"):
+    """Split a thread budget into (outer workers, threads per library call).
+
+    total_threads is the number of threads the whole process may keep busy,
+    "auto" meaning one per CPU. Workers are capped at the budget, and each
+    worker's OpenCV/torch/BLAS calls get an equal share of what is left.
+    """
+    if total_threads in (None, "auto"):
+        cores = os.cpu_count() or 1
+    else:
+        cores = int(total_threads)
+    workers = max(1, min(max_workers, cores))
+    return workers, max(1, cores // workers)
+
+def apply_thread_limits(inner_threads):
+    """Limit the internal thread pools of OpenCV, torch and BLAS.
+
+    These pools are process-wide, so one call before the workers start
+    applies the per-worker share to every worker thread.
+    """
+    global _inner_threads
+    _inner_threads = inner_threads
+    cv2.setNumThreads(inner_threads)
+    if torch.get_num_threads() != inner_threads:
+        torch.set_num_threads(inner_threads)
+    if threadpool_limits is not None:
+        threadpool_limits(limits=inner_threads)
+
+def inner_thread_count():
+    """Threads one worker may use for its own parallel work (e.g. tiling)."""
+    return _inner_threads or os.cpu_count() or 1
+
+def configure_threads(config):
+    """Plan and apply the thread budget from batch_processing; return (workers, inner)."""
+    workers, inner = plan_thread_budget(
+        config["batch_processing"]["max_workers"],
+        config["batch_processing"]["threads"]
+    )
+    apply_thread_limits(inner)
+    logger.info("Thread budget: %s workers x %s library threads", workers, inner)
+    return workers, inner
@@ -1,11 +1,18 @@
+import difflib
 import json
 import logging
 import os
 
+logger = logging.getLogger(__name__)
+
 default_config = {
     "input_directory": ".",
     "output_directory": ".",
     "upscale_factor": 2.0,
+    "upscale_settings": {
+        "backend": "pil",  # pil, pil_tiled, opencv_lanczos4, opencv_cubic, or integer
+        "tile_size": 256  # Output rows per strip for pil_tiled
+    },
     "contrast_factor": 1.0,
     "color_factor": 1.0,
     "watermark_text": "Sample Watermark",
@@ -18,12 +25,20 @@ default_config = {
     "noise_reduction": {
         "enabled": False,
         "method": "nlm",  # nlm, wavelet, or bilateral
-        "strength": 1.0
+        "strength": 1.0,
+        "preset": "balanced",  # NLM tier: quality, balanced, or fast
+        "tile_size": 512  # Tile edge for multi-threaded NLM, 0 to disable
     },
     "histogram_equalization": False,
     "sepia_filter": False,
     "vignette_filter": False,
     "face_detection": False,
+    "face_detection_settings": {
+        "backend": "haar",  # haar, or dnn (OpenCV YuNet, needs model_path)
+        "detection_size": 800,  # Detect on a copy with at most this long edge, 0 for full size
+        "model_path": None,  # face_detection_yunet ONNX model for the dnn backend
+        "score_threshold": 0.6  # dnn only: minimum face confidence
+    },
     "background_removal": False,
     "compression_quality": 85,
     "preserve_metadata": True,
@@ -39,43 +54,271 @@ default_config = {
         "auto_color_correction": False,
         "detail_enhancement": {
             "enabled": False,
-            "strength": 1.0
+            "strength": 1.0,
+            "method": "detail",  # detail, edge, or frequency
+            "luma_only": True  # frequency only: filter luma instead of every channel
         }
     },
+    "adaptive_processing": {
+        "enabled": False,  # Skip or tune expensive stages per image from cheap metrics
+        "thumbnail_size": 256,
+        "noise_threshold": 2.0,  # Denoise only above this estimated noise sigma
+        "blur_threshold": 100.0,  # Sharpen only below this Laplacian variance
+        "histogram_spread_threshold": 200  # Color-correct only below this 1-99% luma spread
+    },
     "gpu_settings": {
         "enabled": True,
         "batch_size": 4,
         "memory_limit": 0.8,  # Maximum GPU memory usage (0.0 to 1.0)
-        "optimization_level": "high",  # low, medium, high
-        "mixed_precision": True,  # Use mixed precision for faster processing
+        "optimization_level": "high",  # low, medium, high (also selects CPU inference options; high is medium on CPU)
+        "mixed_precision": True,  # Use mixed precision (bfloat16 autocast on CPU) for faster processing
+        "cpu_backend": None,  # Override the CPU backend: eager, torchscript, compile, or onnx
         "cudnn_benchmark": True,  # Enable cuDNN benchmarking
         "clear_cache_after_batch": True  # Clear GPU cache after each batch
     },
     "batch_processing": {
         "enabled": True,
         "max_workers": 4,
-        "chunk_size": 10
+        "threads": "auto",  # Total thread budget split between workers and OpenCV/torch/BLAS threads
+        "scheduling": "longest_first",  # longest_first (cost-ordered, dynamic) or static chunks
+        "chunk_size": 10,  # Images per chunk with static scheduling
+        "memory_budget_mb": None,  # Only admit images (or static chunks) whose estimated peaks fit this budget
+        "journal": True,  # Record per-image progress so interrupted runs can resume
+        "journal_path": None,  # Defaults to a file in the output directory
+        "resume": False  # Skip inputs the journal marks as done
+    },
+    "deduplication": {
+        "enabled": False,  # Process one image per group of visually identical inputs
+        "method": "dhash",  # dhash (fastest) or phash (more tolerant of re-encoding)
+        "hash_size": 8,  # Hash is hash_size**2 bits
+        "max_distance": 4,  # Hamming distance within which images count as duplicates
+        "output_mode": "link"  # link (hard link, copy across filesystems) or copy
+    },
+    "sharding": {
+        "shard": None,  # "INDEX/COUNT" (index from 0): process only this node's share of the inputs
+        "lease_dir": None,  # Shared directory of lease files; nodes claim inputs one at a time
+        "lease_ttl": 300.0,  # Seconds without renewal after which another node may take a lease
+        "node_id": None  # Defaults to hostname-pid
+    },
+    "notifications": {
+        "enabled": True,
+        "sinks": ("desktop",),  # Any of desktop (skipped when headless), log, webhook
+        "interval": 30.0,  # Seconds between progress summaries
+        "webhook_url": None  # Endpoint that receives each summary as a JSON POST
+    },
+    "sequence_processing": {
+        "enabled": True,  # Process every frame of animations (GIF, APNG, WebP) and videos
+        "lookahead": 8,  # Frames decoded ahead of processing
+        "ai_batch_size": None,  # Frames per AI enhancement and face detection batch, defaults to gpu_settings.batch_size
+        "video_codec": None  # FourCC for video output (e.g. "avc1"); defaults by container
+    },
+    "watch": {
+        "backend": "auto",  # auto, inotify, or polling
+        "poll_interval": 1.0,  # Seconds between checks for new files
+        "settle_time": 1.0  # Polling only: seconds a file must stay unchanged to count as written
     },
     "output_settings": {
         "preserve_original": True,
         "create_thumbnails": False,
         "thumbnail_size": (200, 200),
-        "naming_convention": "{original_name}_enhanced_{timestamp}"
+        "naming_convention": "{original_name}_enhanced_{timestamp}",
+        "encoder_profile": "balanced",  # fast, balanced, or small (encoder effort per format_conversion)
+        "encode_workers": 2,  # Threads that encode outputs alongside processing, at least one per batch worker
+        "frame_store": False  # Write raw memory-mappable frames instead of encoded images
     }
 }
 
-def load_configuration(config_path):
+class ConfigError(ValueError):
+    """Raised when a configuration cannot be used; lists every problem found."""
+
+# Allowed values of string settings, by dotted path
+CONFIG_CHOICES = {
+    "watermark_position": ("top_left", "top_right", "bottom_left", "bottom_right", "center"),
+    "flip_mode": ("", "none", "horizontal", "vertical"),
+    "upscale_settings.backend": ("pil", "pil_tiled", "opencv_lanczos4", "opencv_cubic", "integer"),
+    "noise_reduction.method": ("nlm", "wavelet", "bilateral"),
+    "noise_reduction.preset": ("quality", "balanced", "fast"),
+    "face_detection_settings.backend": ("haar", "dnn"),
+    "advanced_features.detail_enhancement.method": ("detail", "edge", "frequency"),
+    "gpu_settings.optimization_level": ("low", "medium", "high"),
+    "gpu_settings.cpu_backend": ("eager", "torchscript", "compile", "onnx"),
+    "batch_processing.scheduling": ("longest_first", "static"),
+    "deduplication.method": ("dhash", "phash"),
+    "deduplication.output_mode": ("link", "copy"),
+    "notifications.sinks": ("desktop", "log", "webhook"),
+    "watch.backend": ("auto", "inotify", "polling"),
+    "output_settings.encoder_profile": ("fast", "balanced", "small"),
+}
+# Inclusive numeric ranges, by dotted path
+CONFIG_RANGES = {
+    "upscale_factor": (0.01, None),
+    "compression_quality": (1, 100),
+    "gpu_settings.batch_size": (1, None),
+    "gpu_settings.memory_limit": (0.0, 1.0),
+    "batch_processing.max_workers": (1, None),
+    "batch_processing.chunk_size": (1, None),
+    "output_settings.encode_workers": (1, None),
+    "sequence_processing.lookahead": (1, None),
+    "sharding.lease_ttl": (1.0, None),
+}
+# Settings whose type is not that of their default: whole-number defaults that also take
+# fractions, and every setting that defaults to None (which stays accepted for them)
+CONFIG_TYPES = {
+    "rotation_angle": (int, float),
+    "noise_reduction": (dict, bool),
+    "face_detection_settings.model_path": (str,),
+    "advanced_features.smart_sharpen.threshold": (int, float),
+    "adaptive_processing.histogram_spread_threshold": (int, float),
+    "gpu_settings.cpu_backend": (str,),
+    "batch_processing.threads": (int, str),
+    "batch_processing.memory_budget_mb": (int, float),
+    "batch_processing.journal_path": (str,),
+    "sharding.shard": (str,),
+    "sharding.lease_dir": (str,),
+    "sharding.node_id": (str,),
+    "notifications.webhook_url": (str,),
+    "sequence_processing.ai_batch_size": (int,),
+    "sequence_processing.video_codec": (str,),
+}
+# Settings with a non-None default that None switches off
+CONFIG_OPTIONAL = {"watermark_text", "crop_settings", "flip_mode", "format_conversion"}
+_TYPE_NAMES = {bool: "true or false", int: "a whole number", float: "a number", str: "a string",
+               dict: "a section", list: "a list", tuple: "a list"}
+
+def deep_merge(base, overrides):
+    """Return base with overrides applied; nested dicts are merged key by key, other values replaced."""
+    merged = dict(base)
+    for key, value in overrides.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = deep_merge(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
+
+def _type_name(types):
+    if float in types:
+        types = tuple(t for t in types if t is not int)  # Any number, whole or not
+    return " or ".join(_TYPE_NAMES[t] for t in types)
+
+def _expected_types(path, default):
+    if path in CONFIG_TYPES:
+        return CONFIG_TYPES[path]
+    if isinstance(default, float):
+        return (int, float)
+    if isinstance(default, (list, tuple)):
+        return (list, tuple)
+    return (type(default),)
+
+def _matches(value, types):
+    # bool is an int subclass, so it only counts where true/false is expected
+    return isinstance(value, types) and (bool in types or not isinstance(value, bool))
+
+def _validate(config, defaults, prefix, errors):
+    for key, value in config.items():
+        path = prefix + key
+        if key not in defaults:
+            close = difflib.get_close_matches(key, defaults, n=1)
+            errors.append(f"{path}: unknown setting" + (f" (did you mean {prefix}{close[0]}?)" if close else ""))
+            continue
+        default = defaults[key]
+        types = _expected_types(path, default)
+        if value is None:
+            if default is not None and path not in CONFIG_OPTIONAL:
+                errors.append(f"{path}: must be set, expected {_type_name(types)}")
+            continue
+        if not _matches(value, types):
+            errors.append(f"{path}: expected {_type_name(types)}, got {value!r}")
+            continue
+        if isinstance(value, dict) and isinstance(default, dict):
+            _validate(value, default, path + ".", errors)
+        elif isinstance(value, (list, tuple)) and isinstance(default, tuple) and default:
+            if isinstance(default[0], (int, float)) and (
+                    len(value) != len(default)
+                    or not all(isinstance(item, (int, float)) and not isinstance(item, bool) for item in value)):
+                errors.append(f"{path}: expected {len(default)} numbers, got {value!r}")
+        choices = CONFIG_CHOICES.get(path)
+        if choices:
+            for item in value if isinstance(value, (list, tuple)) else [value]:
+                if item not in choices:
+                    errors.append(f"{path}: {item!r} is not one of {', '.join(choices)}")
+        if path in CONFIG_RANGES and isinstance(value, (int, float)):
+            low, high = CONFIG_RANGES[path]
+            if (low is not None and value < low) or (high is not None and value > high):
+                errors.append(f"{path}: {value} is outside {low if low is not None else '-inf'}..{high if high is not None else 'inf'}")
+
+def _normalize_layer(layer):
+    """Rewrite legacy spellings in one layer, before it is merged over the layers below it."""
+    if isinstance(layer.get("noise_reduction"), bool):  # Legacy flat on/off flag
+        layer = dict(layer, noise_reduction={"enabled": layer["noise_reduction"]})
+    return layer
+
+def _normalize(config):
+    """Rewrite equivalent spellings in the merged configuration so the pipeline sees one form."""
+    if config["flip_mode"] in ("", "none"):
+        config["flip_mode"] = None
+    crop = config["crop_settings"]
+    if crop is not None and not any(crop):
+        config["crop_settings"] = None  # All zeros, as in the shipped config.json: no crop
+    elif crop is not None and (crop[2] <= crop[0] or crop[3] <= crop[1]):
+        raise ValueError(f"crop_settings: right and bottom must exceed left and top, got {list(crop)}")
+    for key in ("input_directory", "output_directory"):
+        if config[key] and config[key] != "-":
+            config[key] = os.path.normpath(config[key])
+    if config["sharding"]["shard"]:
+        from imageUpscaler.sharding import parse_shard
+        parse_shard(config["sharding"]["shard"])
+    return config
+
+class FrozenDict(dict):
+    """A dict that refuses changes; unlike a mapping proxy it pickles, so it can go to worker processes."""
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError("configuration is read-only")
+
+    __setitem__ = __delitem__ = __ior__ = _read_only
+    clear = pop = popitem = setdefault = update = _read_only
+
+    def __reduce__(self):
+        return (type(self), (dict(self),))
+
+def freeze(value):
+    """Read-only copy of a configuration: dicts become FrozenDicts, lists tuples."""
+    if isinstance(value, dict):
+        return FrozenDict({key: freeze(item) for key, item in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(item) for item in value)
+    return value
+
+def build_configuration(*layers):
+    """Merge layers of settings over the defaults, validate the result once and freeze it.
+
+    Raises ConfigError listing every invalid setting, so a bad value stops
+    the run at startup instead of failing images hours into a batch.
+    """
+    merged = default_config
+    errors = []
+    for layer in layers:
+        _validate(layer, default_config, "", errors)
+        merged = deep_merge(merged, _normalize_layer(layer))
+    if errors:
+        raise ConfigError("Invalid configuration:\n  " + "\n  ".join(errors))
     try:
-        if os.path.exists(config_path):
+        return freeze(_normalize(merged))
+    except ValueError as e:
+        raise ConfigError(f"Invalid configuration:\n  {e}")
+
+def load_configuration(config_path, overrides=None):
+    """
+    Load config_path (if it exists) over the defaults, then apply overrides (e.g. from
+    the command line), and return the validated, read-only configuration.
+    """
+    layers = []
+    if os.path.exists(config_path):
+        try:
             with open(config_path, 'r') as config_file:
-                config = json.load(config_file)
-                # Merge with default config to ensure all options exist
-                merged_config = default_config.copy()
-                merged_config.update(config)
-                return merged_config
-        else:
-            logging.warning(f"Configuration file {config_path} not found. Using default configuration.")
-            return default_config
-    except (FileNotFoundError, json.JSONDecodeError) as e:
-        logging.error(f"Error loading configuration: {e}")
-        return default_config
+                layers.append(json.load(config_file))
+        except json.JSONDecodeError as e:
+            raise ConfigError(f"Configuration file {config_path} is not valid JSON: {e}")
+    else:
+        logger.warning("Configuration file %s not found. Using default configuration.", config_path)
+    return build_configuration(*layers, overrides or {})
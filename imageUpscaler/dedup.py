@@ -0,0 +1,204 @@
+import logging
+import os
+import shutil
+from datetime import datetime
+import cv2
+import numpy as np
+from PIL import Image
+from imageUpscaler.frame_store import is_frame_file, read_frame
+from imageUpscaler.scheduler import enabled_stages, estimate_cost, read_dimensions
+
+logger = logging.getLogger(__name__)
+
+# Edge of the grayscale thumbnail the pHash DCT runs on
+PHASH_SIZE = 32
+
+def _tiny_grayscale(img_path, size):
+    """Decode img_path as a grayscale array of shape size (width, height), as cheaply as possible.
+
+    JPEGs are decoded at reduced scale via draft(); frame-store files are
+    subsampled straight from the memory map. Returns (array, (width, height))
+    with the full-resolution dimensions.
+    """
+    if is_frame_file(img_path):
+        frame = read_frame(img_path)
+        full_size = (frame.shape[1], frame.shape[0])
+        step = max(1, min(frame.shape[:2]) // (4 * max(size)))
+        gray = Image.fromarray(np.ascontiguousarray(frame[::step, ::step])).convert("L")
+    else:
+        with Image.open(img_path) as img:
+            full_size = img.size
+            img.draft("L", (4 * size[0], 4 * size[1]))
+            gray = img.convert("L")
+    return np.asarray(gray.resize(size, Image.LANCZOS), dtype=np.float32), full_size
+
+def _bits_to_int(bits):
+    return sum(1 << i for i, bit in enumerate(bits) if bit)
+
+def dhash(img_path, hash_size=8):
+    """Difference hash: one bit per horizontally adjacent pixel pair of a tiny grayscale decode.
+
+    Returns (hash, (width, height)).
+    """
+    pixels, full_size = _tiny_grayscale(img_path, (hash_size + 1, hash_size))
+    bits = (pixels[:, 1:] > pixels[:, :-1]).ravel()
+    return _bits_to_int(bits), full_size
+
+def phash(img_path, hash_size=8):
+    """Perceptual hash: low-frequency DCT coefficients of a tiny decode compared to their median.
+
+    Slower than dhash but more tolerant of re-encoding and small tonal changes.
+    Returns (hash, (width, height)).
+    """
+    pixels, full_size = _tiny_grayscale(img_path, (PHASH_SIZE, PHASH_SIZE))
+    low = cv2.dct(pixels)[:hash_size, :hash_size].ravel()
+    # The DC term only reflects overall brightness
+    bits = low > np.median(low[1:])
+    return _bits_to_int(bits), full_size
+
+HASH_METHODS = {
+    "dhash": dhash,
+    "phash": phash,
+}
+
+def hamming_distance(hash_a, hash_b):
+    """Number of differing bits between two hashes."""
+    return bin(hash_a ^ hash_b).count("1")
+
+class _BKTree:
+    """Metric tree over hashes under Hamming distance, for near-duplicate lookups.
+
+    Each node's children are keyed by their distance to it; by the triangle
+    inequality a search within max_distance of a query only has to descend
+    into children whose key is within max_distance of the node's own distance.
+    """
+
+    def __init__(self):
+        self._root = None  # (hash, value, {distance: child})
+
+    def add(self, image_hash, value):
+        node = (image_hash, value, {})
+        if self._root is None:
+            self._root = node
+            return
+        current = self._root
+        while True:
+            distance = hamming_distance(image_hash, current[0])
+            child = current[2].get(distance)
+            if child is None:
+                current[2][distance] = node
+                return
+            current = child
+
+    def search(self, image_hash, max_distance):
+        """Return the values of every hash within max_distance of image_hash."""
+        found = []
+        pending = [self._root] if self._root is not None else []
+        while pending:
+            node_hash, value, children = pending.pop()
+            distance = hamming_distance(image_hash, node_hash)
+            if distance <= max_distance:
+                found.append(value)
+            for child_distance, child in children.items():
+                if abs(child_distance - distance) <= max_distance:
+                    pending.append(child)
+        return found
+
+def find_duplicate_groups(img_paths, method="dhash", hash_size=8, max_distance=4):
+    """Group visually identical images and return {representative: [duplicates]}.
+
+    An image joins the group created with its exact hash, else the first
+    group whose hash lies within max_distance bits; otherwise it starts a
+    group of its own. Each group is
+    represented by its highest-resolution member (the first one on a tie),
+    so the output is made from the best source. Images whose hash cannot be
+    computed are kept as their own group and left for process_image to report.
+
+    Exact hash matches are found in a dict and near matches in a BK-tree of
+    the group hashes, so large batches are not compared against every group.
+    """
+    hash_fn = HASH_METHODS[method]
+    groups = []  # [[(path, pixels), ...]], in creation order
+    exact = {}  # group hash -> group index
+    near = _BKTree()
+    for img_path in img_paths:
+        try:
+            image_hash, (width, height) = hash_fn(img_path, hash_size)
+        except (IOError, OSError, ValueError) as e:
+            logger.warning("Could not hash %s: %s", img_path, e)
+            groups.append([(img_path, 0)])
+            continue
+        index = exact.get(image_hash)
+        if index is None and max_distance > 0:
+            matches = near.search(image_hash, max_distance)
+            index = min(matches) if matches else None
+        if index is None:
+            index = len(groups)
+            groups.append([])
+            exact[image_hash] = index
+            near.add(image_hash, index)
+        groups[index].append((img_path, width * height))
+
+    duplicate_groups = {}
+    for members in groups:
+        representative = max(members, key=lambda member: member[1])[0]
+        duplicate_groups[representative] = [path for path, _ in members if path != representative]
+    return duplicate_groups
+
+def duplicate_output_path(representative_output, duplicate_path, config, output_directory):
+    """Output path for a duplicate, named after the duplicate in the representative's format."""
+    filename = config["output_settings"]["naming_convention"].format(
+        original_name=os.path.splitext(os.path.basename(duplicate_path))[0],
+        timestamp=datetime.now().strftime("%Y%m%d_%H%M%S")
+    ) + os.path.splitext(representative_output)[1]
+    return os.path.join(output_directory, filename)
+
+def write_duplicate_outputs(representative_output, duplicates, config, output_directory):
+    """Hard-link (or copy) the representative's output for each duplicate; return {duplicate: output}."""
+    mode = config["deduplication"]["output_mode"]
+    outputs = {}
+    for duplicate_path in duplicates:
+        output_path = duplicate_output_path(representative_output, duplicate_path, config, output_directory)
+        try:
+            if mode == "link":
+                try:
+                    os.link(representative_output, output_path)
+                except OSError:
+                    # Different filesystem or no hard-link support
+                    shutil.copy2(representative_output, output_path)
+            else:
+                shutil.copy2(representative_output, output_path)
+            outputs[duplicate_path] = output_path
+            logger.debug("Reused %s for duplicate %s", representative_output, duplicate_path)
+        except OSError as e:
+            logger.error("Could not write output for duplicate %s: %s", duplicate_path, e)
+            outputs[duplicate_path] = None
+    return outputs
+
+def dedup_report(duplicate_groups, config):
+    """Summarise how many inputs deduplication skipped and the estimated compute saved."""
+    stages = enabled_stages(config)
+    total_cost = saved_cost = 0.0
+    total = duplicates = 0
+    for representative, group_duplicates in duplicate_groups.items():
+        for img_path in [representative] + group_duplicates:
+            try:
+                cost = estimate_cost(*read_dimensions(img_path), config, stages)
+            except (IOError, OSError, ValueError):
+                cost = 0.0
+            total_cost += cost
+            total += 1
+            if img_path != representative:
+                saved_cost += cost
+                duplicates += 1
+    return {
+        "inputs": total,
+        "unique": total - duplicates,
+        "duplicates": duplicates,
+        "saved_fraction": saved_cost / total_cost if total_cost else 0.0
+    }
+
+def format_dedup_report(report):
+    return (f"Deduplication: {report['inputs']} inputs, {report['unique']} unique, "
+            f"{report['duplicates']} duplicates reused; "
+            f"~{report['saved_fraction']:.0%} of estimated compute saved")
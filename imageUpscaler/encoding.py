@@ -0,0 +1,138 @@
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+from imageUpscaler.frame_store import is_frame_file
+
+logger = logging.getLogger(__name__)
+
+# Encoder settings per output format and speed profile. "balanced" matches
+# PIL's defaults for PNG; "fast" trades file size for encode time (zlib
+# dominates PNG output), "small" spends more time for smaller files.
+ENCODER_PROFILES = {
+    "PNG": {
+        "fast": {"compress_level": 1},
+        "balanced": {"compress_level": 6},
+        "small": {"compress_level": 9, "optimize": True},
+    },
+    "JPEG": {
+        "fast": {"optimize": False, "progressive": False, "subsampling": "4:2:0"},
+        "balanced": {"optimize": True, "progressive": False, "subsampling": "4:2:0"},
+        "small": {"optimize": True, "progressive": True, "subsampling": "4:2:0"},
+    },
+    "WEBP": {
+        "fast": {"method": 0},
+        "balanced": {"method": 4},
+        "small": {"method": 6},
+    },
+}
+ENCODER_PROFILE_NAMES = ("fast", "balanced", "small")
+
+FORMAT_ALIASES = {"JPG": "JPEG", "TIF": "TIFF"}
+FORMAT_EXTENSIONS = {"PNG": ".png", "JPEG": ".jpg", "WEBP": ".webp", "TIFF": ".tif"}
+# Formats that take a quality setting
+LOSSY_FORMATS = ("JPEG", "WEBP")
+
+def resolve_format(format_conversion, img_path):
+    """Return (PIL format, extension) for an output: format_conversion if set, else the input's format."""
+    if format_conversion:
+        fmt = format_conversion.upper()
+        fmt = FORMAT_ALIASES.get(fmt, fmt)
+        return fmt, FORMAT_EXTENSIONS.get(fmt, "." + fmt.lower())
+    extension = os.path.splitext(img_path)[1].lower()
+    fmt = Image.registered_extensions().get(extension)
+    if fmt is None or is_frame_file(img_path):
+        # Frame-store inputs have no encoded format of their own
+        return "PNG", ".png"
+    return fmt, extension
+
+def encoder_options(fmt, profile="balanced", quality=85):
+    """PIL save() keyword arguments for a format and profile."""
+    if profile not in ENCODER_PROFILE_NAMES:
+        raise ValueError(f"Unknown encoder profile: {profile}")
+    options = dict(ENCODER_PROFILES.get(fmt, {}).get(profile, {}))
+    if fmt in LOSSY_FORMATS and quality:
+        options["quality"] = quality
+    return options
+
+class EncodeStats:
+    """Output bytes and encode time per (format, profile), for the end-of-run report."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.totals = {}
+
+    def record(self, fmt, profile, size, seconds):
+        with self._lock:
+            count, total_size, total_seconds = self.totals.get((fmt, profile), (0, 0, 0.0))
+            self.totals[(fmt, profile)] = (count + 1, total_size + size, total_seconds + seconds)
+
+    def reset(self):
+        with self._lock:
+            self.totals = {}
+
+    def summary(self):
+        with self._lock:
+            totals = dict(self.totals)
+        if not totals:
+            return "No images encoded"
+        return "; ".join(
+            f"{fmt}/{profile}: {count} files, {size / count / 1024:.1f}KB and "
+            f"{seconds / count * 1000:.1f}ms per file"
+            for (fmt, profile), (count, size, seconds) in sorted(totals.items()))
+
+encode_stats = EncodeStats()
+
+def encode_image(img, path, fmt, profile="balanced", quality=85):
+    """Save img to path (or a writable file object) with the profile's encoder settings and record size and time."""
+    if fmt == "JPEG" and img.mode not in ("L", "RGB", "CMYK"):
+        img = img.convert("RGB")
+    options = encoder_options(fmt, profile, quality)
+    # Carry metadata the encoders can write but do not pick up from img.info
+    for key in ("exif", "icc_profile"):
+        if img.info.get(key):
+            options[key] = img.info[key]
+    start = time.perf_counter()
+    img.save(path, format=fmt, **options)
+    seconds = time.perf_counter() - start
+    size = path.tell() if hasattr(path, "write") else os.path.getsize(path)
+    encode_stats.record(fmt, profile, size, seconds)
+    logger.debug("Encoded %s as %s/%s in %.1fms", path, fmt, profile, seconds * 1000)
+    return path
+
+_encode_pool = None
+_encode_pool_size = 0
+_encode_pool_lock = threading.Lock()
+
+def get_encode_pool(workers=None):
+    """Shared pool that runs encodes off the processing workers.
+
+    PIL releases the GIL while compressing, so an image's outputs encode side
+    by side, and alongside the other workers' processing. The pool is created
+    on first use (two threads unless workers is given); passing a different
+    workers count replaces it, letting queued encodes finish on the old one.
+    """
+    global _encode_pool, _encode_pool_size
+    with _encode_pool_lock:
+        if _encode_pool is None or (workers and workers != _encode_pool_size):
+            if _encode_pool is not None:
+                _encode_pool.shutdown(wait=False)
+            _encode_pool_size = workers or 2
+            _encode_pool = ThreadPoolExecutor(max_workers=_encode_pool_size, thread_name_prefix="encode")
+        return _encode_pool
+
+def configure_encode_pool(config, max_workers):
+    """Size the encode pool for a run: encode_workers threads, and at least one per batch worker.
+
+    Each worker waits for its own encodes, so a smaller pool would leave
+    workers queued behind each other's outputs.
+    """
+    workers = max(max_workers, config["output_settings"]["encode_workers"])
+    get_encode_pool(workers)
+    return workers
+
+def submit_encode(img, path, fmt, profile="balanced", quality=85):
+    """Queue encode_image on the encode pool and return its future."""
+    return get_encode_pool().submit(encode_image, img, path, fmt, profile, quality)
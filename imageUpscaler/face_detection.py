@@ -0,0 +1,117 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+import numpy as np
+import cv2
+from imageUpscaler.concurrency import inner_thread_count
+
+logger = logging.getLogger(__name__)
+
+FACE_DETECTION_BACKENDS = ("haar", "dnn")
+
+# Detectors keep per-call state (YuNet's input size, cascade buffers), so
+# each worker thread gets its own instead of sharing one across the pool.
+_local = threading.local()
+
+def _haar_detector():
+    if not hasattr(_local, "haar"):
+        _local.haar = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+    return _local.haar
+
+def _dnn_detector(model_path, score_threshold):
+    detectors = _local.__dict__.setdefault("dnn", {})
+    key = (model_path, score_threshold)
+    if key not in detectors:
+        detectors[key] = cv2.FaceDetectorYN.create(model_path, "", (320, 320), score_threshold)
+    return detectors[key]
+
+@lru_cache(maxsize=None)
+def _warn_dnn_unavailable(reason):
+    logger.warning("DNN face detector unavailable (%s), using the Haar cascade", reason)
+
+def resolve_backend(backend, model_path=None):
+    """Return the backend that will actually run: "dnn" needs a YuNet ONNX model."""
+    if backend not in FACE_DETECTION_BACKENDS:
+        raise ValueError(f"Unknown face detection backend: {backend}")
+    if backend == "dnn":
+        if not model_path:
+            _warn_dnn_unavailable("no model_path configured")
+            return "haar"
+        if not hasattr(cv2, "FaceDetectorYN"):
+            _warn_dnn_unavailable("OpenCV lacks FaceDetectorYN")
+            return "haar"
+    return backend
+
+def _detection_scale(shape, detection_size):
+    """Factor that brings the long edge down to detection_size (never up)."""
+    if not detection_size:
+        return 1.0
+    return min(1.0, detection_size / max(shape[:2]))
+
+def detect_faces(img, backend="haar", detection_size=800, model_path=None,
+                 score_threshold=0.6, scale_factor=1.1, min_neighbors=4):
+    """Detect faces and return them as a list of (x, y, w, h) in full-resolution pixels.
+
+    Detection runs on a copy whose long edge is at most detection_size
+    (0 or None to detect at full size), and the boxes are scaled back up.
+    Faces are rarely too small to find at that size, and the cost no
+    longer grows with the upscale factor.
+
+    backend "haar" uses OpenCV's frontal-face cascade; "dnn" uses the YuNet
+    CNN detector through cv2.FaceDetectorYN on CPU, which is faster and more
+    accurate but needs the ONNX model file at model_path.
+    """
+    np_img = np.asarray(img)
+    if np_img.size == 0:
+        raise ValueError("Image is empty or not loaded correctly.")
+    if np_img.ndim == 3 and np_img.shape[2] == 4:
+        np_img = np_img[:, :, :3]
+
+    scale = _detection_scale(np_img.shape, detection_size)
+    if scale < 1.0:
+        size = (max(1, round(np_img.shape[1] * scale)), max(1, round(np_img.shape[0] * scale)))
+        np_img = cv2.resize(np_img, size, interpolation=cv2.INTER_AREA)
+
+    if resolve_backend(backend, model_path) == "dnn":
+        bgr = cv2.cvtColor(np_img, cv2.COLOR_GRAY2BGR if np_img.ndim == 2 else cv2.COLOR_RGB2BGR)
+        detector = _dnn_detector(model_path, score_threshold)
+        detector.setInputSize((bgr.shape[1], bgr.shape[0]))
+        _, detections = detector.detect(bgr)
+        boxes = [] if detections is None else detections[:, :4]
+    else:
+        gray = np_img if np_img.ndim == 2 else cv2.cvtColor(np_img, cv2.COLOR_RGB2GRAY)
+        boxes = _haar_detector().detectMultiScale(gray, scale_factor, min_neighbors)
+
+    return [tuple(int(round(value / scale)) for value in box) for box in boxes]
+
+_detect_pool = None
+_detect_pool_size = 0
+_detect_pool_lock = threading.Lock()
+
+def _get_detect_pool(workers):
+    """Shared detection pool, created on first use and rebuilt only when the thread share changes.
+
+    Its threads live as long as the process, so each one loads its cascade
+    or YuNet model once rather than once per frame batch.
+    """
+    global _detect_pool, _detect_pool_size
+    with _detect_pool_lock:
+        if _detect_pool is None or _detect_pool_size != workers:
+            if _detect_pool is not None:
+                _detect_pool.shutdown(wait=False)
+            _detect_pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="face-detect")
+            _detect_pool_size = workers
+        return _detect_pool
+
+def detect_faces_batch(images, workers=None, **kwargs):
+    """Detect faces in several images concurrently; returns one face list per image.
+
+    OpenCV releases the GIL while detecting, and each thread of the shared
+    pool keeps its own detector, so the images run in parallel on the
+    worker's thread share.
+    """
+    workers = workers or inner_thread_count()
+    if workers <= 1 or len(images) <= 1:
+        return [detect_faces(img, **kwargs) for img in images]
+    return list(_get_detect_pool(workers).map(lambda img: detect_faces(img, **kwargs), images))
@@ -1,36 +1,74 @@
 import os
 from PIL import Image
 import logging
+from imageUpscaler.frame_store import FRAME_EXTENSION, is_frame_file, read_frame, frame_to_image, write_frame
+from imageUpscaler.sequences import SEQUENCE_EXTENSIONS
 
-logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+SUPPORTED_EXTENSIONS = (".png", ".jpg", ".jpeg", FRAME_EXTENSION) + SEQUENCE_EXTENSIONS
+
+def list_images(directory):
+    """Return the sorted paths of supported image files without decoding them."""
+    if not os.path.isdir(directory):
+        logger.error("Directory %s does not exist.", directory)
+        return []
+    return sorted(
+        os.path.join(directory, filename)
+        for filename in os.listdir(directory)
+        if filename.lower().endswith(SUPPORTED_EXTENSIONS)
+    )
+
+def open_image(img_path):
+    """Open an image file, mapping frame-store files instead of decoding them (RGB frames are copied once)."""
+    if is_frame_file(img_path):
+        return frame_to_image(read_frame(img_path))
+    return Image.open(img_path)
+
+def convert_to_frames(input_directory, output_directory):
+    """Decode every image in a directory once and store it in the frame store."""
+    os.makedirs(output_directory, exist_ok=True)
+    written = []
+    for img_path in list_images(input_directory):
+        if is_frame_file(img_path):
+            continue
+        try:
+            name = os.path.splitext(os.path.basename(img_path))[0]
+            frame_path = os.path.join(output_directory, name + FRAME_EXTENSION)
+            with Image.open(img_path) as img:
+                written.append(write_frame(img, frame_path))
+            logger.debug("Stored frame: %s", frame_path)
+        except (IOError, OSError, ValueError) as e:
+            logger.error("Error storing frame for %s: %s", img_path, e)
+    return written
 
 def load_images(directory):
     images = []
     supported_extensions = (".png", ".jpg", ".jpeg")
     
     if not os.path.exists(directory):
-        logging.error(f"Directory {directory} does not exist.")
+        logger.error("Directory %s does not exist.", directory)
         return images
     
     if not os.listdir(directory):
-        logging.warning(f"Directory {directory} is empty.")
+        logger.warning("Directory %s is empty.", directory)
         return images
     
     for filename in os.listdir(directory):
         if filename.lower().endswith(supported_extensions):
             try:
                 img_path = os.path.join(directory, filename)
-                logging.debug(f"Loading image {img_path}")
+                logger.debug("Loading image %s", img_path)
                 img = Image.open(img_path)
                 img.verify()  # Verify that this is an image
                 img = Image.open(img_path)  # Reopen the image after verify
                 if img:
                     images.append((filename, img))
-                    logging.debug(f"Successfully loaded {filename}")
+                    logger.debug("Successfully loaded %s", filename)
                 else:
-                    logging.warning(f"Failed to load {filename}. Image is empty.")
+                    logger.warning("Failed to load %s. Image is empty.", filename)
             except (IOError, OSError) as e:
-                logging.error(f"Error loading {filename}: {e}")
+                logger.error("Error loading %s: %s", filename, e)
             except Exception as e:
-                logging.error(f"Unexpected error loading {filename}: {e}")
+                logger.error("Unexpected error loading %s: %s", filename, e)
     return images
@@ -0,0 +1,68 @@
+import os
+import struct
+import numpy as np
+from PIL import Image
+
+# Raw uint8 frame files: a fixed-size header followed by the pixel data in
+# row-major (height, width[, channels]) order, so they can be mapped with
+# np.memmap and handed to the pipeline without decoding.
+FRAME_EXTENSION = ".iuf"
+FRAME_MAGIC = b"IUFRAME1"
+HEADER_SIZE = 64
+_HEADER = struct.Struct("<8sIII")  # magic, height, width, channels
+
+_MODES = {1: "L", 3: "RGB", 4: "RGBA"}
+
+def is_frame_file(path):
+    """Return True if the path points to a frame-store file."""
+    return str(path).lower().endswith(FRAME_EXTENSION)
+
+def write_frame(img, path):
+    """Write a PIL image or uint8 array to the frame store and return the path."""
+    if isinstance(img, Image.Image):
+        if img.mode not in ("L", "RGB", "RGBA"):
+            img = img.convert("RGBA" if "A" in img.getbands() else "RGB")
+        np_img = np.asarray(img)
+    else:
+        np_img = np.asarray(img)
+
+    if np_img.dtype != np.uint8:
+        raise ValueError(f"Frame store only holds uint8 data, got {np_img.dtype}.")
+    channels = 1 if np_img.ndim == 2 else np_img.shape[2]
+    if channels not in _MODES:
+        raise ValueError(f"Unsupported number of channels: {channels}")
+
+    header = _HEADER.pack(FRAME_MAGIC, np_img.shape[0], np_img.shape[1], channels)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(header.ljust(HEADER_SIZE, b"\0"))
+        np.ascontiguousarray(np_img).tofile(f)
+    os.replace(tmp_path, path)
+    return path
+
+def read_frame_header(path):
+    """Return (height, width, channels) of a frame-store file."""
+    with open(path, "rb") as f:
+        raw = f.read(_HEADER.size)
+    if len(raw) < _HEADER.size:
+        raise ValueError(f"{path} is not a valid frame file.")
+    magic, height, width, channels = _HEADER.unpack(raw)
+    if magic != FRAME_MAGIC:
+        raise ValueError(f"{path} is not a valid frame file.")
+    return height, width, channels
+
+def read_frame(path, mode="r"):
+    """Map a frame-store file as a uint8 array without copying it into memory."""
+    height, width, channels = read_frame_header(path)
+    shape = (height, width) if channels == 1 else (height, width, channels)
+    return np.memmap(path, dtype=np.uint8, mode=mode, offset=HEADER_SIZE, shape=shape)
+
+def frame_to_image(frame):
+    """Wrap a frame array as a read-only PIL image.
+
+    L and RGBA frames share the mapping; PIL keeps RGB at four bytes per pixel,
+    so RGB frames are unpacked into one copy on load.
+    """
+    mode = _MODES[1 if frame.ndim == 2 else frame.shape[2]]
+    height, width = frame.shape[:2]
+    return Image.frombuffer(mode, (width, height), frame, "raw", mode, 0, 1)
@@ -2,14 +2,166 @@ import cv2
 import numpy as np
 from PIL import Image
 import logging
-from skimage import feature, measure, color
+from skimage import measure, color
 from scipy import stats
 import torch
 import torchvision.models as models
 from torchvision import transforms
 
+logger = logging.getLogger(__name__)
+
+# Immerkaer's noise-estimation mask: the difference of two Laplacians,
+# which cancels smooth image structure and leaves the noise.
+_NOISE_MASK = np.array([[1, -2, 1], [-2, 4, -2], [1, -2, 1]], dtype=np.float32)
+
+def estimate_noise_sigma(gray, patch_size=64, max_patches=64):
+    """Fast estimate of the Gaussian noise sigma of a grayscale image.
+
+    Large images are sampled as a grid of full-resolution patches (downscaling
+    would average the noise away) and the median patch estimate is used, so
+    the cost stays bounded regardless of image size.
+    """
+    height, width = gray.shape[:2]
+    if height * width > patch_size * patch_size * max_patches and min(height, width) > patch_size:
+        grid = int(np.sqrt(max_patches))
+        ys = np.linspace(0, height - patch_size, grid).astype(int)
+        xs = np.linspace(0, width - patch_size, grid).astype(int)
+        patches = [gray[y:y + patch_size, x:x + patch_size] for y in ys for x in xs]
+    else:
+        patches = [gray]
+
+    # The mask response of Gaussian noise has std 6 * sigma; using its median
+    # absolute value (MAD) keeps edges from inflating the estimate.
+    estimates = []
+    for patch in patches:
+        response = cv2.filter2D(np.float32(patch), -1, _NOISE_MASK)[1:-1, 1:-1]
+        estimates.append(np.median(np.abs(response)) / (0.6745 * 6))
+    return float(np.median(estimates))
+
+def estimate_noise_nlm(gray):
+    """Accurate but slow noise level: mean residual after a full NLM denoise."""
+    denoised = cv2.fastNlMeansDenoising(gray)
+    return float(np.mean(cv2.absdiff(gray, denoised)))
+
+def quick_quality_metrics(img, thumbnail_size=256):
+    """Cheap subset of the quality metrics used to triage images before processing.
+
+    Blur and histogram spread are measured on a thumbnail. Noise is sampled from
+    full-resolution patches, since downscaling would average it away.
+    """
+    gray = np.asarray(img.convert('L'))
+    thumbnail = Image.fromarray(gray)
+    thumbnail.thumbnail((thumbnail_size, thumbnail_size))
+    small = np.asarray(thumbnail)
+    low, high = np.percentile(small, (1, 99))
+    return {
+        'blur_variance': float(cv2.Laplacian(small, cv2.CV_64F).var()),
+        'noise_sigma': estimate_noise_sigma(gray),
+        'histogram_spread': float(high - low)
+    }
+
+# GLCM pixel-pair directions, as (row, column) steps of one pixel
+GLCM_ANGLES = (0, np.pi / 4, np.pi / 2, 3 * np.pi / 4)
+
+def quantize_gray(gray, levels):
+    """Map uint8 grey values onto levels equal-width bins (0 .. levels - 1)."""
+    if levels == 256:
+        return gray
+    return ((gray.astype(np.uint16) * levels) >> 8).astype(np.uint8)
+
+def glcm(gray, levels=256, distance=1, angles=GLCM_ANGLES):
+    """Grey-level co-occurrence counts of shape (len(angles), levels, levels).
+
+    Matches skimage's graycomatrix for one distance (entry [a, i, j] counts
+    pixel pairs with value i and value j at the step for angle a). Each
+    angle is one 2-D histogram of the image against its shifted view, which
+    OpenCV computes in parallel. gray may also be a stack of patches of
+    shape (n, height, width); pairs never cross patch borders.
+    """
+    gray = np.asarray(gray)
+    height, width = gray.shape[-2:]
+    counts = np.empty((len(angles), levels, levels), dtype=np.float64)
+    for a, angle in enumerate(angles):
+        dr = int(round(np.sin(angle) * distance))
+        dc = int(round(np.cos(angle) * distance))
+        r0, r1 = max(0, -dr), min(height, height - dr)
+        c0, c1 = max(0, -dc), min(width, width - dc)
+        first = gray[..., r0:r1, c0:c1]
+        second = gray[..., r0 + dr:r1 + dr, c0 + dc:c1 + dc]
+        if gray.ndim == 3:
+            first = first.reshape(-1, first.shape[-1])
+            second = second.reshape(-1, second.shape[-1])
+        counts[a] = cv2.calcHist([first, second], [0, 1], None, [levels, levels], [0, levels, 0, levels])
+    return counts
+
+def glcm_properties(counts):
+    """contrast, dissimilarity, homogeneity, energy and correlation per angle, as skimage's graycoprops."""
+    P = counts.astype(np.float64)
+    sums = P.sum(axis=(1, 2), keepdims=True)
+    sums[sums == 0] = 1
+    P /= sums
+
+    levels = P.shape[1]
+    I = np.arange(levels, dtype=np.float64)[None, :, None]
+    J = np.arange(levels, dtype=np.float64)[None, None, :]
+    diff = I - J
+    diff_i = I - np.sum(I * P, axis=(1, 2), keepdims=True)
+    diff_j = J - np.sum(J * P, axis=(1, 2), keepdims=True)
+    std_i = np.sqrt(np.sum(P * diff_i ** 2, axis=(1, 2)))
+    std_j = np.sqrt(np.sum(P * diff_j ** 2, axis=(1, 2)))
+    cov = np.sum(P * diff_i * diff_j, axis=(1, 2))
+    flat = (std_i < 1e-15) | (std_j < 1e-15)
+    correlation = np.where(flat, 1.0, cov / np.where(flat, 1.0, std_i * std_j))
+
+    return {
+        'contrast': np.sum(P * diff ** 2, axis=(1, 2)),
+        'dissimilarity': np.sum(P * np.abs(diff), axis=(1, 2)),
+        'homogeneity': np.sum(P / (1.0 + diff ** 2), axis=(1, 2)),
+        'energy': np.sqrt(np.sum(P ** 2, axis=(1, 2))),
+        'correlation': correlation
+    }
+
+def texture_features(gray, levels=64, max_size=0, patches=256, patch_size=64, seed=0):
+    """GLCM texture features of a uint8 grayscale image, at a bounded cost.
+
+    The image is quantised to levels grey levels and, with patches > 0,
+    only that many random patch_size patches are counted, which keeps the
+    cost fixed while the statistics stay those of the full-resolution
+    pixels. Images smaller than the patches together are counted whole.
+    max_size (0 to disable) additionally reduces the long edge
+    first; that is cheaper still but changes the values, since one-pixel
+    co-occurrences depend on scale. Contrast and dissimilarity are rescaled
+    to 256-level units so they stay comparable across levels; homogeneity
+    and energy depend on the quantisation. levels=256, max_size=0 and
+    patches=0 reproduce skimage's values exactly.
+    """
+    height, width = gray.shape
+    if max_size and max(height, width) > max_size:
+        scale = max_size / max(height, width)
+        gray = cv2.resize(gray, (max(1, round(width * scale)), max(1, round(height * scale))),
+                          interpolation=cv2.INTER_AREA)
+    gray = quantize_gray(gray, levels)
+
+    # Sample only when the patches cover fewer pixels than the image; otherwise counting
+    # the whole image is both cheaper and free of the duplicates overlapping patches add
+    if patches and min(gray.shape) > patch_size and patches * patch_size ** 2 < gray.size:
+        rng = np.random.default_rng(seed)
+        ys = rng.integers(0, gray.shape[0] - patch_size + 1, patches)
+        xs = rng.integers(0, gray.shape[1] - patch_size + 1, patches)
+        gray = np.stack([gray[y:y + patch_size, x:x + patch_size] for y, x in zip(ys, xs)])
+
+    properties = glcm_properties(glcm(gray, levels))
+    step = 256 / levels
+    properties['contrast'] *= step ** 2
+    properties['dissimilarity'] *= step
+    return properties
+
 class ImageAnalyzer:
-    def __init__(self):
+    def __init__(self, noise_method='fast', texture_levels=64, texture_size=0, texture_patches=256):
+        self.noise_method = noise_method  # fast or nlm
+        self.texture_levels = texture_levels  # Grey levels for GLCM features
+        self.texture_size = texture_size  # Downscale to this long edge first, 0 for full size
+        self.texture_patches = texture_patches  # Random 64x64 patches to count, 0 for the whole image
         self.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
         self.transform = transforms.Compose([
             transforms.Resize(256),
@@ -21,9 +173,12 @@ class ImageAnalyzer:
         self.model.eval()
 
     def analyze_image(self, img):
-        """Perform comprehensive image analysis."""
+        """Perform comprehensive image analysis on a PIL image or uint8 array."""
         try:
-            np_img = np.array(img)
+            # asarray keeps memory-mapped frames zero-copy
+            np_img = np.asarray(img)
+            if not isinstance(img, Image.Image):
+                img = Image.fromarray(np_img)
             analysis = {
                 'basic_stats': self._get_basic_stats(np_img),
                 'color_analysis': self._analyze_colors(np_img),
@@ -35,7 +190,7 @@ class ImageAnalyzer:
             }
             return analysis
         except Exception as e:
-            logging.error(f"Image analysis failed: {e}")
+            logger.error("Image analysis failed: %s", e)
             return None
 
     def _get_basic_stats(self, np_img):
@@ -96,36 +251,32 @@ class ImageAnalyzer:
     def _analyze_texture(self, np_img):
         """Analyze texture characteristics."""
         gray = cv2.cvtColor(np_img, cv2.COLOR_RGB2GRAY)
-        
-        # GLCM features
-        glcm = feature.greycomatrix(gray, [1], [0, np.pi/4, np.pi/2, 3*np.pi/4])
-        contrast = feature.greycoprops(glcm, 'contrast')
-        dissimilarity = feature.greycoprops(glcm, 'dissimilarity')
-        homogeneity = feature.greycoprops(glcm, 'homogeneity')
-        energy = feature.greycoprops(glcm, 'energy')
-        correlation = feature.greycoprops(glcm, 'correlation')
-        
-        return {
-            'contrast': contrast.tolist(),
-            'dissimilarity': dissimilarity.tolist(),
-            'homogeneity': homogeneity.tolist(),
-            'energy': energy.tolist(),
-            'correlation': correlation.tolist()
-        }
+
+        # GLCM features, one value per angle (distance 1)
+        properties = texture_features(
+            gray,
+            levels=self.texture_levels,
+            max_size=self.texture_size,
+            patches=self.texture_patches
+        )
+        return {name: [values.tolist()] for name, values in properties.items()}
 
     def _get_quality_metrics(self, np_img):
         """Calculate image quality metrics."""
         gray = cv2.cvtColor(np_img, cv2.COLOR_RGB2GRAY)
         
         # Calculate noise level
-        noise = cv2.fastNlMeansDenoising(gray)
-        noise_level = np.mean(np.abs(gray - noise))
+        if self.noise_method == 'nlm':
+            noise_level = estimate_noise_nlm(gray)
+        else:
+            noise_level = estimate_noise_sigma(gray)
         
         # Calculate blur metric
         laplacian_var = cv2.Laplacian(gray, cv2.CV_64F).var()
         
         return {
             'noise_level': float(noise_level),
+            'noise_method': self.noise_method,
             'blur_metric': float(laplacian_var),
             'sharpness': float(np.mean(cv2.Laplacian(gray, cv2.CV_64F)))
         }
@@ -146,7 +297,7 @@ class ImageAnalyzer:
                 ]
             }
         except Exception as e:
-            logging.error(f"Object detection failed: {e}")
+            logger.error("Object detection failed: %s", e)
             return None
 
     def _classify_scene(self, img):
@@ -163,10 +314,11 @@ class ImageAnalyzer:
                 'confidence': float(probabilities[scene_type])
             }
         except Exception as e:
-            logging.error(f"Scene classification failed: {e}")
+            logger.error("Scene classification failed: %s", e)
             return None
 
-def get_image_analysis(img):
+def get_image_analysis(img, noise_method='fast', texture_levels=64, texture_size=0, texture_patches=256):
     """Convenience function to get image analysis."""
-    analyzer = ImageAnalyzer()
+    analyzer = ImageAnalyzer(noise_method=noise_method, texture_levels=texture_levels,
+                             texture_size=texture_size, texture_patches=texture_patches)
     return analyzer.analyze_image(img) 
\ No newline at end of file
@@ -2,7 +2,6 @@ import logging
 from PIL import Image, ImageEnhance, ImageFilter, ImageDraw, ImageFont, ImageOps
 import numpy as np
 import cv2
-import rembg
 from io import BytesIO
 from skimage import exposure, restoration
 from skimage.filters import unsharp_mask
@@ -11,10 +10,19 @@ from torchvision import transforms
 import gc
 from functools import lru_cache
 import os
+import threading
+from imageUpscaler.denoise import fast_nlm_denoise
+from imageUpscaler import face_detection, frequency, resample
+from imageUpscaler.inference import (
+    resolve_cpu_options, optimize_model_for_cpu, prepare_input,
+    cpu_inference_context, to_uint8_image_array
+)
+
+logger = logging.getLogger(__name__)
 
 # Global device configuration
 DEVICE = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
-logging.info(f"Using device: {DEVICE}")
+logger.info("Using device: %s", DEVICE)
 
 # GPU memory management
 def clear_gpu_memory():
@@ -34,10 +42,6 @@ def get_gpu_memory_info():
     return None
 
 # Model caching with GPU optimization
-@lru_cache(maxsize=2)
-def get_face_cascade():
-    return cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
-
 @lru_cache(maxsize=2)
 def get_clahe():
     return cv2.createCLAHE(clipLimit=3.0, tileGridSize=(8,8))
@@ -50,20 +54,50 @@ class ModelCache:
             transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
         ])
         self.batch_size = 4  # Default batch size for GPU processing
+        self.cpu_options = resolve_cpu_options({})
+        # Shared by the batch workers: models are built and dropped under the lock
+        self._lock = threading.Lock()
+
+    def configure(self, gpu_settings):
+        """Apply gpu_settings, dropping cached models built with other options."""
+        cpu_options = resolve_cpu_options(gpu_settings)
+        with self._lock:
+            self.batch_size = gpu_settings.get("batch_size", self.batch_size)
+            if cpu_options != self.cpu_options:
+                self.cpu_options = cpu_options
+                self.models.clear()
 
     def get_model(self, model_name):
-        if model_name not in self.models:
-            # Load model here (placeholder for actual model loading)
-            self.models[model_name] = torch.nn.Sequential(
-                torch.nn.Conv2d(3, 64, 3, padding=1),
-                torch.nn.ReLU(),
-                torch.nn.Conv2d(64, 3, 3, padding=1)
-            ).to(DEVICE)
-            # Enable CUDA optimizations
-            if torch.cuda.is_available():
-                self.models[model_name] = torch.nn.DataParallel(self.models[model_name])
-                torch.backends.cudnn.benchmark = True
-        return self.models[model_name]
+        with self._lock:
+            model = self.models.get(model_name)
+            if model is None:
+                # Load model here (placeholder for actual model loading)
+                model = torch.nn.Sequential(
+                    torch.nn.Conv2d(3, 64, 3, padding=1),
+                    torch.nn.ReLU(),
+                    torch.nn.Conv2d(64, 3, 3, padding=1)
+                ).to(DEVICE)
+                # Enable CUDA optimizations
+                if torch.cuda.is_available():
+                    model = torch.nn.DataParallel(model)
+                    torch.backends.cudnn.benchmark = True
+                else:
+                    model = optimize_model_for_cpu(model, self.cpu_options)
+                self.models[model_name] = model
+            return model
+
+    def prepare(self, batch):
+        """Move an input batch to the device in the layout the model expects."""
+        batch = batch.to(DEVICE)
+        if DEVICE.type == 'cpu':
+            batch = prepare_input(batch, self.cpu_options)
+        return batch
+
+    def inference_context(self):
+        """Context for running the model: tuned CPU inference or plain no_grad."""
+        if DEVICE.type == 'cpu':
+            return cpu_inference_context(self.cpu_options)
+        return torch.no_grad()
 
     def process_batch(self, images, model_name='default'):
         """Process a batch of images using GPU acceleration."""
@@ -73,36 +107,34 @@ class ModelCache:
             
             # Convert images to tensors
             tensors = [self.transform(img).unsqueeze(0) for img in images]
-            batch = torch.cat(tensors, dim=0).to(DEVICE)
+            batch = self.prepare(torch.cat(tensors, dim=0))
             
             # Get model and process batch
             model = self.get_model(model_name)
-            with torch.no_grad():
+            with self.inference_context():
                 enhanced = model(batch)
             
             # Convert back to PIL Images
             results = []
             for i in range(len(images)):
-                img_tensor = enhanced[i].cpu()
-                img_np = img_tensor.numpy()
-                img_np = np.transpose(img_np, (1, 2, 0))
-                img_np = np.clip(img_np * 255, 0, 255).astype(np.uint8)
-                results.append(Image.fromarray(img_np))
+                results.append(Image.fromarray(to_uint8_image_array(enhanced[i])))
             
             return results
         except Exception as e:
-            logging.error(f"Batch processing failed: {e}")
+            logger.error("Batch processing failed: %s", e)
             return images
 
     def clear_cache(self):
         """Clear model cache and GPU memory."""
-        self.models.clear()
+        with self._lock:
+            self.models.clear()
         clear_gpu_memory()
 
 model_cache = ModelCache()
 
-def upscale_image(img, factor):
-    return img.resize((int(img.width * factor), int(img.height * factor)), Image.LANCZOS)
+def upscale_image(img, factor, backend="pil", tile_size=256):
+    """Resize by factor; see imageUpscaler.resample for the available backends."""
+    return resample.upscale(img, factor, backend=backend, tile_size=tile_size)
 
 def adjust_contrast(img, factor):
     enhancer = ImageEnhance.Contrast(img)
@@ -122,29 +154,46 @@ def convert_image_format(img, output_format):
     output_io.seek(0)
     return Image.open(output_io)
 
-def add_watermark(img, watermark_text, position, font_size=36, opacity=128):
-    img = img.convert('RGBA')
-    watermark = Image.new('RGBA', img.size, (255, 255, 255, 0))
-    draw = ImageDraw.Draw(watermark)
+@lru_cache(maxsize=8)
+def get_watermark_font(font_size):
     try:
-        font = ImageFont.truetype("arial.ttf", font_size)
+        return ImageFont.truetype("arial.ttf", font_size)
     except IOError:
-        font = ImageFont.load_default()
+        return ImageFont.load_default()
+
+@lru_cache(maxsize=32)
+def get_watermark_sprite(watermark_text, font_size=36, opacity=128):
+    """Render the watermark once as a tight alpha mask; returns (mask, (dx, dy)).
+
+    (dx, dy) is the offset of the mask from the text origin.
+    """
+    font = get_watermark_font(font_size)
+    left, top, right, bottom = ImageDraw.Draw(Image.new('L', (1, 1))).textbbox((0, 0), watermark_text, font=font)
+    mask = Image.new('L', (max(right - left, 1), max(bottom - top, 1)), 0)
+    ImageDraw.Draw(mask).text((-left, -top), watermark_text, font=font, fill=opacity)
+    return mask, (left, top)
 
-    bbox = draw.textbbox((0, 0), watermark_text, font=font)
-    text_width = bbox[2] - bbox[0]
-    text_height = bbox[3] - bbox[1]
+def add_watermark(img, watermark_text, position, font_size=36, opacity=128):
+    """Blend white watermark text into img and return it as RGB.
+
+    Only the text's bounding box is touched, in place: RGB images are
+    modified directly, other modes are converted to RGB first.
+    """
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+    mask, (dx, dy) = get_watermark_sprite(watermark_text, font_size, opacity)
+    text_width, text_height = mask.size
 
     if position == "center":
         text_position = ((img.width - text_width) // 2, (img.height - text_height) // 2)
-    elif position == "bottom_right":
-        text_position = (img.width - text_width - 10, img.height - text_height - 10)
     else:
-        text_position = (10, 10)
+        # Corners, 10 pixels in from the edges; top_left is also the fallback
+        x = img.width - text_width - 10 if position.endswith("right") else 10
+        y = img.height - text_height - 10 if position.startswith("bottom") else 10
+        text_position = (x, y)
 
-    draw.text(text_position, watermark_text, font=font, fill=(255, 255, 255, opacity))
-    watermarked_img = Image.alpha_composite(img, watermark)
-    return watermarked_img.convert('RGB')
+    img.paste((255, 255, 255), (text_position[0] + dx, text_position[1] + dy), mask)
+    return img
 
 def crop_image(img, left, top, right, bottom):
     return img.crop((left, top, right, bottom))
@@ -161,16 +210,13 @@ def flip_image(img, mode):
     elif mode == 'vertical':
         return img.transpose(Image.FLIP_TOP_BOTTOM)
 
-def reduce_noise(img):
-    np_img = np.array(img)
-    if np_img.size == 0:
-        raise ValueError("Image is empty or not loaded correctly.")
-    logging.debug(f"reduce_noise: np_img.shape={np_img.shape}, np_img.dtype={np_img.dtype}")
-    img_cv2 = cv2.cvtColor(np_img, cv2.COLOR_RGB2BGR)
-    dst = cv2.fastNlMeansDenoisingColored(img_cv2, None, 10, 10, 7, 21)
-    return Image.fromarray(cv2.cvtColor(dst, cv2.COLOR_BGR2RGB))
+def reduce_noise(img, strength=1.0, preset="quality"):
+    return fast_nlm_denoise(img, strength=strength, preset=preset)
 
 def remove_background(img):
+    # Imported on first use: loading rembg is slow and leaves a process that forks unable to exit
+    import rembg
+
     return rembg.remove(img)
 
 def compress_image(img, quality=85):
@@ -179,17 +225,9 @@ def compress_image(img, quality=85):
     output_io.seek(0)
     return Image.open(output_io)
 
-def detect_faces(img):
-    face_cascade = get_face_cascade()
-    
-    np_img = np.array(img)
-    if np_img.size == 0:
-        raise ValueError("Image is empty or not loaded correctly.")
-    logging.debug(f"detect_faces: np_img.shape={np_img.shape}, np_img.dtype={np_img.dtype}")
-
-    gray = cv2.cvtColor(np_img, cv2.COLOR_RGB2GRAY)
-    faces = face_cascade.detectMultiScale(gray, 1.1, 4)
-    return faces
+def detect_faces(img, **kwargs):
+    """Detect faces; see imageUpscaler.face_detection.detect_faces for the options."""
+    return face_detection.detect_faces(img, **kwargs)
 
 def draw_rectangles(img, rectangles):
     draw = ImageDraw.Draw(img)
@@ -201,50 +239,91 @@ def enhance_image_ai(img, model_name='default'):
     """Apply AI-based image enhancement using deep learning with GPU support."""
     try:
         # Convert to tensor and move to GPU if available
-        img_tensor = model_cache.transform(img).unsqueeze(0).to(DEVICE)
+        img_tensor = model_cache.prepare(model_cache.transform(img).unsqueeze(0))
         
         # Get model and apply enhancement
         model = model_cache.get_model(model_name)
-        with torch.no_grad():
+        with model_cache.inference_context():
             enhanced = model(img_tensor)
         
         # Convert back to PIL Image
-        enhanced = enhanced.squeeze(0).cpu().numpy()
-        enhanced = np.transpose(enhanced, (1, 2, 0))
-        enhanced = np.clip(enhanced * 255, 0, 255).astype(np.uint8)
-        return Image.fromarray(enhanced)
+        return Image.fromarray(to_uint8_image_array(enhanced.squeeze(0)))
     except Exception as e:
-        logging.error(f"AI enhancement failed: {e}")
+        logger.error("AI enhancement failed: %s", e)
         return img
 
-def process_hdr(img, exposure_values=[-2, 0, 2], merge_method='average'):
-    """Process HDR-like effect from a single image with multiple merge methods."""
-    try:
-        images = []
-        for ev in exposure_values:
-            adjusted = exposure.adjust_gamma(img, 2 ** ev)
-            images.append(np.array(adjusted))
-        
+HDR_MERGE_METHODS = ('average', 'maximum')
+
+def _merge_exposures(values, exposure_values, merge_method, out):
+    """Merge gamma-adjusted copies of values (floats in [0, 1]) into out, one exposure at a time."""
+    adjusted = np.empty_like(out)
+    for i, ev in enumerate(exposure_values):
+        np.power(values, 2.0 ** ev, out=adjusted if i else out)
+        if not i:
+            continue
         if merge_method == 'average':
-            merged = np.mean(images, axis=0)
-        elif merge_method == 'maximum':
-            merged = np.maximum.reduce(images)
+            out += adjusted
         else:
-            merged = exposure.merge_hdr(images)
-        
-        return Image.fromarray((merged * 255).astype(np.uint8))
+            np.maximum(out, adjusted, out=out)
+    if merge_method == 'average':
+        out /= len(exposure_values)
+    return out
+
+@lru_cache(maxsize=16)
+def hdr_lut(exposure_values, merge_method='average'):
+    """256-entry table mapping a uint8 value to its merged HDR value.
+
+    Every output pixel depends only on its own input value, so all exposures
+    fold into one lookup: any number of exposures costs a single pass.
+    """
+    values = np.linspace(0.0, 1.0, 256, dtype=np.float32)
+    merged = _merge_exposures(values, exposure_values, merge_method, np.empty_like(values))
+    return np.clip(merged * 255 + 0.5, 0, 255).astype(np.uint8)
+
+def process_hdr(img, exposure_values=(-2, 0, 2), merge_method='average', tile_rows=512):
+    """Process HDR-like effect from a single image with multiple merge methods.
+
+    Each exposure value ev is a gamma of 2 ** ev on the [0, 1] range; the
+    adjusted images are averaged or combined by per-pixel maximum. 8-bit
+    images go through one precomputed lookup table; 16-bit and float images
+    are merged in float32 strips of tile_rows rows, so memory beyond the
+    output stays constant whatever the number of exposures. Alpha is kept
+    for RGBA images.
+    """
+    try:
+        if merge_method not in HDR_MERGE_METHODS:
+            raise ValueError(f"Unknown HDR merge method: {merge_method}")
+        exposure_values = tuple(exposure_values)
+        # Keep img as given: on failure it is returned unchanged
+        source = img if img.mode in ('L', 'RGB', 'RGBA', 'I;16', 'F') else img.convert('RGB')
+        np_img = np.array(source)
+
+        if np_img.dtype == np.uint8:
+            lut = hdr_lut(exposure_values, merge_method)
+            if source.mode == 'RGBA':
+                # Per-channel table that leaves alpha as it is
+                lut = np.stack([lut] * 3 + [np.arange(256, dtype=np.uint8)], axis=-1).reshape(256, 1, 4)
+            cv2.LUT(np_img, lut, dst=np_img)
+        else:
+            scale = np.iinfo(np_img.dtype).max if np.issubdtype(np_img.dtype, np.integer) else 1.0
+            for y in range(0, np_img.shape[0], tile_rows):
+                strip = np_img[y:y + tile_rows].astype(np.float32) / scale
+                merged = _merge_exposures(np.clip(strip, 0.0, 1.0), exposure_values, merge_method, strip)
+                np_img[y:y + tile_rows] = merged * scale + (0.5 if scale != 1.0 else 0.0)
+        return Image.fromarray(np_img)
     except Exception as e:
-        logging.error(f"HDR processing failed: {e}")
+        logger.error("HDR processing failed: %s", e)
         return img
 
-def advanced_noise_reduction(img, method='nlm', strength=1.0):
+def advanced_noise_reduction(img, method='nlm', strength=1.0, preset='balanced', tile_size=512):
     """Apply advanced noise reduction techniques with strength control."""
     try:
-        np_img = np.array(img)
         if method == 'nlm':
-            # Non-local means denoising with strength control
-            result = cv2.fastNlMeansDenoisingColored(np_img, None, 10, 10, 7, 21)
-        elif method == 'wavelet':
+            # Non-local means denoising; strength scales the work done, no blending needed
+            return fast_nlm_denoise(img, strength=strength, preset=preset, tile_size=tile_size)
+
+        np_img = np.array(img)
+        if method == 'wavelet':
             # Wavelet denoising with strength control
             result = restoration.denoise_wavelet(np_img, multichannel=True, convert2ycbcr=True)
             result = (result * 255).astype(np.uint8)
@@ -258,7 +337,7 @@ def advanced_noise_reduction(img, method='nlm', strength=1.0):
         
         return Image.fromarray(result)
     except Exception as e:
-        logging.error(f"Advanced noise reduction failed: {e}")
+        logger.error("Advanced noise reduction failed: %s", e)
         return img
 
 def smart_sharpen(img, amount=1.0, radius=1.0, threshold=0, method='unsharp'):
@@ -276,7 +355,7 @@ def smart_sharpen(img, amount=1.0, radius=1.0, threshold=0, method='unsharp'):
         
         return Image.fromarray(np.clip(sharpened, 0, 255).astype(np.uint8))
     except Exception as e:
-        logging.error(f"Smart sharpening failed: {e}")
+        logger.error("Smart sharpening failed: %s", e)
         return img
 
 def auto_color_correction(img, method='clahe'):
@@ -306,11 +385,14 @@ def auto_color_correction(img, method='clahe'):
         
         return Image.fromarray(corrected)
     except Exception as e:
-        logging.error(f"Color correction failed: {e}")
+        logger.error("Color correction failed: %s", e)
         return img
 
-def enhance_details(img, strength=1.0, method='detail'):
-    """Enhance fine details in the image with multiple methods."""
+def enhance_details(img, strength=1.0, method='detail', luma_only=True):
+    """Enhance fine details in the image with multiple methods.
+
+    luma_only applies to the 'frequency' method, see imageUpscaler.frequency.
+    """
     try:
         np_img = np.array(img)
         if method == 'detail':
@@ -321,18 +403,14 @@ def enhance_details(img, strength=1.0, method='detail'):
             kernel = np.array([[-1,-1,-1], [-1,9,-1], [-1,-1,-1]])
             enhanced = cv2.filter2D(np_img, -1, kernel)
         elif method == 'frequency':
-            # Frequency domain enhancement
-            dft = cv2.dft(np.float32(np_img), flags=cv2.DFT_COMPLEX_OUTPUT)
-            dft_shift = np.fft.fftshift(dft)
-            magnitude_spectrum = 20 * np.log(cv2.magnitude(dft_shift[:,:,0], dft_shift[:,:,1]))
-            enhanced = np.fft.ifftshift(dft_shift)
-            enhanced = cv2.idft(enhanced)
-            enhanced = cv2.magnitude(enhanced[:,:,0], enhanced[:,:,1])
-            enhanced = np.uint8(enhanced * 255 / enhanced.max())
-        
+            # Frequency domain high-boost with real FFTs
+            enhanced = frequency.frequency_enhance(np_img, luma_only=luma_only)
+        else:
+            raise ValueError(f"Unknown detail enhancement method: {method}")
+
         # Blend with original based on strength
         result = cv2.addWeighted(np_img, 1-strength, enhanced, strength, 0)
         return Image.fromarray(result)
     except Exception as e:
-        logging.error(f"Detail enhancement failed: {e}")
+        logger.error("Detail enhancement failed: %s", e)
         return img
@@ -0,0 +1,124 @@
+import inspect
+import io
+import logging
+from contextlib import contextmanager, nullcontext
+import numpy as np
+import torch
+
+logger = logging.getLogger(__name__)
+
+# CPU inference options selected by gpu_settings.optimization_level.
+# "bfloat16" additionally requires gpu_settings.mixed_precision and a CPU
+# with native bfloat16 support; emulated bfloat16 is slower than fp32.
+# Every level runs eagerly: compiled backends cost time on each model load,
+# so they are only used when gpu_settings.cpu_backend asks for one. That
+# leaves nothing more for "high" to add on CPU, so it is an alias of "medium".
+CPU_OPTIMIZATION_LEVELS = {
+    "low": {"channels_last": False, "bfloat16": False, "backend": "eager"},
+    "medium": {"channels_last": True, "bfloat16": True, "backend": "eager"},
+}
+CPU_OPTIMIZATION_LEVELS["high"] = CPU_OPTIMIZATION_LEVELS["medium"]
+
+CPU_BACKENDS = ("eager", "torchscript", "compile", "onnx")
+
+def cpu_supports_bfloat16():
+    """Return True if oneDNN can run bfloat16 natively on this CPU."""
+    try:
+        return bool(torch.ops.mkldnn._is_mkldnn_bf16_supported())
+    except (AttributeError, RuntimeError):
+        return False
+
+def resolve_cpu_options(gpu_settings):
+    """Turn gpu_settings into the CPU inference options to apply.
+
+    optimization_level picks a preset; cpu_backend, when set, overrides the
+    preset's execution backend.
+    """
+    level = gpu_settings.get("optimization_level", "high")
+    if level not in CPU_OPTIMIZATION_LEVELS:
+        raise ValueError(f"Unknown optimization level: {level}")
+    options = dict(CPU_OPTIMIZATION_LEVELS[level])
+    options["bfloat16"] = (options["bfloat16"] and gpu_settings.get("mixed_precision", False)
+                           and cpu_supports_bfloat16())
+    backend = gpu_settings.get("cpu_backend")
+    if backend:
+        if backend not in CPU_BACKENDS:
+            raise ValueError(f"Unknown CPU backend: {backend}")
+        options["backend"] = backend
+    return options
+
+class OnnxRuntimeModel:
+    """Callable wrapper running an exported model in ONNX Runtime."""
+
+    def __init__(self, model, channels=3):
+        import onnxruntime as ort
+
+        example = torch.randn(1, channels, 64, 64)
+        buffer = io.BytesIO()
+        export_kwargs = {}
+        if "dynamo" in inspect.signature(torch.onnx.export).parameters:
+            export_kwargs["dynamo"] = False
+        dynamic_axes = {0: "batch", 2: "height", 3: "width"}
+        torch.onnx.export(
+            model, (example,), buffer,
+            input_names=["input"], output_names=["output"],
+            dynamic_axes={"input": dynamic_axes, "output": dynamic_axes},
+            **export_kwargs
+        )
+        self.session = ort.InferenceSession(buffer.getvalue(), providers=["CPUExecutionProvider"])
+
+    def __call__(self, batch):
+        output = self.session.run(None, {"input": batch.float().contiguous().numpy()})[0]
+        return torch.from_numpy(output)
+
+def optimize_model_for_cpu(model, options, channels=3):
+    """Apply the selected CPU optimisations to an eval-mode model.
+
+    The chosen backend is exercised once on a small input, and if it (or its
+    optional dependency) fails the eager model is used instead, with a warning.
+    """
+    model = model.eval()
+    if options["channels_last"]:
+        model = model.to(memory_format=torch.channels_last)
+
+    backend = options["backend"]
+    if backend == "eager":
+        return model
+
+    example = prepare_input(torch.rand(1, channels, 64, 64), options)
+    try:
+        if backend == "torchscript":
+            # Frozen TorchScript graphs ignore autocast, so they run in fp32
+            with torch.inference_mode():
+                optimized = torch.jit.optimize_for_inference(torch.jit.freeze(torch.jit.trace(model, example)))
+        elif backend == "compile":
+            optimized = torch.compile(model, dynamic=True)
+        else:
+            optimized = OnnxRuntimeModel(model, channels)
+        with cpu_inference_context(options):
+            optimized(example)  # compile or validate now rather than on the first image
+        return optimized
+    except Exception as e:
+        logger.warning("CPU backend '%s' unavailable, using eager mode: %s", backend, e)
+        return model
+
+def prepare_input(batch, options):
+    """Lay out an input batch to match the optimised model."""
+    if options.get("channels_last") and options.get("backend") != "onnx":
+        return batch.contiguous(memory_format=torch.channels_last)
+    return batch
+
+@contextmanager
+def cpu_inference_context(options):
+    """inference_mode plus bfloat16 autocast when enabled; yields nothing."""
+    autocast = nullcontext()
+    if options.get("bfloat16") and options.get("backend") != "onnx":
+        autocast = torch.autocast("cpu", dtype=torch.bfloat16)
+    with torch.inference_mode(), autocast:
+        yield
+
+def to_uint8_image_array(tensor):
+    """Convert a CHW float tensor in [0, 1] to an HWC uint8 array."""
+    np_img = tensor.float().cpu().numpy()
+    np_img = np.transpose(np_img, (1, 2, 0))
+    return np.clip(np_img * 255, 0, 255).astype(np.uint8)
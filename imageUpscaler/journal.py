@@ -0,0 +1,97 @@
+import os
+import sqlite3
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_FILENAME = ".imageUpscaler_journal.sqlite"
+
+class ProgressJournal:
+    """Durable record of per-image batch progress, used to resume interrupted runs.
+
+    Records are buffered in memory and written in a single transaction once
+    `batch_size` records are pending or `flush_interval` seconds have passed,
+    so journaling does not serialise the workers on disk syncs.
+    """
+
+    def __init__(self, path, batch_size=100, flush_interval=2.0):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._pending = []
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS progress ("
+            "input_path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, "
+            "status TEXT, output_path TEXT, updated_at REAL)"
+        )
+        self._conn.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _key(self, img_path):
+        stat = os.stat(img_path)
+        return os.path.abspath(img_path), stat.st_size, stat.st_mtime_ns
+
+    def pending(self, img_paths):
+        """Return the paths that have not completed since they were last modified.
+
+        Paths that no longer exist (deleted since they were listed) are left out.
+        """
+        with self._lock:
+            done = {
+                (row[0], row[1], row[2])
+                for row in self._conn.execute(
+                    "SELECT input_path, size, mtime_ns FROM progress WHERE status = 'done'")
+            }
+        pending = []
+        for img_path in img_paths:
+            try:
+                key = self._key(img_path)
+            except FileNotFoundError:
+                logger.info("Skipping %s: no longer exists", img_path)
+                continue
+            if key not in done:
+                pending.append(img_path)
+        return pending
+
+    def record(self, img_path, status, output_path=None):
+        """Queue the outcome of one input, flushing when the batch is full or stale."""
+        try:
+            key = self._key(img_path)
+        except OSError as e:
+            logger.warning("Not journaling %s: %s", img_path, e)
+            return
+        with self._lock:
+            self._pending.append(key + (status, output_path, time.time()))
+            if (len(self._pending) >= self.batch_size
+                    or time.monotonic() - self._last_flush >= self.flush_interval):
+                self._flush_locked()
+
+    def flush(self):
+        """Write all queued records in one transaction."""
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        if self._pending:
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO progress VALUES (?, ?, ?, ?, ?, ?)", self._pending)
+            self._pending = []
+        self._last_flush = time.monotonic()
+
+    def close(self):
+        """Flush outstanding records and close the database."""
+        self.flush()
+        self._conn.close()
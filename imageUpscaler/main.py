@@ -2,18 +2,37 @@ import logging
 import json
 from tqdm import tqdm
 import os
+import posixpath
+import shutil
+import tempfile
+from contextlib import nullcontext
 from imageUpscaler.config import load_configuration
-from imageUpscaler.file_utils import load_images
-from imageUpscaler.notifications import send_notification
+from imageUpscaler.file_utils import list_images
+from imageUpscaler.frame_store import FRAME_EXTENSION, write_frame
+from imageUpscaler.encoding import resolve_format, submit_encode, configure_encode_pool, encode_stats
+from imageUpscaler.archives import (
+    ArchiveWriter, input_name, open_input, output_subdirectory, is_archive, is_stream_source, iter_stream_inputs
+)
+from imageUpscaler.notifications import create_dispatcher
 from imageUpscaler.image_processing import *
 from imageUpscaler.filters import *
 from imageUpscaler.transformations import *
 from imageUpscaler.metadata import preserve_metadata
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from imageUpscaler.adaptive import plan_adaptive_stages, skipped_stages
+from imageUpscaler.journal import ProgressJournal, JOURNAL_FILENAME
+from imageUpscaler.sequences import (
+    is_sequence, iter_frames, prefetch, batched, read_loop_count, sequence_output_extension, SequenceWriter
+)
+from imageUpscaler.sharding import parse_shard, select_shard, LeaseManager, default_node_id
+from imageUpscaler.dedup import find_duplicate_groups, write_duplicate_outputs, dedup_report, format_dedup_report
+from imageUpscaler.scheduler import plan_jobs, plan_chunks, dispatch, MemoryMonitor
+from imageUpscaler.concurrency import configure_threads
+from imageUpscaler.face_detection import detect_faces_batch
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from datetime import datetime
 import time
 
-logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
 
 def get_input(prompt, default=None, cast_type=str):
     """
@@ -64,7 +83,7 @@ def create_configuration(config_path):
         config["crop_settings"] = None
     
     config["rotation_angle"] = get_float_input("Enter the rotation angle (leave empty for no rotation): ", 0.0)
-    config["flip_mode"] = get_input("Enter the flip mode (horizontal/vertical/none): ", None).lower()
+    config["flip_mode"] = get_input("Enter the flip mode (horizontal/vertical/none): ", "none").lower()
     config["noise_reduction"] = get_input("Apply noise reduction? (yes/no): ", "no").lower() == 'yes'
     config["histogram_equalization"] = get_input("Apply histogram equalization? (yes/no): ", "no").lower() == 'yes'
     config["sepia_filter"] = get_input("Apply sepia filter? (yes/no): ", "no").lower() == 'yes'
@@ -72,7 +91,7 @@ def create_configuration(config_path):
     config["face_detection"] = get_input("Apply face detection? (yes/no): ", "no").lower() == 'yes'
     config["background_removal"] = get_input("Remove background? (yes/no): ", "no").lower() == 'yes'
     config["compression_quality"] = get_int_input("Enter compression quality (1-100, leave empty for default 85): ")
-    config["preserve_meta"] = get_input("Preserve metadata? (yes/no): ", "no").lower() == 'yes'
+    config["preserve_metadata"] = get_input("Preserve metadata? (yes/no): ", "no").lower() == 'yes'
 
     with open(config_path, 'w') as config_file:
         json.dump(config, config_file, indent=4)
@@ -83,208 +102,577 @@ def load_or_create_configuration(config_path):
     Load an existing configuration file or create a new one if it doesn't exist.
     """
     if not os.path.exists(config_path):
-        return create_configuration(config_path)
+        create_configuration(config_path)
     return load_configuration(config_path)
 
-def process_image(img_path, config, output_directory):
+def plan_stages(img, config):
     """
-    Process a single image based on the given configuration and save the output.
+    Decide how the optional stages run for an image: as configured, minus the ones
+    adaptive processing finds unnecessary for it.
     """
-    try:
-        filename = os.path.basename(img_path)
-        img = Image.open(img_path)
-        original_img = img.copy()
+    noise_settings = config["noise_reduction"]
+    noise_enabled = noise_settings["enabled"]
+    noise_strength = noise_settings["strength"]
+    sharpen_enabled = config["advanced_features"]["smart_sharpen"]["enabled"]
+    color_correction_enabled = config["advanced_features"]["auto_color_correction"]
+    skipped = []
+
+    # Triage on cheap metrics so clean or sharp images skip expensive stages
+    if config["adaptive_processing"]["enabled"]:
+        plan = plan_adaptive_stages(img, config["adaptive_processing"], noise_strength)
+        requested = [stage for stage, enabled in (
+            ("noise_reduction", noise_enabled),
+            ("smart_sharpen", sharpen_enabled),
+            ("auto_color_correction", color_correction_enabled)) if enabled]
+        skipped = skipped_stages(plan, requested)
+        noise_enabled = noise_enabled and plan["noise_reduction"]
+        noise_strength = plan["noise_strength"]
+        sharpen_enabled = sharpen_enabled and plan["smart_sharpen"]
+        color_correction_enabled = color_correction_enabled and plan["auto_color_correction"]
+
+    return {
+        "noise_settings": noise_settings,
+        "noise_enabled": noise_enabled,
+        "noise_strength": noise_strength,
+        "sharpen_enabled": sharpen_enabled,
+        "color_correction_enabled": color_correction_enabled,
+        "skipped": skipped
+    }
+
+def _record_stage(applied, name, img, result):
+    """
+    List a stage as applied only if it succeeded. The enhancement stages catch their
+    own errors and hand back the image (or batch) they were given unchanged.
+    """
+    if result is not img:
+        applied.append(name)
+    return result
 
-        # Log GPU memory usage before processing
-        gpu_info = get_gpu_memory_info()
-        if gpu_info:
-            logging.debug(f"GPU memory before processing: {gpu_info['allocated'] / 1024**2:.2f}MB allocated")
+def apply_stages_before_ai(img, config, stages, record=None):
+    """
+    Run the stages that come before AI enhancement: denoise, upscale, contrast and color.
+    The stages that ran are listed in the image's summary record, if one is given.
+    """
+    applied = record["stages"] if record is not None else []
+    noise_settings = stages["noise_settings"]
+    noise_enabled = stages["noise_enabled"]
+    noise_strength = stages["noise_strength"]
+
+    # Denoise before upscaling so the filter runs on the smaller frame
+    if noise_enabled:
+        img = _record_stage(applied, "noise_reduction", img, advanced_noise_reduction(
+            img,
+            method=noise_settings["method"],
+            strength=noise_strength,
+            preset=noise_settings["preset"],
+            tile_size=noise_settings["tile_size"]
+        ))
+
+    # Basic processing
+    if config["upscale_factor"] != 1.0:
+        img = upscale_image(
+            img,
+            config["upscale_factor"],
+            backend=config["upscale_settings"]["backend"],
+            tile_size=config["upscale_settings"]["tile_size"]
+        )
+        applied.append("upscale")
+
+    if config["contrast_factor"] != 1.0:
+        img = adjust_contrast(img, config["contrast_factor"])
+        applied.append("contrast")
+
+    if config["color_factor"] != 1.0:
+        img = adjust_color(img, config["color_factor"])
+        applied.append("color")
+
+    return img
+
+def apply_stages_after_ai(img, config, stages, record=None):
+    """
+    Run the stages that follow AI enhancement, from HDR through background removal.
+    The stages that ran, and the number of faces found, go into the summary record.
+    """
+    return apply_stages_after_ai_batch([img], config, stages, record)[0]
+
+def apply_stages_after_ai_batch(images, config, stages, record=None):
+    """
+    Run the stages that follow AI enhancement on a batch of frames. Face detection
+    runs on the whole batch at once; the summary record describes the first frame.
+    """
+    images = [_apply_stages_before_faces(img, config, stages, record if i == 0 else None)
+              for i, img in enumerate(images)]
+    applied = record["stages"] if record is not None else []
+
+    if config["face_detection"]:
+        face_settings = config["face_detection_settings"]
+        face_lists = detect_faces_batch(
+            images,
+            backend=face_settings["backend"],
+            detection_size=face_settings["detection_size"],
+            model_path=face_settings["model_path"],
+            score_threshold=face_settings["score_threshold"]
+        )
+        images = [draw_rectangles(img, faces) if faces else img for img, faces in zip(images, face_lists)]
+        applied.append("face_detection")
+        if record is not None:
+            record["faces"] = len(face_lists[0])
+
+    if config["background_removal"]:
+        images = [remove_background(img) for img in images]
+        applied.append("background_removal")
+
+    return images
+
+def _apply_stages_before_faces(img, config, stages, record=None):
+    """Run the per-image stages from HDR through the vignette filter."""
+    applied = record["stages"] if record is not None else []
+    sharpen_enabled = stages["sharpen_enabled"]
+    color_correction_enabled = stages["color_correction_enabled"]
+
+    if config["advanced_features"]["hdr_processing"]:
+        img = _record_stage(applied, "hdr_processing", img, process_hdr(img))
+
+    if sharpen_enabled:
+        img = _record_stage(applied, "smart_sharpen", img, smart_sharpen(
+            img,
+            amount=config["advanced_features"]["smart_sharpen"]["amount"],
+            radius=config["advanced_features"]["smart_sharpen"]["radius"],
+            threshold=config["advanced_features"]["smart_sharpen"]["threshold"]
+        ))
+
+    if color_correction_enabled:
+        img = _record_stage(applied, "auto_color_correction", img, auto_color_correction(img))
+
+    if config["advanced_features"]["detail_enhancement"]["enabled"]:
+        img = _record_stage(applied, "detail_enhancement", img, enhance_details(
+            img,
+            strength=config["advanced_features"]["detail_enhancement"]["strength"],
+            method=config["advanced_features"]["detail_enhancement"]["method"],
+            luma_only=config["advanced_features"]["detail_enhancement"]["luma_only"]
+        ))
+
+    # Clear GPU memory after heavy processing
+    clear_gpu_memory()
+
+    # Other processing steps
+    if config["watermark_text"]:
+        img = add_watermark(img, config["watermark_text"], config["watermark_position"])
+        applied.append("watermark")
+
+    if config["crop_settings"]:
+        img = crop_image(img, *config["crop_settings"])
+        applied.append("crop")
+
+    if config["rotation_angle"]:
+        img = rotate_image(img, config["rotation_angle"])
+        applied.append("rotate")
+
+    if config["flip_mode"]:
+        img = flip_image(img, config["flip_mode"])
+        applied.append("flip")
+
+    if config["histogram_equalization"]:
+        img = equalize_histogram(img)
+        applied.append("histogram_equalization")
+
+    if config["sepia_filter"]:
+        img = apply_sepia_filter(img)
+        applied.append("sepia_filter")
+
+    if config["vignette_filter"]:
+        img = apply_vignette_filter(img)
+        applied.append("vignette_filter")
+
+    return img
+
+def new_summary_record(name, size):
+    """Start the summary record of one input, filled in as it is processed."""
+    return {"input": name, "input_size": size, "stages": [], "skipped": [], "faces": None}
+
+def log_summary_record(record):
+    """
+    Log one line per processed input instead of one per stage. The full record is
+    attached to the log record as its image_summary attribute for structured handlers.
+    """
+    stages = ", ".join(record["stages"]) or "no stages"
+    if record["skipped"]:
+        stages += "; adaptive skipped " + ", ".join(record["skipped"])
+    logger.info("Processed %s in %.2fs (%s) -> %s", record["input"], record["seconds"], stages, record["output"],
+                extra={"image_summary": record})
 
-        # Basic processing
-        if config["upscale_factor"] != 1.0:
-            img = upscale_image(img, config["upscale_factor"])
-            logging.debug(f"Upscaled image by factor: {config['upscale_factor']}")
+def process_image(img_path, config, output_directory, output_archive=None):
+    """
+    Process a single image based on the given configuration and save the output.
+    img_path may also be an ArchiveMember; with output_archive, outputs are stored in that archive.
+    """
+    if config["sequence_processing"]["enabled"] and is_sequence(img_path):
+        return process_sequence(img_path, config, output_directory, output_archive)
 
-        if config["contrast_factor"] != 1.0:
-            img = adjust_contrast(img, config["contrast_factor"])
-            logging.debug(f"Adjusted contrast by factor: {config['contrast_factor']}")
+    try:
+        start = time.perf_counter()
+        filename = os.path.basename(input_name(img_path))
+        img = open_input(img_path)
+        original_img = img.copy()
+        record = new_summary_record(input_name(img_path), img.size)
 
-        if config["color_factor"] != 1.0:
-            img = adjust_color(img, config["color_factor"])
-            logging.debug(f"Adjusted color by factor: {config['color_factor']}")
+        stages = plan_stages(img, config)
+        record["skipped"] = stages["skipped"]
+        img = apply_stages_before_ai(img, config, stages, record)
 
         # Advanced features with GPU optimization
         if config["advanced_features"]["ai_enhancement"]:
-            img = enhance_image_ai(img)
-            logging.debug("Applied AI enhancement")
-
-        if config["advanced_features"]["hdr_processing"]:
-            img = process_hdr(img)
-            logging.debug("Applied HDR processing")
-
-        if config["advanced_features"]["smart_sharpen"]["enabled"]:
-            img = smart_sharpen(
-                img,
-                amount=config["advanced_features"]["smart_sharpen"]["amount"],
-                radius=config["advanced_features"]["smart_sharpen"]["radius"],
-                threshold=config["advanced_features"]["smart_sharpen"]["threshold"]
-            )
-            logging.debug("Applied smart sharpening")
-
-        if config["advanced_features"]["auto_color_correction"]:
-            img = auto_color_correction(img)
-            logging.debug("Applied auto color correction")
-
-        if config["advanced_features"]["detail_enhancement"]["enabled"]:
-            img = enhance_details(
-                img,
-                strength=config["advanced_features"]["detail_enhancement"]["strength"]
-            )
-            logging.debug("Enhanced details")
-
-        # Clear GPU memory after heavy processing
-        clear_gpu_memory()
-
-        # Other processing steps
-        if config["watermark_text"]:
-            img = add_watermark(img, config["watermark_text"], config["watermark_position"])
-            logging.debug(f"Added watermark: {config['watermark_text']}")
-
-        if config["crop_settings"]:
-            img = crop_image(img, *config["crop_settings"])
-            logging.debug(f"Cropped image with settings: {config['crop_settings']}")
-
-        if config["rotation_angle"]:
-            img = rotate_image(img, config["rotation_angle"])
-            logging.debug(f"Rotated image by: {config['rotation_angle']} degrees")
-
-        if config["flip_mode"]:
-            img = flip_image(img, config["flip_mode"])
-            logging.debug(f"Flipped image mode: {config['flip_mode']}")
-
-        if config["histogram_equalization"]:
-            img = equalize_histogram(img)
-            logging.debug("Applied histogram equalization")
-
-        if config["sepia_filter"]:
-            img = apply_sepia_filter(img)
-            logging.debug("Applied sepia filter")
-
-        if config["vignette_filter"]:
-            img = apply_vignette_filter(img)
-            logging.debug("Applied vignette filter")
-
-        if config["face_detection"]:
-            faces = detect_faces(img)
-            if faces:
-                img = draw_rectangles(img, faces)
-            logging.debug(f"Detected and drew rectangles on faces: {faces}")
-
-        if config["background_removal"]:
-            img = remove_background(img)
-            logging.debug("Removed background")
-
-        # Log GPU memory usage after processing
+            model_cache.configure(config["gpu_settings"])
+            img = _record_stage(record["stages"], "ai_enhancement", img, enhance_image_ai(img))
+
+        img = apply_stages_after_ai(img, config, stages, record)
+
         gpu_info = get_gpu_memory_info()
         if gpu_info:
-            logging.debug(f"GPU memory after processing: {gpu_info['allocated'] / 1024**2:.2f}MB allocated")
+            record["gpu_allocated_mb"] = gpu_info["allocated"] / 1024**2
 
         # Output handling
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        output_format, extension = resolve_format(config["format_conversion"], input_name(img_path))
         output_filename = config["output_settings"]["naming_convention"].format(
             original_name=os.path.splitext(filename)[0],
             timestamp=timestamp
-        ) + os.path.splitext(filename)[1]
+        ) + extension
+
+        # Archive members keep their directory, so a/img.png and b/img.png do not collide
+        subdirectory = output_subdirectory(img_path)
+        output_path = os.path.join(output_directory, subdirectory, output_filename)
+        if subdirectory and not output_archive:
+            os.makedirs(os.path.dirname(output_path), exist_ok=True)
 
-        output_path = os.path.join(output_directory, output_filename)
-        
-        # Save processed image
-        img.save(output_path, quality=config["compression_quality"])
-        logging.info(f"Processed and saved image: {output_path}")
+        if config["preserve_metadata"]:
+            img = preserve_metadata(original_img, img)
+
+        # Encode on the dedicated pool; main output, thumbnail and original run side by side
+        profile = config["output_settings"]["encoder_profile"]
+        quality = config["compression_quality"]
+        encodes = []
+
+        def save(output_img, name):
+            if output_archive:
+                return output_archive.submit_encode(output_img, posixpath.join(subdirectory, name),
+                                                    output_format, profile, quality)
+            return submit_encode(output_img, os.path.join(output_directory, subdirectory, name),
+                                 output_format, profile, quality)
+
+        # Save processed image, or keep it as a raw frame for the next pass
+        if output_archive:
+            output_path = output_archive.member_path(posixpath.join(subdirectory, output_filename))
+            encodes.append(save(img, output_filename))
+        elif config["output_settings"]["frame_store"]:
+            output_path = os.path.splitext(output_path)[0] + FRAME_EXTENSION
+            write_frame(img, output_path)
+        else:
+            encodes.append(save(img, output_filename))
 
         # Create thumbnail if enabled
         if config["output_settings"]["create_thumbnails"]:
             thumbnail_size = config["output_settings"]["thumbnail_size"]
             thumbnail = img.copy()
             thumbnail.thumbnail(thumbnail_size)
-            thumbnail_path = os.path.join(
-                output_directory,
-                f"thumb_{output_filename}"
-            )
-            thumbnail.save(thumbnail_path)
-            logging.debug(f"Created thumbnail: {thumbnail_path}")
+            encodes.append(save(thumbnail, f"thumb_{output_filename}"))
 
         # Preserve original if enabled
         if config["output_settings"]["preserve_original"]:
-            original_path = os.path.join(
-                output_directory,
-                f"original_{output_filename}"
-            )
-            original_img.save(original_path)
-            logging.debug(f"Preserved original: {original_path}")
-
-        if config["preserve_meta"]:
-            img = preserve_metadata(original_img, img)
-            logging.debug("Preserved metadata")
+            encodes.append(save(original_img, f"original_{output_filename}"))
+
+        # Outputs must be on disk before the caller records the image as done
+        for encode in encodes:
+            encode.result()
+        record.update(output=output_path, output_size=img.size, seconds=time.perf_counter() - start)
+        log_summary_record(record)
 
-        send_notification("Image Processing", f"Processed image saved as: {output_path}")
         return output_path
 
     except Exception as e:
-        logging.error(f"Error processing image {img_path}: {e}")
+        logger.error("Error processing image %s: %s", input_name(img_path), e)
+        return None
+
+def process_sequence(img_path, config, output_directory, output_archive=None):
+    """
+    Process an animation or video frame by frame, re-encoding frames as they finish
+    so the clip is never held in memory. Frames are decoded a few ahead on a
+    background thread and go through AI enhancement in batches. The stage plan is
+    made once, from the first frame, so adaptive decisions do not flicker.
+    With output_archive, the clip is written to a temporary file and then added to the archive.
+    """
+    try:
+        start = time.perf_counter()
+        settings = config["sequence_processing"]
+        filename = os.path.basename(img_path)
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        output_filename = config["output_settings"]["naming_convention"].format(
+            original_name=os.path.splitext(filename)[0],
+            timestamp=timestamp
+        ) + sequence_output_extension(img_path)
+        output_stem = os.path.splitext(output_filename)[0]
+        thumbnail_filename = f"thumb_{output_stem}.png"
+        original_filename = f"original_{output_stem}{os.path.splitext(filename)[1]}"
+
+        ai_enabled = config["advanced_features"]["ai_enhancement"]
+        if ai_enabled:
+            model_cache.configure(config["gpu_settings"])
+        # Frames are batched for the stages that run a batch at once: AI enhancement and face detection
+        batched_stages = ai_enabled or config["face_detection"]
+        batch_size = (settings["ai_batch_size"] or config["gpu_settings"]["batch_size"]) if batched_stages else 1
+
+        record = None
+        stages = None
+        frames = prefetch(iter_frames(img_path), settings["lookahead"])
+        # Clips are encoded to a file either way: in place, or next to the archive until added to it
+        with tempfile.TemporaryDirectory() if output_archive else nullcontext(output_directory) as clip_directory:
+            output_path = os.path.join(clip_directory, output_filename)
+            thumbnail_path = None
+            with SequenceWriter(output_path, loop=read_loop_count(img_path), fourcc=settings["video_codec"]) as writer:
+                for batch in batched(frames, batch_size):
+                    images = [frame for frame, _ in batch]
+                    if stages is None:
+                        # Every frame runs the same stages, so the first one stands for the clip
+                        record = new_summary_record(img_path, images[0].size)
+                        stages = plan_stages(images[0], config)
+                        record["skipped"] = stages["skipped"]
+                    images = [apply_stages_before_ai(frame, config, stages, record if writer.frames == i == 0 else None)
+                              for i, frame in enumerate(images)]
+                    if ai_enabled:
+                        applied = record["stages"] if writer.frames == 0 else []
+                        images = _record_stage(applied, "ai_enhancement", images, model_cache.process_batch(images))
+                    images = apply_stages_after_ai_batch(images, config, stages, record if writer.frames == 0 else None)
+                    for image, (_, duration) in zip(images, batch):
+                        if writer.frames == 0 and config["output_settings"]["create_thumbnails"]:
+                            thumbnail = image.copy()
+                            thumbnail.thumbnail(config["output_settings"]["thumbnail_size"])
+                            thumbnail_path = os.path.join(clip_directory, thumbnail_filename)
+                            thumbnail.save(thumbnail_path)
+                        writer.write(image, duration)
+            if writer.frames == 0:
+                # Nothing decoded: drop the empty clip so the input is recorded as failed
+                if os.path.exists(output_path):
+                    os.remove(output_path)
+                raise ValueError("no frames could be decoded")
+
+            preserve_original = config["output_settings"]["preserve_original"]
+            # Re-encoding the source clip would only lose quality, so the original is kept as it is
+            if output_archive:
+                output_path = output_archive.add_file(output_filename, output_path)
+                if thumbnail_path:
+                    output_archive.add_file(thumbnail_filename, thumbnail_path)
+                if preserve_original:
+                    output_archive.add_file(original_filename, img_path)
+            elif preserve_original:
+                shutil.copyfile(img_path, os.path.join(output_directory, original_filename))
+
+        if record is not None:
+            record.update(output=output_path, output_size=image.size, frames=writer.frames,
+                          seconds=time.perf_counter() - start)
+            log_summary_record(record)
+        return output_path
+
+    except Exception as e:
+        logger.error("Error processing sequence %s: %s", img_path, e)
         return None
 
 def load_images_and_process(input_directory, config, output_directory):
     """
     Load images from the input directory and process them using multiple threads with GPU optimization.
+    Archives and stdin ("-") as input, or an archive as output, are processed as a stream.
     """
-    logging.info("Loading images...")
-    images = load_images(input_directory)
+    if is_stream_source(input_directory) or is_archive(output_directory):
+        sources = iter_stream_inputs(input_directory) if is_stream_source(input_directory) else list_images(input_directory)
+        process_stream(sources, config, output_directory)
+        return
+
+    logger.info("Loading images...")
+    images = list_images(input_directory)
     
     if not images:
-        logging.error("No images found in the input directory.")
+        logger.error("No images found in the input directory.")
         return
 
-    max_workers = config["batch_processing"]["max_workers"]
+    max_workers, _ = configure_threads(config)
+    configure_encode_pool(config, max_workers)
+    encode_stats.reset()
     chunk_size = config["batch_processing"]["chunk_size"]
 
-    # Process images in batches for GPU optimization
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        futures = []
-        for i in range(0, len(images), chunk_size):
-            batch = images[i:i + chunk_size]
-            future = executor.submit(process_batch, batch, config, output_directory)
-            futures.append(future)
-
-        completed = 0
-        total = len(images)
-        
-        for future in tqdm(as_completed(futures), total=len(futures), desc="Processing batches"):
-            result = future.result()
-            completed += len(result) if result else 0
-            if result:
-                logging.info(f"Progress: {completed}/{total} images processed")
+    sharding = config["sharding"]
+    distributed = bool(sharding["shard"] or sharding["lease_dir"])
+    node_id = sharding["node_id"] or default_node_id()
+    if sharding["shard"]:
+        index, count = parse_shard(sharding["shard"])
+        images = select_shard(images, input_directory, index, count)
+        logger.info("Shard %s/%s: %s images", index, count, len(images))
+
+    os.makedirs(output_directory, exist_ok=True)
+    journal = None
+    if config["batch_processing"]["journal"]:
+        journal_filename = JOURNAL_FILENAME
+        if distributed:
+            # SQLite locking is unreliable over network filesystems, so each node keeps its own journal
+            root, extension = os.path.splitext(JOURNAL_FILENAME)
+            journal_filename = f"{root}.{node_id}{extension}"
+        journal_path = config["batch_processing"]["journal_path"] or os.path.join(output_directory, journal_filename)
+        journal = ProgressJournal(journal_path)
+        if config["batch_processing"]["resume"]:
+            pending = journal.pending(images)
+            logger.info("Resuming: skipping %s already processed images", len(images) - len(pending))
+            images = pending
+
+    # Process one representative per group of visually identical inputs
+    duplicates = {}
+    if config["deduplication"]["enabled"]:
+        dedup_settings = config["deduplication"]
+        duplicates = find_duplicate_groups(
+            images,
+            method=dedup_settings["method"],
+            hash_size=dedup_settings["hash_size"],
+            max_distance=dedup_settings["max_distance"]
+        )
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(format_dedup_report(dedup_report(duplicates, config)))
+        images = list(duplicates)
+
+    leases = None
+    if sharding["lease_dir"]:
+        leases = LeaseManager(sharding["lease_dir"], input_directory, node_id, sharding["lease_ttl"])
+
+    notifier = create_dispatcher(config)
+    try:
+        memory_budget_mb = config["batch_processing"]["memory_budget_mb"]
+        memory_budget = memory_budget_mb * 1024**2 if memory_budget_mb else None
+        if config["batch_processing"]["scheduling"] == "static":
+            # Fixed chunks in directory order, admitted against the memory budget by their largest image
+            chunks = plan_chunks(images, config, chunk_size, memory_budget)
+            completed = 0
+            total = len(images)
+
+            with MemoryMonitor() as monitor:
+                results = dispatch(
+                    chunks,
+                    lambda job: process_batch(list(job.path), config, output_directory, journal, duplicates, notifier, leases),
+                    max_workers,
+                    memory_budget=memory_budget,
+                    monitor=monitor
+                )
+                for _, result in tqdm(results, total=len(chunks), desc="Processing batches"):
+                    completed += len(result) if result else 0
+                    if result:
+                        logger.info("Progress: %s/%s images processed", completed, total)
+            logger.info("Memory usage: %s", monitor.summary())
+        else:
+            # Most expensive images first, handed out one by one as workers free up
+            jobs = plan_jobs(images, config)
+            with MemoryMonitor() as monitor:
+                results = dispatch(
+                    jobs,
+                    lambda job: process_batch([job.path], config, output_directory, journal, duplicates, notifier, leases),
+                    max_workers,
+                    memory_budget=memory_budget,
+                    monitor=monitor
+                )
+                for _ in tqdm(results, total=len(jobs), desc="Processing images"):
+                    pass
+            logger.info("Memory usage: %s", monitor.summary())
+    finally:
+        notifier.close()
+        if leases:
+            leases.close()
+        if journal:
+            journal.close()
+    logger.info("Encoding: %s", encode_stats.summary())
+
+def process_stream(sources, config, output_directory):
+    """
+    Process inputs as an iterator yields them (archive members, stdin records or paths),
+    with a bounded number in flight so memory stays flat however long the stream is.
+    Outputs go to output_directory, or into it as members when it names an archive.
+    """
+    if (config["deduplication"]["enabled"] or config["batch_processing"]["resume"]
+            or config["sharding"]["shard"] or config["sharding"]["lease_dir"]):
+        logger.warning("Deduplication, resume and sharding need a directory of inputs; ignoring them for this stream")
+    max_workers, _ = configure_threads(config)
+    configure_encode_pool(config, max_workers)
+    encode_stats.reset()
+
+    output_archive = None
+    if is_archive(output_directory):
+        if config["output_settings"]["frame_store"]:
+            logger.warning("Frame-store output cannot go into an archive; encoding outputs instead")
+        output_archive = ArchiveWriter(output_directory)
+    else:
+        os.makedirs(output_directory, exist_ok=True)
 
-def process_batch(batch, config, output_directory):
+    notifier = create_dispatcher(config)
+    completed = False
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            in_flight = set()
+            for source in tqdm(sources, desc="Processing stream"):
+                # Decoded inputs wait in memory, so only read ahead of the workers by a little
+                if len(in_flight) >= 2 * max_workers:
+                    _, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                future = executor.submit(process_image, source, config, output_directory, output_archive)
+                future.add_done_callback(lambda done: notifier.record(done.result() is not None))
+                in_flight.add(future)
+        completed = True
+    finally:
+        notifier.close()
+        if output_archive:
+            # Only a stream read to the end is published; a partial archive is deleted
+            output_archive.close(commit=completed)
+    logger.info("Encoding: %s", encode_stats.summary())
+
+def process_batch(batch, config, output_directory, journal=None, duplicates=None, notifier=None, leases=None):
     """
-    Process a batch of images with GPU optimization.
+    Process a batch of images with GPU optimization, recording each outcome in the journal
+    and counting it for the notification summaries.
+    Duplicates of an image (as grouped by deduplication) reuse its output.
+    With leases, images another node has claimed or finished are skipped.
     """
     try:
         results = []
         for img_path in batch:
-            result = process_image(img_path, config, output_directory)
+            if leases and not leases.claim(img_path):
+                continue
+            result = None
+            try:
+                result = process_image(img_path, config, output_directory)
+            finally:
+                if leases:
+                    leases.release(img_path, result is not None)
+            if journal:
+                journal.record(img_path, "done" if result else "failed", result)
+            if notifier:
+                notifier.record(result is not None)
             results.append(result)
+            group_duplicates = (duplicates or {}).get(img_path)
+            if group_duplicates and result:
+                outputs = write_duplicate_outputs(result, group_duplicates, config, output_directory)
+                for duplicate_path, output_path in outputs.items():
+                    if journal:
+                        journal.record(duplicate_path, "done" if output_path else "failed", output_path)
+                    if notifier:
+                        notifier.record(output_path is not None)
+            elif group_duplicates:
+                # No output to share, so the duplicates get processed on their own
+                results.extend(process_batch(group_duplicates, config, output_directory, journal,
+                                             notifier=notifier, leases=leases))
         return results
     except Exception as e:
-        logging.error(f"Error processing batch: {e}")
+        logger.error("Error processing batch: %s", e)
         return []
 
-def main():
+def main(config=None):
     """
     Main function to load the configuration and process images.
+    A configuration already loaded (e.g. with CLI overrides) can be passed in.
     """
-    config_path = 'config.json'
-    config = load_or_create_configuration(config_path)
+    if config is None:
+        config_path = 'config.json'
+        config = load_or_create_configuration(config_path)
 
     input_directory = config["input_directory"]
     output_directory = config["output_directory"]
@@ -292,4 +680,8 @@ def main():
     load_images_and_process(input_directory, config, output_directory)
 
 if __name__ == "__main__":
+    # Imported here: run imports this module for its own entry point
+    from imageUpscaler.run import setup_logging
+
+    setup_logging()
     main()
@@ -1,8 +1,140 @@
+import json
+import logging
+import os
+import sys
+import threading
+import urllib.request
 from plyer import notification
 
+logger = logging.getLogger(__name__)
+
 def send_notification(title, message):
     notification.notify(
         title=title,
         message=message,
         timeout=5
     )
+
+def is_headless():
+    """True when there is no desktop session to show notifications in."""
+    if sys.platform.startswith(("win", "darwin")):
+        return False
+    return not (os.environ.get("DISPLAY") or os.environ.get("WAYLAND_DISPLAY"))
+
+# Sinks receive a summary dict: title, message, processed, failed, final.
+
+def desktop_sink(summary):
+    # Looked up at call time so send_notification can be patched
+    send_notification(summary["title"], summary["message"])
+
+def log_sink(summary):
+    logger.info("%s: %s", summary["title"], summary["message"])
+
+def webhook_sink(url, timeout=5.0):
+    """Sink that POSTs each summary as JSON to url (e.g. a local endpoint)."""
+    def send(summary):
+        request = urllib.request.Request(
+            url,
+            data=json.dumps(summary).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+            method="POST"
+        )
+        with urllib.request.urlopen(request, timeout=timeout):
+            pass
+    return send
+
+def create_sinks(settings):
+    """Build the sinks named in the notifications settings.
+
+    The desktop sink is dropped on headless machines, where it could only fail.
+    """
+    sinks = []
+    for name in settings["sinks"]:
+        if name == "desktop":
+            if is_headless():
+                logger.debug("No display available, desktop notifications disabled")
+                continue
+            sinks.append(desktop_sink)
+        elif name == "log":
+            sinks.append(log_sink)
+        elif name == "webhook":
+            if not settings["webhook_url"]:
+                raise ValueError("The webhook notification sink needs notifications.webhook_url.")
+            sinks.append(webhook_sink(settings["webhook_url"]))
+        else:
+            raise ValueError(f"Unknown notification sink: {name}")
+    return sinks
+
+class NotificationDispatcher:
+    """Coalesces per-image outcomes into periodic summaries sent from a background thread.
+
+    record() only bumps counters, so workers never wait on D-Bus or the
+    network. Every interval seconds, if anything happened since the last
+    summary, the totals ("1,240 processed, 3 failed") go to every sink; a
+    final summary is sent on close(). A sink that raises is logged and
+    skipped, and with no sinks the dispatcher does nothing at all.
+    """
+
+    def __init__(self, sinks, interval=30.0, title="Image Processing"):
+        self.sinks = list(sinks)
+        self.interval = interval
+        self.title = title
+        self.processed = 0
+        self.failed = 0
+        self._reported = (0, 0)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        if self.sinks:
+            self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def record(self, success):
+        """Count one processed (or failed) image."""
+        with self._lock:
+            if success:
+                self.processed += 1
+            else:
+                self.failed += 1
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._send(final=False)
+
+    def _send(self, final):
+        with self._lock:
+            counts = (self.processed, self.failed)
+        if counts == self._reported and not (final and any(counts)):
+            return
+        self._reported = counts
+        summary = {
+            "title": self.title,
+            "message": f"{'Finished: ' if final else ''}{counts[0]:,} processed, {counts[1]:,} failed",
+            "processed": counts[0],
+            "failed": counts[1],
+            "final": final
+        }
+        for sink in self.sinks:
+            try:
+                sink(summary)
+            except Exception as e:
+                logger.warning("Notification sink failed: %s", e)
+
+    def close(self):
+        """Stop the background thread and send the final summary."""
+        if not self.sinks or self._stop.is_set():
+            return
+        self._stop.set()
+        self._thread.join()
+        self._send(final=True)
+
+def create_dispatcher(config):
+    """Create a NotificationDispatcher from the notifications settings."""
+    settings = config["notifications"]
+    sinks = create_sinks(settings) if settings["enabled"] else []
+    return NotificationDispatcher(sinks, settings["interval"])
@@ -1,37 +1,66 @@
 import argparse
+import atexit
 import json
+import queue
 from pathlib import Path
 from imageUpscaler.banner import display_banner, about
 from imageUpscaler.main import main
 from imageUpscaler.image_analysis import get_image_analysis
-from imageUpscaler.config import load_configuration
+from imageUpscaler.config import ConfigError, load_configuration
 import logging
+import logging.handlers
 from datetime import datetime
 from imageUpscaler import __version__, __author__, __email__
 
+logger = logging.getLogger(__name__)
+
+class _LocalQueueHandler(logging.handlers.QueueHandler):
+    """Queue records as they are; the listener in this process formats them."""
+
+    def prepare(self, record):
+        return record
+
+_listener = None
+
 def setup_logging():
-    """Setup logging configuration."""
+    """Setup logging configuration.
+
+    Workers only put records on a queue; a listener thread formats them and
+    does the file and console I/O, so logging never blocks image processing.
+    Only the first call configures anything; later calls return its listener.
+    """
+    global _listener
+    if _listener is not None:
+        return _listener
     log_dir = Path('logs')
     log_dir.mkdir(exist_ok=True)
     
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
     log_file = log_dir / f'imageUpscaler_{timestamp}.log'
     
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler(log_file),
-            logging.StreamHandler()
-        ]
-    )
+    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    handlers = [logging.FileHandler(log_file), logging.StreamHandler()]
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    records = queue.SimpleQueue()
+    _listener = logging.handlers.QueueListener(records, *handlers, respect_handler_level=True)
+    logging.basicConfig(level=logging.INFO, handlers=[_LocalQueueHandler(records)])
+    _listener.start()
+    atexit.register(_listener.stop)
+    return _listener
 
 def analyze_image(args):
     """Analyze an image and save the results."""
     try:
         from PIL import Image
-        img = Image.open(args.image)
-        analysis = get_image_analysis(img)
+        from imageUpscaler.frame_store import is_frame_file, read_frame
+        # Frames are handed to the analyzer as memory-mapped arrays
+        img = read_frame(args.image) if is_frame_file(args.image) else Image.open(args.image)
+        analysis = get_image_analysis(img, noise_method=args.noise_method,
+                                      texture_levels=args.texture_levels,
+                                      texture_size=args.texture_size,
+                                      texture_patches=args.texture_patches)
         
         if analysis:
             output_file = args.output or f"{Path(args.image).stem}_analysis.json"
@@ -41,9 +70,32 @@ def analyze_image(args):
         else:
             print("Analysis failed")
     except Exception as e:
-        logging.error(f"Error during analysis: {e}")
+        logger.error("Error during analysis: %s", e)
         print(f"Error: {e}")
 
+def run_benchmark(args):
+    """Run a benchmark suite and print the timings."""
+    from imageUpscaler import benchmarks
+
+    if args.suite == 'inference':
+        results = benchmarks.benchmark_cpu_inference(size=args.size, repeats=args.repeats)
+        print(benchmarks.format_results(results))
+    elif args.suite == 'upscale':
+        results = benchmarks.benchmark_upscale(size=args.size, factor=args.factor, repeats=args.repeats)
+        print(benchmarks.format_results(results))
+    elif args.suite == 'encode':
+        results = benchmarks.benchmark_encoders(size=args.size, repeats=args.repeats)
+        print(benchmarks.format_results(results))
+    elif args.suite == 'transport':
+        results = benchmarks.benchmark_transport(size=args.size, images=args.images, repeats=args.repeats)
+        print(benchmarks.format_results(results))
+    elif args.suite == 'threads':
+        results = benchmarks.benchmark_thread_splits(images=args.images, size=args.size)
+        for variant, best in benchmarks.best_splits(results).items():
+            variant_results = [result for result in results if result["variant"] == variant]
+            print(benchmarks.format_results(variant_results))
+            print(f"Best split for {variant}: {best['workers']} workers x {best['threads']} threads\n")
+
 def show_version():
     """Show version information and GPU status."""
     from imageUpscaler.image_processing import get_gpu_memory_info
@@ -71,33 +123,94 @@ def main_cli():
     # Process command
     process_parser = subparsers.add_parser('process', help='Process images')
     process_parser.add_argument('--config', type=str, help='Path to configuration file')
-    process_parser.add_argument('--input', type=str, help='Input directory')
-    process_parser.add_argument('--output', type=str, help='Output directory')
+    process_parser.add_argument('--input', type=str,
+                                help='Input directory, archive (.tar, .tar.gz, .zip) or - for length-prefixed images on stdin')
+    process_parser.add_argument('--output', type=str, help='Output directory or archive (.tar, .tar.gz, .zip)')
+    process_parser.add_argument('--resume', action='store_true', help='Skip images finished by a previous run')
+    process_parser.add_argument('--shard', type=str, metavar='INDEX/COUNT',
+                                help='Process only this node\'s share of the inputs (index from 0)')
+    process_parser.add_argument('--lease-dir', type=str,
+                                help='Shared directory of lease files for claiming inputs across nodes')
+
+    # Watch command
+    watch_parser = subparsers.add_parser('watch', help='Process images as they arrive in a directory')
+    watch_parser.add_argument('--config', type=str, help='Path to configuration file')
+    watch_parser.add_argument('--input', type=str, help='Directory to watch')
+    watch_parser.add_argument('--output', type=str, help='Output directory')
+    watch_parser.add_argument('--backend', choices=['auto', 'inotify', 'polling'], help='File event backend')
 
     # Analyze command
     analyze_parser = subparsers.add_parser('analyze', help='Analyze an image')
     analyze_parser.add_argument('image', type=str, help='Path to image file')
     analyze_parser.add_argument('--output', type=str, help='Output JSON file for analysis results')
+    analyze_parser.add_argument('--noise-method', choices=['fast', 'nlm'], default='fast',
+                                help='Noise estimator: fast sigma estimate or accurate NLM residual')
+    analyze_parser.add_argument('--texture-levels', type=int, choices=[16, 32, 64, 128, 256], default=64,
+                                help='Grey levels for GLCM texture features')
+    analyze_parser.add_argument('--texture-size', type=int, default=0,
+                                help='Downscale to this long edge before texture features, 0 for full size')
+    analyze_parser.add_argument('--texture-patches', type=int, default=256,
+                                help='Random patches to count for texture features, 0 for the whole image')
+
+    # Frames command
+    frames_parser = subparsers.add_parser('frames', help='Store images as raw frames for multi-pass runs')
+    frames_parser.add_argument('input', type=str, help='Input directory')
+    frames_parser.add_argument('output', type=str, help='Output directory for frame files')
+
+    # Benchmark command
+    benchmark_parser = subparsers.add_parser('benchmark', help='Benchmark processing backends')
+    benchmark_parser.add_argument('suite', choices=['inference', 'threads', 'upscale', 'encode', 'transport'], help='What to benchmark')
+    benchmark_parser.add_argument('--images', type=int, default=8, help='Images per batch for the threads and transport suites')
+    benchmark_parser.add_argument('--size', type=int, default=512, help='Edge length of the test image')
+    benchmark_parser.add_argument('--factor', type=float, default=2.0, help='Scale factor for the upscale suite')
+    benchmark_parser.add_argument('--repeats', type=int, default=5, help='Timed runs per configuration')
 
     # Version command
     subparsers.add_parser('version', help='Show version information')
 
     args = parser.parse_args()
+    # Only commands that process images get a log file; the rest just print
+    if args.command in ('process', 'watch', 'benchmark', None):
+        setup_logging()
 
     if args.command == 'process':
-        if args.config:
-            config = load_configuration(args.config)
-        else:
-            config = load_configuration('config.json')
-        
+        # Command-line values are the last configuration layer, validated with the rest
+        overrides = {}
         if args.input:
-            config['input_directory'] = args.input
+            overrides['input_directory'] = args.input
         if args.output:
-            config['output_directory'] = args.output
-        
-        main()
+            overrides['output_directory'] = args.output
+        if args.resume:
+            overrides['batch_processing'] = {'resume': True}
+        sharding = {key: value for key, value in (('shard', args.shard), ('lease_dir', args.lease_dir)) if value}
+        if sharding:
+            overrides['sharding'] = sharding
+        try:
+            config = load_configuration(args.config or 'config.json', overrides)
+        except ConfigError as e:
+            parser.error(str(e))
+
+        main(config)
+    elif args.command == 'watch':
+        from imageUpscaler.watcher import watch_and_process
+        try:
+            config = load_configuration(args.config or 'config.json',
+                                        {'watch': {'backend': args.backend}} if args.backend else None)
+        except ConfigError as e:
+            parser.error(str(e))
+        try:
+            watch_and_process(args.input or config['input_directory'], config,
+                              args.output or config['output_directory'])
+        except KeyboardInterrupt:
+            print("Stopped watching.")
     elif args.command == 'analyze':
         analyze_image(args)
+    elif args.command == 'frames':
+        from imageUpscaler.file_utils import convert_to_frames
+        written = convert_to_frames(args.input, args.output)
+        print(f"Stored {len(written)} frames in {args.output}")
+    elif args.command == 'benchmark':
+        run_benchmark(args)
     elif args.command == 'version':
         show_version()
     else:
@@ -106,5 +219,4 @@ def main_cli():
         main()
 
 if __name__ == "__main__":
-    setup_logging()
     main_cli()
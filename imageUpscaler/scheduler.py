@@ -0,0 +1,263 @@
+import logging
+import os
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import numpy as np
+from PIL import Image
+from imageUpscaler.frame_store import is_frame_file, read_frame_header
+from imageUpscaler.sequences import is_sequence, is_video, read_sequence_header
+
+logger = logging.getLogger(__name__)
+
+Job = namedtuple("Job", ["path", "width", "height", "cost", "peak_bytes"])
+
+# Rough relative cost per pixel of each stage. Stages before upscaling are
+# charged per input pixel, the rest per output pixel. Only the ratios matter:
+# they order the queue, they do not predict seconds.
+INPUT_STAGE_COSTS = {
+    "decode": 1.0,
+    "noise_reduction": 40.0,
+}
+OUTPUT_STAGE_COSTS = {
+    "upscale": 1.0,
+    "ai_enhancement": 20.0,
+    "hdr_processing": 0.5,
+    "smart_sharpen": 3.0,
+    "auto_color_correction": 1.0,
+    "detail_enhancement": 8.0,
+    "face_detection": 1.0,  # Downscale only; detection itself runs at a capped size
+    "background_removal": 30.0,
+    "encode": 2.0,
+}
+
+# Approximate transient bytes per pixel each stage allocates on top of the
+# image itself (float copies, model activations, detector pyramids...).
+# Stages run one after another, so only the largest one adds to the peak.
+INPUT_STAGE_BYTES = {
+    "noise_reduction": 12,
+}
+OUTPUT_STAGE_BYTES = {
+    "upscale": 4,
+    "ai_enhancement": 280,  # float32 input/output tensors plus 64-channel activations
+    "hdr_processing": 4,  # one uint8 copy, remapped in place through a lookup table
+    "smart_sharpen": 48,
+    "auto_color_correction": 12,
+    "detail_enhancement": 24,
+    "face_detection": 2,
+    "background_removal": 24,
+    "encode": 4,
+}
+# Held for the whole job: decoded input plus its preserved copy (RGBA worst
+# case), and the working output image with its NumPy conversion.
+RESIDENT_INPUT_BYTES = 8
+RESIDENT_OUTPUT_BYTES = 8
+
+def read_dimensions(img_path):
+    """Read (width, height) from the file header without decoding pixels."""
+    if is_frame_file(img_path):
+        height, width, _ = read_frame_header(img_path)
+        return width, height
+    if is_video(img_path):
+        return read_sequence_header(img_path)[:2]
+    with Image.open(img_path) as img:
+        return img.size
+
+def read_frame_count(img_path, config):
+    """Frames the pipeline runs for an input: every frame of a clip, else one."""
+    if config["sequence_processing"]["enabled"] and is_sequence(img_path):
+        return read_sequence_header(img_path)[2]
+    return 1
+
+def enabled_stages(config):
+    """Return the names of the cost-model stages the configuration enables."""
+    noise = config["noise_reduction"]
+    advanced = config["advanced_features"]
+    stages = {"decode", "encode"}
+    flags = {
+        "noise_reduction": noise["enabled"],
+        "upscale": config["upscale_factor"] != 1.0,
+        "ai_enhancement": advanced["ai_enhancement"],
+        "hdr_processing": advanced["hdr_processing"],
+        "smart_sharpen": advanced["smart_sharpen"]["enabled"],
+        "auto_color_correction": advanced["auto_color_correction"],
+        "detail_enhancement": advanced["detail_enhancement"]["enabled"],
+        "face_detection": config["face_detection"],
+        "background_removal": config["background_removal"],
+    }
+    stages.update(stage for stage, enabled in flags.items() if enabled)
+    return stages
+
+def estimate_cost(width, height, config, stages=None):
+    """Estimate the relative cost of running the configured pipeline on one image."""
+    stages = stages or enabled_stages(config)
+    input_pixels = width * height
+    output_pixels = input_pixels * config["upscale_factor"] ** 2
+    return (input_pixels * sum(cost for stage, cost in INPUT_STAGE_COSTS.items() if stage in stages)
+            + output_pixels * sum(cost for stage, cost in OUTPUT_STAGE_COSTS.items() if stage in stages))
+
+def estimate_peak_bytes(width, height, config, stages=None):
+    """Estimate the peak memory one image needs in the configured pipeline."""
+    stages = stages or enabled_stages(config)
+    input_pixels = width * height
+    output_pixels = int(input_pixels * config["upscale_factor"] ** 2)
+    transient = [input_pixels * nbytes for stage, nbytes in INPUT_STAGE_BYTES.items() if stage in stages]
+    transient += [output_pixels * nbytes for stage, nbytes in OUTPUT_STAGE_BYTES.items() if stage in stages]
+    return (input_pixels * RESIDENT_INPUT_BYTES + output_pixels * RESIDENT_OUTPUT_BYTES
+            + max(transient, default=0))
+
+def plan_jobs(img_paths, config):
+    """Build jobs from header dimensions, ordered longest (most expensive) first."""
+    stages = enabled_stages(config)
+    jobs = []
+    for img_path in img_paths:
+        try:
+            width, height = read_dimensions(img_path)
+            # Clips are streamed, so their memory is per frame but their cost is per clip
+            jobs.append(Job(img_path, width, height,
+                            estimate_cost(width, height, config, stages) * read_frame_count(img_path, config),
+                            estimate_peak_bytes(width, height, config, stages)))
+        except (IOError, OSError, ValueError) as e:
+            # Unreadable headers go last; process_image will report the error
+            logger.warning("Could not read dimensions of %s: %s", img_path, e)
+            jobs.append(Job(img_path, 0, 0, 0.0, 0))
+    jobs.sort(key=lambda job: job.cost, reverse=True)
+    return jobs
+
+def plan_chunks(img_paths, config, chunk_size, memory_budget=None):
+    """Split inputs into fixed chunks in their given order, as jobs whose path is the chunk.
+
+    A chunk's images run one after another, so its peak is that of its
+    largest image. Headers are only read when a memory_budget needs the
+    estimates; otherwise every chunk's peak is 0.
+    """
+    peaks = {}
+    if memory_budget:
+        peaks = {job.path: job.peak_bytes for job in plan_jobs(img_paths, config)}
+    chunks = []
+    for i in range(0, len(img_paths), chunk_size):
+        chunk = tuple(img_paths[i:i + chunk_size])
+        chunks.append(Job(chunk, 0, 0, 0.0, max(peaks.get(img_path, 0) for img_path in chunk)))
+    return chunks
+
+def read_rss():
+    """Return the resident set size of this process in bytes, or None if unknown."""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+class MemoryMonitor:
+    """Samples process RSS in the background to report real peaks per job.
+
+    Each job's peak is the highest RSS seen while it ran, minus the RSS when
+    it started. With several jobs in flight their allocations overlap, so
+    the figure is an upper bound; with one worker it is exact to the sample
+    interval.
+    """
+
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self.peak_rss = read_rss() or 0
+        self.records = []
+        self._windows = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+
+    def __enter__(self):
+        if read_rss() is not None:
+            self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self._update(read_rss() or 0)
+
+    def _update(self, rss):
+        with self._lock:
+            self.peak_rss = max(self.peak_rss, rss)
+            for window in self._windows.values():
+                window[1] = max(window[1], rss)
+
+    def begin(self, key):
+        rss = read_rss() or 0
+        with self._lock:
+            self._windows[key] = [rss, rss]
+
+    def end(self, key, estimated_bytes):
+        """Close a job's window and record its observed RSS growth next to the estimate."""
+        self._update(read_rss() or 0)
+        with self._lock:
+            start, peak = self._windows.pop(key)
+            self.records.append((key, estimated_bytes, peak - start))
+        logger.debug("Memory for %s: estimated %.1fMB, observed %.1fMB",
+                     key, estimated_bytes / 1024**2, (peak - start) / 1024**2)
+        return peak - start
+
+    def summary(self):
+        """Summarise observed peaks against the estimates, for tuning the estimator."""
+        ratios = [observed / estimated for _, estimated, observed in self.records if estimated]
+        if not ratios:
+            return f"Peak RSS {self.peak_rss / 1024**2:.1f}MB"
+        return (f"Peak RSS {self.peak_rss / 1024**2:.1f}MB over {len(self.records)} jobs; "
+                f"observed/estimated peak ratio median {np.median(ratios):.2f}, max {max(ratios):.2f}")
+
+def dispatch(jobs, fn, max_workers, memory_budget=None, monitor=None):
+    """Run fn(job) over a thread pool in the given order and yield (job, result).
+
+    Jobs are handed out one at a time as workers free up, instead of in
+    fixed chunks, so with longest-first ordering the big images start early
+    and the small ones fill the gaps at the end.
+
+    With a memory_budget (bytes), a job is only admitted while the estimated
+    peaks of the running jobs plus its own fit the budget; otherwise the next
+    job that does fit is taken, and the rest stay queued. A job larger than
+    the whole budget runs alone. With a MemoryMonitor, the observed peak of
+    each job is logged next to its estimate.
+    """
+    queue = list(jobs)
+    in_use = 0
+
+    def run(job):
+        if monitor is None:
+            return fn(job)
+        monitor.begin(job.path)
+        try:
+            return fn(job)
+        finally:
+            monitor.end(job.path, job.peak_bytes)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        running = {}
+
+        def admit():
+            nonlocal in_use
+            while queue and len(running) < max_workers:
+                index = 0
+                if memory_budget:
+                    index = next((i for i, job in enumerate(queue)
+                                  if in_use + job.peak_bytes <= memory_budget), None)
+                    if index is None:
+                        if running:
+                            return
+                        index = 0
+                job = queue.pop(index)
+                in_use += job.peak_bytes if memory_budget else 0
+                running[executor.submit(run, job)] = job
+
+        admit()
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            finished = [(running.pop(future), future) for future in done]
+            for job, _ in finished:
+                in_use -= job.peak_bytes if memory_budget else 0
+            admit()
+            for job, future in finished:
+                yield job, future.result()
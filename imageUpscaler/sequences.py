@@ -0,0 +1,273 @@
+import os
+import queue
+import struct
+import threading
+import zlib
+from io import BytesIO
+from itertools import islice
+import cv2
+import numpy as np
+from PIL import Image, ImageSequence, GifImagePlugin
+
+# Inputs with more than one frame. Animated PNGs usually keep the .png
+# extension, so PNGs are checked for animation too.
+ANIMATION_EXTENSIONS = (".gif", ".apng", ".webp")
+VIDEO_EXTENSIONS = (".mp4", ".avi", ".mov", ".mkv", ".webm")
+SEQUENCE_EXTENSIONS = ANIMATION_EXTENSIONS + VIDEO_EXTENSIONS
+VIDEO_FOURCC = {".mp4": "mp4v", ".mov": "mp4v", ".mkv": "mp4v", ".avi": "MJPG", ".webm": "VP80"}
+
+DEFAULT_FRAME_DURATION = 100  # ms, for animations that do not say
+DEFAULT_FPS = 25.0
+
+def is_video(path):
+    return str(path).lower().endswith(VIDEO_EXTENSIONS)
+
+def is_animation(path):
+    """Return True for a GIF, APNG or WebP file with more than one frame (reads the header only)."""
+    if not str(path).lower().endswith(ANIMATION_EXTENSIONS + (".png",)):
+        return False
+    try:
+        with Image.open(path) as img:
+            return getattr(img, "is_animated", False)
+    except (IOError, OSError):
+        return False
+
+def is_sequence(path):
+    """Return True if the path is a video or an animation that should be processed frame by frame."""
+    return isinstance(path, str) and (is_video(path) or is_animation(path))
+
+def read_sequence_header(path):
+    """Return (width, height, frame count) without decoding any frames."""
+    if is_video(path):
+        capture = cv2.VideoCapture(path)
+        try:
+            if not capture.isOpened():
+                raise IOError(f"Cannot open video {path}")
+            return (int(capture.get(cv2.CAP_PROP_FRAME_WIDTH)), int(capture.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+                    max(1, int(capture.get(cv2.CAP_PROP_FRAME_COUNT))))
+        finally:
+            capture.release()
+    with Image.open(path) as img:
+        return img.size + (getattr(img, "n_frames", 1),)
+
+def read_loop_count(path):
+    """Loop count of an animation (0 = forever); videos do not loop."""
+    if is_video(path):
+        return 0
+    with Image.open(path) as img:
+        return img.info.get("loop", 0)
+
+def sequence_output_extension(path):
+    """Extension of the re-encoded clip: videos and GIFs keep theirs, other animations become APNG."""
+    extension = os.path.splitext(path)[1].lower()
+    if is_video(path) or extension == ".gif":
+        return extension
+    return ".png"
+
+def iter_frames(path):
+    """Decode one frame at a time, yielding (image, duration in ms).
+
+    Videos are read with OpenCV, animations with PIL. Every frame of a clip
+    gets the first frame's mode: RGBA if it has transparency, else RGB.
+    """
+    if is_video(path):
+        capture = cv2.VideoCapture(path)
+        if not capture.isOpened():
+            raise IOError(f"Cannot open video {path}")
+        duration = 1000.0 / (capture.get(cv2.CAP_PROP_FPS) or DEFAULT_FPS)
+        try:
+            while True:
+                ok, frame = capture.read()
+                if not ok:
+                    return
+                yield Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)), duration
+        finally:
+            capture.release()
+
+    with Image.open(path) as img:
+        mode = "RGBA" if img.has_transparency_data else "RGB"
+        for frame in ImageSequence.Iterator(img):
+            # convert() copies, so the frame survives the iterator seeking on
+            yield frame.convert(mode), frame.info.get("duration") or DEFAULT_FRAME_DURATION
+
+def prefetch(iterable, size):
+    """Iterate in a background thread, keeping at most size items ready ahead of the consumer."""
+    items = queue.Queue(maxsize=size)
+    stop = threading.Event()
+    finished = object()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put((item, None)):
+                    return
+            put((finished, None))
+        except Exception as e:
+            put((finished, e))
+        finally:
+            close = getattr(iterable, "close", None)
+            if close:
+                close()
+
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+    try:
+        while True:
+            item, error = items.get()
+            if item is finished:
+                if error:
+                    raise error
+                return
+            yield item
+    finally:
+        stop.set()
+        producer.join()
+
+def batched(iterable, size):
+    """Yield lists of up to size consecutive items."""
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+class GifWriter:
+    """Writes a GIF frame by frame, each frame with its own palette."""
+
+    def __init__(self, path, loop=0):
+        self._file = open(path, "wb")
+        self.loop = loop
+        self._started = False
+
+    def write(self, frame, duration):
+        if frame.mode == "RGBA":
+            # GIF has one transparent palette entry: quantize to 255 colours and keep 255 for it
+            paletted = frame.convert("RGB").quantize(255)
+            paletted.paste(255, mask=frame.getchannel("A").point(lambda a: 255 if a < 128 else 0))
+            params = {"transparency": 255, "disposal": 2}
+        else:
+            paletted = frame.convert("RGB").quantize(256)
+            params = {"disposal": 1}
+        if not self._started:
+            header, _ = GifImagePlugin.getheader(paletted, info={"loop": self.loop})
+            self._file.write(b"".join(header))
+            self._started = True
+        for chunk in GifImagePlugin.getdata(paletted, duration=round(duration), include_color_table=True, **params):
+            self._file.write(chunk)
+
+    def close(self):
+        self._file.write(b";")
+        self._file.close()
+
+def _png_chunks(data):
+    """Yield (type, body) for each chunk of an encoded PNG."""
+    offset = 8
+    while offset < len(data):
+        (length,) = struct.unpack(">I", data[offset:offset + 4])
+        yield data[offset + 4:offset + 8], data[offset + 8:offset + 8 + length]
+        offset += 12 + length
+
+def _png_chunk(chunk_type, body):
+    return struct.pack(">I", len(body)) + chunk_type + body + struct.pack(">I", zlib.crc32(chunk_type + body))
+
+class ApngWriter:
+    """Writes an animated PNG frame by frame.
+
+    Each frame is encoded by PIL as a standalone PNG whose image data is
+    copied into the animation, as the default image for the first frame
+    and as fdAT chunks after that. The frame count in acTL is only known at
+    the end, so it is patched in by close().
+    """
+
+    def __init__(self, path, loop=0):
+        self._file = open(path, "wb")
+        self.loop = loop
+        self.mode = None
+        self._frames = 0
+        self._sequence = 0
+        self._actl_offset = None
+
+    def write(self, frame, duration):
+        if self.mode is None:
+            self.mode = frame.mode if frame.mode in ("RGB", "RGBA") else "RGB"
+        if frame.mode != self.mode:
+            frame = frame.convert(self.mode)
+        encoded = BytesIO()
+        frame.save(encoded, format="PNG", compress_level=6)
+        chunks = list(_png_chunks(encoded.getvalue()))
+
+        if self._frames == 0:
+            self._file.write(encoded.getvalue()[:8])
+            self._file.write(_png_chunk(b"IHDR", dict(chunks)[b"IHDR"]))
+            self._actl_offset = self._file.tell()
+            self._file.write(_png_chunk(b"acTL", struct.pack(">II", 0, self.loop)))
+
+        self._file.write(_png_chunk(b"fcTL", struct.pack(
+            ">IIIIIHHBB", self._sequence, frame.width, frame.height, 0, 0,
+            min(round(duration), 65535), 1000, 0, 0)))  # dispose none, blend source
+        self._sequence += 1
+        for chunk_type, body in chunks:
+            if chunk_type != b"IDAT":
+                continue
+            if self._frames == 0:
+                self._file.write(_png_chunk(b"IDAT", body))
+            else:
+                self._file.write(_png_chunk(b"fdAT", struct.pack(">I", self._sequence) + body))
+                self._sequence += 1
+        self._frames += 1
+
+    def close(self):
+        self._file.write(_png_chunk(b"IEND", b""))
+        if self._actl_offset is not None:
+            self._file.seek(self._actl_offset)
+            self._file.write(_png_chunk(b"acTL", struct.pack(">II", self._frames, self.loop)))
+        self._file.close()
+
+class VideoWriter:
+    """Writes frames to a video with OpenCV, sized and timed from the first frame."""
+
+    def __init__(self, path, fourcc=None):
+        self.path = path
+        self.fourcc = fourcc or VIDEO_FOURCC.get(os.path.splitext(path)[1].lower(), "mp4v")
+        self._writer = None
+
+    def write(self, frame, duration):
+        if self._writer is None:
+            fps = 1000.0 / duration if duration else DEFAULT_FPS
+            self._writer = cv2.VideoWriter(self.path, cv2.VideoWriter_fourcc(*self.fourcc), fps, frame.size)
+            if not self._writer.isOpened():
+                raise IOError(f"Cannot write {self.path} with codec {self.fourcc}")
+        self._writer.write(cv2.cvtColor(np.asarray(frame.convert("RGB")), cv2.COLOR_RGB2BGR))
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.release()
+
+class SequenceWriter:
+    """Context manager choosing the writer for an output clip by its extension."""
+
+    def __init__(self, path, loop=0, fourcc=None):
+        if is_video(path):
+            self._writer = VideoWriter(path, fourcc)
+        elif path.lower().endswith(".gif"):
+            self._writer = GifWriter(path, loop)
+        else:
+            self._writer = ApngWriter(path, loop)
+        self.frames = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._writer.close()
+
+    def write(self, frame, duration):
+        self._writer.write(frame, duration)
+        self.frames += 1
@@ -0,0 +1,186 @@
+import hashlib
+import logging
+import os
+import socket
+import threading
+
+logger = logging.getLogger(__name__)
+
+def parse_shard(shard):
+    """Parse "INDEX/COUNT" (index from 0) into (index, count)."""
+    try:
+        index, count = (int(part) for part in str(shard).split("/"))
+    except ValueError:
+        raise ValueError(f"Shard must look like INDEX/COUNT, got {shard!r}")
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"Shard index must be in 0..{count - 1}, got {shard!r}")
+    return index, count
+
+def work_key(img_path, input_directory):
+    """Stable identifier of an input, independent of where each node mounts the share."""
+    relative = os.path.relpath(os.path.abspath(img_path), os.path.abspath(input_directory))
+    return hashlib.sha1(relative.replace(os.sep, "/").encode("utf-8")).hexdigest()
+
+def select_shard(img_paths, input_directory, index, count):
+    """Keep the inputs whose key hashes to this shard; every node computes the same split."""
+    return [img_path for img_path in img_paths
+            if int(work_key(img_path, input_directory), 16) % count == index]
+
+def default_node_id():
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+class LeaseManager:
+    """Claims inputs through lease files in a directory shared by all nodes.
+
+    A lease is created with O_CREAT | O_EXCL, which is atomic on local
+    filesystems and NFSv3+, so exactly one node wins each input. Held
+    leases are touched every ttl / 3 seconds; a lease not touched for ttl
+    seconds belongs to a dead node and is reclaimed by renaming it away
+    (only one node's rename can succeed). Ages are measured against the
+    file server's clock, so node clocks need not agree. Finished inputs
+    leave a done marker with the input's size and mtime, so no node
+    processes them again unless they change.
+    """
+
+    def __init__(self, state_directory, input_directory, node_id=None, ttl=300.0):
+        self.state_directory = state_directory
+        self.input_directory = input_directory
+        self.node_id = node_id or default_node_id()
+        self.ttl = ttl
+        self._held = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        os.makedirs(state_directory, exist_ok=True)
+        self._heartbeat = threading.Thread(target=self._renew, daemon=True)
+        self._heartbeat.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _paths(self, img_path):
+        key = work_key(img_path, self.input_directory)
+        base = os.path.join(self.state_directory, key)
+        return base + ".lease", base + ".done"
+
+    def _server_now(self):
+        """Current time on the shared filesystem, read back from a touched probe file."""
+        probe = os.path.join(self.state_directory, f".clock-{self.node_id}")
+        with open(probe, "a"):
+            pass
+        os.utime(probe)
+        return os.stat(probe).st_mtime
+
+    @staticmethod
+    def _signature(img_path):
+        stat = os.stat(img_path)
+        return f"{stat.st_size} {stat.st_mtime_ns}"
+
+    def _is_done(self, img_path, done_path):
+        try:
+            with open(done_path) as marker:
+                return marker.read().strip() == self._signature(img_path)
+        except OSError:
+            return False
+
+    def claim(self, img_path):
+        """Try to take img_path; True if this node should process it."""
+        lease_path, done_path = self._paths(img_path)
+        if self._is_done(img_path, done_path):
+            return False
+        for _ in range(2):
+            try:
+                fd = os.open(lease_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                if not self._reclaim_if_stale(lease_path):
+                    return False
+                continue
+            with os.fdopen(fd, "w") as lease:
+                lease.write(f"{self.node_id}\n")
+            # The previous holder may have finished and released between the check above and the create
+            if self._is_done(img_path, done_path):
+                os.remove(lease_path)
+                return False
+            with self._lock:
+                self._held.add(lease_path)
+            return True
+        return False
+
+    def _reclaim_if_stale(self, lease_path):
+        try:
+            age = self._server_now() - os.stat(lease_path).st_mtime
+        except FileNotFoundError:
+            return True  # Released in the meantime
+        if age < self.ttl:
+            return False
+        stale_path = f"{lease_path}.stale-{self.node_id}"
+        try:
+            os.rename(lease_path, stale_path)
+        except FileNotFoundError:
+            return False  # Another node reclaimed it first
+        if self._server_now() - os.stat(stale_path).st_mtime < self.ttl:
+            # Another node reclaimed and re-leased it between our check and rename: put it back
+            try:
+                os.link(stale_path, lease_path)
+            except FileExistsError:
+                pass
+            os.remove(stale_path)
+            return False
+        os.remove(stale_path)
+        logger.info("Reclaimed stale lease %s (%.0fs old)", os.path.basename(lease_path), age)
+        return True
+
+    def _owns(self, lease_path):
+        """True if the lease file still names this node; another node may have reclaimed it."""
+        try:
+            with open(lease_path) as lease:
+                return lease.read().strip() == self.node_id
+        except OSError:
+            return False
+
+    def release(self, img_path, done):
+        """Give up a lease; a successful input gets a done marker so no node redoes it."""
+        lease_path, done_path = self._paths(img_path)
+        with self._lock:
+            self._held.discard(lease_path)
+        if done:
+            tmp_path = f"{done_path}.{self.node_id}"
+            try:
+                signature = self._signature(img_path)
+                with open(tmp_path, "w") as marker:
+                    marker.write(signature)
+                os.replace(tmp_path, done_path)
+            except OSError as e:
+                logger.warning("Could not mark %s done: %s", img_path, e)
+        if not self._owns(lease_path):
+            logger.warning("Lease %s was taken over by another node; leaving it", os.path.basename(lease_path))
+            return
+        try:
+            os.remove(lease_path)
+        except FileNotFoundError:
+            pass
+
+    def _renew(self):
+        while not self._stop.wait(self.ttl / 3):
+            with self._lock:
+                held = list(self._held)
+            for lease_path in held:
+                if not self._owns(lease_path):
+                    logger.warning("Lost lease %s to another node", os.path.basename(lease_path))
+                    with self._lock:
+                        self._held.discard(lease_path)
+                    continue
+                try:
+                    os.utime(lease_path)
+                except OSError as e:
+                    logger.warning("Could not renew lease %s: %s", lease_path, e)
+
+    def close(self):
+        self._stop.set()
+        self._heartbeat.join()
+        try:
+            os.remove(os.path.join(self.state_directory, f".clock-{self.node_id}"))
+        except OSError:
+            pass
@@ -0,0 +1,171 @@
+import multiprocessing
+from collections import deque, namedtuple
+from multiprocessing import shared_memory
+import numpy as np
+
+# What crosses a process boundary instead of the pixels: which buffer holds
+# the frame and how to view it.
+FrameRef = namedtuple("FrameRef", ["slot", "shape", "dtype"])
+
+def frame_bytes(shape, dtype=np.uint8):
+    """Bytes needed to hold an array of the given shape and dtype."""
+    return int(np.prod(shape)) * np.dtype(dtype).itemsize
+
+class SharedFramePool:
+    """A fixed set of reusable shared-memory buffers for passing frames between processes.
+
+    The buffers are allocated once, up front, by the creating process and
+    handed out through a free-slot table shared with every worker, so frames
+    are never pickled: a process writes into a slot, sends the small FrameRef,
+    and the receiver views the same memory. Slots must be released once the
+    frame is no longer needed; acquire() blocks while all of them are in use,
+    which also bounds how far a producer can run ahead.
+
+    Pass the pool to worker processes when starting them (Process args or
+    Pool initargs); workers attach to the buffers on first use.
+    """
+
+    def __init__(self, slots, slot_bytes, context=None):
+        context = context or multiprocessing.get_context()
+        self.slot_bytes = slot_bytes
+        self._blocks = [shared_memory.SharedMemory(create=True, size=slot_bytes) for _ in range(slots)]
+        self._names = [block.name for block in self._blocks]
+        # Slot states live in shared memory and change under the condition's lock, so a
+        # release is visible to every process as soon as it returns
+        self._in_use = context.Array("b", slots, lock=False)
+        self._changed = context.Condition()
+        self._owner = True
+
+    def __getstate__(self):
+        return {"slot_bytes": self.slot_bytes, "names": self._names,
+                "in_use": self._in_use, "changed": self._changed}
+
+    def __setstate__(self, state):
+        self.slot_bytes = state["slot_bytes"]
+        self._names = state["names"]
+        self._in_use = state["in_use"]
+        self._changed = state["changed"]
+        self._blocks = [None] * len(self._names)
+        self._owner = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @property
+    def slots(self):
+        return len(self._names)
+
+    def _block(self, slot):
+        if self._blocks[slot] is None:
+            self._blocks[slot] = shared_memory.SharedMemory(name=self._names[slot])
+        return self._blocks[slot]
+
+    def acquire(self, shape, dtype=np.uint8, timeout=None):
+        """Take a free slot for a frame of this shape; return (ref, writable array view)."""
+        if frame_bytes(shape, dtype) > self.slot_bytes:
+            raise ValueError(f"Frame of shape {tuple(shape)} does not fit in {self.slot_bytes} byte slots.")
+        with self._changed:
+            if not self._changed.wait_for(lambda: 0 in self._in_use[:], timeout):
+                raise TimeoutError("No free frame slot became available.")
+            slot = self._in_use[:].index(0)
+            self._in_use[slot] = 1
+        ref = FrameRef(slot, tuple(shape), np.dtype(dtype).str)
+        return ref, self.view(ref)
+
+    def put(self, array, timeout=None):
+        """Copy an array into a free slot and return its ref."""
+        array = np.asarray(array)
+        ref, view = self.acquire(array.shape, array.dtype, timeout)
+        np.copyto(view, array)
+        return ref
+
+    def view(self, ref):
+        """Array on the slot's memory, without copying. Valid until the slot is released."""
+        return np.ndarray(ref.shape, dtype=ref.dtype, buffer=self._block(ref.slot).buf)
+
+    def release(self, ref):
+        """Return a slot to the pool once its frame has been consumed."""
+        with self._changed:
+            self._in_use[ref.slot] = 0
+            self._changed.notify()
+
+    def close(self):
+        """Detach from the buffers; the creating process also frees them."""
+        for block in self._blocks:
+            if block is None:
+                continue
+            try:
+                block.close()
+            except BufferError:
+                pass  # A view is still alive; the mapping goes away with it
+            if self._owner:
+                block.unlink()
+        self._blocks = [None] * len(self._names)
+
+_worker_frame_pool = None
+
+def _attach_frame_pool(frame_pool):
+    global _worker_frame_pool
+    _worker_frame_pool = frame_pool
+
+def _apply_to_frame(func, ref):
+    """Run func on a frame in a worker and return the ref of its result."""
+    frame_pool = _worker_frame_pool
+    frame = frame_pool.view(ref)
+    try:
+        result = np.asarray(func(frame))
+    except BaseException:
+        # The caller only sees the exception, so it cannot release the slot
+        del frame
+        frame_pool.release(ref)
+        raise
+    if np.shares_memory(result, frame) and result.shape == frame.shape and result.dtype == frame.dtype:
+        return ref  # Worked in place: the input slot already holds the result
+    del frame
+    # Free the input slot before taking one for the result, so a worker never holds two
+    frame_pool.release(ref)
+    return frame_pool.put(result)
+
+def map_frames(func, frames, frame_pool, processes=None):
+    """Apply func to each frame in worker processes, yielding the results in order.
+
+    Frames travel to and from the workers through frame_pool, so each one is
+    copied once into shared memory and the results are read in place. func
+    must be picklable (a module-level function) and its outputs must fit the
+    pool's slots. Each yielded array is a view of a slot that is recycled
+    when the next result is requested; copy it to keep it longer.
+
+    If func raises, or the caller stops early, the frames still in flight
+    are waited for and their slots released, so the pool can be reused.
+    """
+    if frame_pool.slots < 2:
+        raise ValueError("map_frames needs a pool of at least two slots.")
+    pending = deque()
+    with multiprocessing.get_context().Pool(processes, initializer=_attach_frame_pool,
+                                            initargs=(frame_pool,)) as workers:
+        def collect():
+            ref = pending.popleft().get()
+            try:
+                yield frame_pool.view(ref)
+            finally:
+                frame_pool.release(ref)
+
+        try:
+            for frame in frames:
+                # Every frame in flight holds at most one slot, and so does the one being consumed
+                while len(pending) >= frame_pool.slots - 1:
+                    yield from collect()
+                pending.append(workers.apply_async(_apply_to_frame, (func, frame_pool.put(frame))))
+            while pending:
+                yield from collect()
+        finally:
+            # Reached with frames pending only on an error or early exit; workers release their
+            # input slot when func fails, so only successful results still hold one
+            while pending:
+                try:
+                    frame_pool.release(pending.popleft().get())
+                except Exception:
+                    pass
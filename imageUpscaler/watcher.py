@@ -0,0 +1,228 @@
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import struct
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from imageUpscaler.file_utils import list_images, SUPPORTED_EXTENSIONS
+from imageUpscaler.journal import ProgressJournal, JOURNAL_FILENAME
+from imageUpscaler.concurrency import configure_threads
+from imageUpscaler.encoding import configure_encode_pool
+from imageUpscaler.main import process_batch
+from imageUpscaler.notifications import create_dispatcher
+
+logger = logging.getLogger(__name__)
+
+# inotify constants from <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+_EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, len
+
+class InotifyWatcher:
+    """Reports files in a directory once their writer closes them or they are moved in.
+
+    Uses the Linux inotify API through libc, so nothing is rescanned unless
+    the kernel's event queue overflows. Events are lost then, so the whole
+    directory is reported, passed through rescan_filter (e.g. to drop files
+    already processed) when one is given.
+    """
+
+    def __init__(self, directory, rescan_filter=None):
+        libc_name = ctypes.util.find_library("c")
+        if not libc_name:
+            raise OSError("libc not found")
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(self._libc, "inotify_init1"):
+            raise OSError("inotify is not available on this platform")
+        self.directory = directory
+        self.rescan_filter = rescan_filter
+        self._fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(directory), IN_CLOSE_WRITE | IN_MOVED_TO)
+        if wd < 0:
+            os.close(self._fd)
+            raise OSError(ctypes.get_errno(), f"Cannot watch {directory}")
+
+    def poll(self, timeout):
+        """Wait up to timeout seconds and return the paths of completed files."""
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return []
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        paths = []
+        overflowed = False
+        offset = 0
+        while offset < len(data):
+            _, mask, _, name_length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = data[offset:offset + name_length].rstrip(b"\0")
+            offset += name_length
+            if mask & IN_Q_OVERFLOW:
+                overflowed = True
+            elif name:
+                paths.append(os.path.join(self.directory, os.fsdecode(name)))
+        if overflowed:
+            logger.warning("inotify event queue overflowed; rescanning %s", self.directory)
+            rescanned = list_images(self.directory)
+            if self.rescan_filter:
+                rescanned = self.rescan_filter(rescanned)
+            paths.extend(path for path in rescanned if path not in paths)
+        return paths
+
+    def close(self):
+        os.close(self._fd)
+
+class PollingWatcher:
+    """Portable fallback: rescans the directory and reports files whose size and
+    modification time have stayed the same for settle_time seconds."""
+
+    def __init__(self, directory, settle_time=1.0):
+        self.directory = directory
+        self.settle_time = settle_time
+        self._candidates = {}
+        # Files present at start are handled by the initial pass, not reported again
+        self._reported = {}
+        for img_path in list_images(directory):
+            stat = os.stat(img_path)
+            self._reported[img_path] = (stat.st_size, stat.st_mtime_ns)
+
+    def poll(self, timeout):
+        time.sleep(timeout)
+        now = time.monotonic()
+        ready = []
+        for img_path in list_images(self.directory):
+            try:
+                stat = os.stat(img_path)
+            except OSError:
+                continue
+            signature = (stat.st_size, stat.st_mtime_ns)
+            if self._reported.get(img_path) == signature:
+                continue
+            first_seen_signature, since = self._candidates.get(img_path, (None, now))
+            if first_seen_signature != signature:
+                self._candidates[img_path] = (signature, now)
+            elif now - since >= self.settle_time:
+                del self._candidates[img_path]
+                self._reported[img_path] = signature
+                ready.append(img_path)
+        return ready
+
+    def close(self):
+        pass
+
+def create_watcher(directory, backend="auto", settle_time=1.0, rescan_filter=None):
+    """Create an inotify watcher, falling back to polling where inotify is unavailable."""
+    if backend in ("auto", "inotify"):
+        try:
+            return InotifyWatcher(directory, rescan_filter)
+        except (OSError, AttributeError) as e:
+            if backend == "inotify":
+                raise
+            logger.info("inotify unavailable (%s), polling %s instead", e, directory)
+    return PollingWatcher(directory, settle_time)
+
+def watch_and_process(input_directory, config, output_directory, stop_event=None):
+    """Process images as they arrive in input_directory until stop_event is set.
+
+    Files already present (and not marked done in the journal) are processed
+    first; after that only new or rewritten files are picked up, on a worker
+    pool that stays warm between arrivals. A file rewritten while it is being
+    processed is processed again once that run finishes.
+    """
+    if os.path.abspath(input_directory) == os.path.abspath(output_directory):
+        raise ValueError("Watch mode needs an output directory separate from the input directory.")
+    os.makedirs(output_directory, exist_ok=True)
+    settings = config["watch"]
+    stop_event = stop_event or threading.Event()
+    max_workers, _ = configure_threads(config)
+    configure_encode_pool(config, max_workers)
+
+    journal = None
+    if config["batch_processing"]["journal"]:
+        journal_path = config["batch_processing"]["journal_path"] or os.path.join(output_directory, JOURNAL_FILENAME)
+        journal = ProgressJournal(journal_path)
+
+    notifier = create_dispatcher(config)
+    watcher = create_watcher(input_directory, settings["backend"], settings["settle_time"],
+                             journal.pending if journal else None)
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    in_flight = set()
+    # Files rewritten while in flight, to run again when their current run ends
+    dirty = set()
+    # Futures not yet finished, cancelled on interrupt (shutdown's cancel_futures needs Python 3.9)
+    queued = set()
+    stopping = False
+    lock = threading.Lock()
+
+    def enqueue(img_path):
+        future = executor.submit(process, img_path)
+        with lock:
+            queued.add(future)
+
+        def forget(done):
+            with lock:
+                queued.discard(done)
+        future.add_done_callback(forget)
+
+    def process(img_path):
+        try:
+            process_batch([img_path], config, output_directory, journal, notifier=notifier)
+        finally:
+            with lock:
+                rerun = img_path in dirty and not stopping and os.path.isfile(img_path)
+                dirty.discard(img_path)
+                if not rerun:
+                    in_flight.discard(img_path)
+            if rerun:
+                logger.info("Requeued %s, rewritten while processing", img_path)
+                try:
+                    enqueue(img_path)
+                except RuntimeError:  # Shutting down
+                    with lock:
+                        in_flight.discard(img_path)
+
+    def submit(img_path):
+        with lock:
+            if img_path in in_flight:
+                dirty.add(img_path)
+                return
+            in_flight.add(img_path)
+        logger.info("Queued %s", img_path)
+        enqueue(img_path)
+
+    try:
+        existing = list_images(input_directory)
+        for img_path in journal.pending(existing) if journal else existing:
+            submit(img_path)
+        logger.info("Watching %s for new images", input_directory)
+        while not stop_event.is_set():
+            for img_path in watcher.poll(settings["poll_interval"]):
+                if img_path.lower().endswith(SUPPORTED_EXTENSIONS) and os.path.isfile(img_path):
+                    submit(img_path)
+            if journal:
+                journal.flush()
+        executor.shutdown(wait=True)
+    except BaseException:
+        # Ctrl-C or an error: finish the images already running, drop the queued ones
+        with lock:
+            stopping = True
+            waiting = list(queued)
+        for future in waiting:
+            future.cancel()
+        executor.shutdown(wait=True)
+        raise
+    finally:
+        watcher.close()
+        notifier.close()
+        if journal:
+            journal.close()